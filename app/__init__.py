@@ -9,68 +9,121 @@ login_manager = LoginManager()
 mail = Mail()
 
 def create_app():
-    app = Flask(__name__, template_folder='../templates', static_folder='../static')
-    # Add Jinja2 filter for currency formatting
-    @app.template_filter('format_currency')
-    def format_currency(value):
-        try:
-            return "₹{:,.2f}".format(float(value))
-        except Exception:
-            return value
+    from app.startup import StartupTimer, STARTUP_BUDGET_MS, env_flag, report_startup
+    from app.database import database_config, configure_engine
+    from app.outbox import init_outbox
+    from app.storage import init_storage
+    from app.policy_engine import init_policy_engine
+    from app.cache import init_cache
+    from app.notifications import init_notifications
+    from app.summaries import init_summaries
+    from app.search import init_search
+    from app.instrumentation import init_instrumentation
+    from app.slow_queries import init_slow_queries
+    from app.templating import init_templating, precompile_templates
+    from app.schema import running_under_cli
+    timer = StartupTimer()
     
-    # Configuration
-    app.config['SECRET_KEY'] = 'a810f367e2a8296a40a7a4073b64f92476d542023a968f44d32e92e21255e427'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///smarthydropay.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    with timer.phase('flask'):
+        app = Flask(__name__, template_folder='../templates', static_folder='../static')
+        # Add Jinja2 filter for currency formatting
+        @app.template_filter('format_currency')
+        def format_currency(value):
+            try:
+                return "₹{:,.2f}".format(float(value))
+            except Exception:
+                return value
     
-    # Mail configuration
-    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-    app.config['MAIL_PORT'] = 587
-    app.config['MAIL_USE_TLS'] = True
-    app.config['MAIL_USERNAME'] = 'aivisionaries.teams@gmail.com'
-    app.config['MAIL_PASSWORD'] = 'rves fkcw ikpq mbmw'
+    with timer.phase('config'):
+        # Configuration
+        app.config['SECRET_KEY'] = 'a810f367e2a8296a40a7a4073b64f92476d542023a968f44d32e92e21255e427'
+        app.config.update(database_config())
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        
+        # Mail configuration
+        app.config['MAIL_SERVER'] = 'smtp.gmail.com'
+        app.config['MAIL_PORT'] = 587
+        app.config['MAIL_USE_TLS'] = True
+        app.config['MAIL_USERNAME'] = 'aivisionaries.teams@gmail.com'
+        app.config['MAIL_PASSWORD'] = 'rves fkcw ikpq mbmw'
+        
+        # File upload configuration
+        app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
+        # Outside the static folder, so documents are only reachable through main.download
+        app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(app.instance_path, 'uploads'))
+        
+        # Startup budget: log phase timings, and only touch the database when asked to
+        app.config['STARTUP_REPORT'] = env_flag('STARTUP_REPORT')
+        app.config['STARTUP_BUDGET_MS'] = int(os.environ.get('STARTUP_BUDGET_MS', STARTUP_BUDGET_MS))
+        app.config['SCHEMA_CHECK_ON_STARTUP'] = env_flag('SCHEMA_CHECK_ON_STARTUP')
     
-    # File upload configuration
-    app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
-    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(app.root_path), 'static', 'uploads')
+    with timer.phase('extensions'):
+        # Initialize extensions
+        db.init_app(app)
+        with app.app_context():
+            configure_engine(app, db.engine)
+        mail.init_app(app)
+        init_outbox(app, start_worker=not running_under_cli())
+        init_storage(app)
+        init_policy_engine(app)
+        init_cache(app)
+        init_notifications(app)
+        init_summaries(app)
+        init_search(app)
+        init_instrumentation(app)
+        init_slow_queries(app)
+        init_templating(app)
+        login_manager.init_app(app)
+        login_manager.login_view = 'auth.login'
+        login_manager.login_message_category = 'info'
     
-    # Initialize extensions
-    db.init_app(app)
-    mail.init_app(app)
-    login_manager.init_app(app)
-    login_manager.login_view = 'auth.login'
-    login_manager.login_message_category = 'info'
+    with timer.phase('schema'):
+        # Schema is managed by the migration chain (flask db upgrade). Alembic is
+        # only loaded for CLI commands and no connection is opened unless the
+        # startup check is switched on; `flask schema-check` runs it on demand.
+        from app.schema import init_migrations, check_schema_revision
+        if running_under_cli():
+            init_migrations(app)
+        if app.config['SCHEMA_CHECK_ON_STARTUP']:
+            with app.app_context():
+                check_schema_revision(app, db.engine)
     
-    # Create tables first
-    with app.app_context():
-        # Import models
-        from app.models import User, Application, Audit, Transaction
-        db.create_all()
+    with timer.phase('blueprints'):
+        # Register blueprints
+        from routes.auth import auth
+        from routes.producer import producer
+        from routes.auditor import auditor
+        from routes.government import government
+        from routes.bank import bank
+        from routes.main import main
+        
+        app.register_blueprint(main)
+        app.register_blueprint(auth, url_prefix='/auth')
+        app.register_blueprint(producer, url_prefix='/producer')
+        app.register_blueprint(auditor, url_prefix='/auditor')
+
+        # Add Jinja2 filter for JSON parsing
+        import json
+        @app.template_filter('loads')
+        def jinja2_loads_filter(s):
+            try:
+                return json.loads(s)
+            except Exception:
+                return []
+        app.register_blueprint(government, url_prefix='/government')
+        app.register_blueprint(bank, url_prefix='/bank')
     
-    # Register blueprints
-    from routes.auth import auth
-    from routes.producer import producer
-    from routes.auditor import auditor
-    from routes.government import government
-    from routes.bank import bank
-    from routes.main import main
+    with timer.phase('templates'):
+        # Compiled templates come from TEMPLATE_BYTECODE_DIR, so the first request does not parse any
+        if app.config['TEMPLATE_PRECOMPILE'] and not running_under_cli():
+            precompile_templates(app)
     
-    app.register_blueprint(main)
-    app.register_blueprint(auth, url_prefix='/auth')
-    app.register_blueprint(producer, url_prefix='/producer')
-    app.register_blueprint(auditor, url_prefix='/auditor')
-
-    # Add Jinja2 filter for JSON parsing
-    import json
-    @app.template_filter('loads')
-    def jinja2_loads_filter(s):
-        try:
-            return json.loads(s)
-        except Exception:
-            return []
-    app.register_blueprint(government, url_prefix='/government')
-    app.register_blueprint(bank, url_prefix='/bank')
+    with timer.phase('cli'):
+        # CLI commands
+        from app.commands import register_commands
+        register_commands(app)
     
+    report_startup(app, timer)
     return app
 
 @login_manager.user_loader
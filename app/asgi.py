@@ -0,0 +1,228 @@
+"""
+ASGI deployment mode: the create_app() factory served by an async server.
+
+    uvicorn asgi:app --workers 4
+
+The event loop only parses HTTP and moves bytes. Every request runs the
+Flask (WSGI) app on a bounded pool of ASGI_THREADS worker threads, so a
+request waiting on the database, a file or the network holds a thread
+rather than a whole worker process. The pool defaults to the size of the
+database connection pool (pool_size + max_overflow), since each request
+holds a connection for its whole run and extra threads would only queue
+for one, capped at THREADS_PER_CPU per core.
+
+Bodies larger than SPOOL_BYTES are spooled to a temporary file, written on
+a separate pool of BODY_THREADS, so a burst of uploads never waits behind
+the requests holding every ASGI thread (or holds threads those requests
+need). Uploads and downloads are then read and written by the view on its
+own thread, and email goes through the outbox threads as before.
+
+asgiref's WsgiToAsgi is not used: it runs every request on one shared
+thread unless told otherwise, and never closes the response iterable.
+"""
+import asyncio
+import io
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+SPOOL_BYTES = 64 * 1024
+BUFFER_BYTES = 64 * 1024
+# More threads than this per core only queue on the GIL while pages render
+THREADS_PER_CPU = 4
+# Threads writing spooled request bodies to their temporary files
+BODY_THREADS = 2
+# How long shutdown waits for the outbox threads to finish a batch
+SHUTDOWN_TIMEOUT_SECONDS = 10
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def default_threads(app):
+    """Threads per process: as many as the engine's pool can serve at once, at most THREADS_PER_CPU per core"""
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    # SQLAlchemy's QueuePool defaults, used for SQLite files too
+    connections = options.get('pool_size', 5) + options.get('max_overflow', 10)
+    return min(connections, THREADS_PER_CPU * (os.cpu_count() or 1))
+
+
+class AsgiApp:
+    """ASGI application running a WSGI app on a thread pool"""
+
+    def __init__(self, wsgi_app, threads, max_content_length=None):
+        self.wsgi_app = wsgi_app
+        self.max_content_length = max_content_length
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='asgi')
+        self.body_executor = ThreadPoolExecutor(BODY_THREADS, thread_name_prefix='asgi-body')
+        self.shutdown_callbacks = []
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        else:
+            raise RuntimeError(f'Unsupported ASGI scope type {scope["type"]!r}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # The server has finished its requests; let the pool and outbox wind down off the loop
+                await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.body_executor.shutdown(wait=True)
+        for callback in self.shutdown_callbacks:
+            callback()
+
+    async def http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        try:
+            body = await self.read_body(receive, loop)
+        except BodyTooLarge:
+            await send({'type': 'http.response.start', 'status': 413,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': b'Request body too large.'})
+            return
+        if body is None:
+            return
+        try:
+            messages = await loop.run_in_executor(self.executor, self.run, environ_for(scope, body), loop, send)
+        finally:
+            body.close()
+        await send_all(send, messages)
+
+    async def read_body(self, receive, loop):
+        """The request body as a file, or None if the client went away while sending it"""
+        body, size, more_body = io.BytesIO(), 0, True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            size += len(chunk)
+            if self.max_content_length is not None and size > self.max_content_length:
+                body.close()
+                raise BodyTooLarge
+            if isinstance(body, io.BytesIO) and size > SPOOL_BYTES:
+                spooled = tempfile.TemporaryFile()
+                await loop.run_in_executor(self.body_executor, spooled.write, body.getvalue())
+                body = spooled
+            if isinstance(body, io.BytesIO):
+                body.write(chunk)
+            elif chunk:
+                await loop.run_in_executor(self.body_executor, body.write, chunk)
+        body.seek(0)
+        return body
+
+    def run(self, environ, loop, send):
+        """Call the WSGI app on a pool thread; returns the messages left for the loop to send.
+
+        A response of up to BUFFER_BYTES (nearly every page) is handed back
+        whole, so the thread never waits on the loop. Beyond that each chunk
+        is sent as it comes, so streamed exports and downloads are not held
+        in memory.
+        """
+        started, buffered, size, streaming = [], [], 0, False
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and streaming:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [{
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            }]
+
+        iterable = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in iterable:
+                if not chunk:
+                    continue
+                buffered.append(chunk)
+                size += len(chunk)
+                if size > BUFFER_BYTES:
+                    messages = started + [{'type': 'http.response.body', 'body': b''.join(buffered), 'more_body': True}]
+                    asyncio.run_coroutine_threadsafe(send_all(send, messages), loop).result()
+                    started.clear()
+                    buffered, size, streaming = [], 0, True
+            return started + [{'type': 'http.response.body', 'body': b''.join(buffered)}]
+        finally:
+            # Runs the app's teardown for streamed responses and closes sent files
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+
+async def send_all(send, messages):
+    for message in messages:
+        await send(message)
+
+
+def environ_for(scope, body):
+    """WSGI environ for an ASGI http scope (PEP 3333 / ASGI spec mapping)"""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+
+def create_asgi_app(flask_app=None):
+    """Wrap a Flask app (by default a new create_app()) for an ASGI server"""
+    from app import create_app, db
+    app = flask_app or create_app()
+    threads = app.config.setdefault('ASGI_THREADS', int(os.environ.get('ASGI_THREADS', 0)) or default_threads(app))
+    asgi_app = AsgiApp(app, threads, max_content_length=app.config.get('MAX_CONTENT_LENGTH'))
+    asgi_app.flask_app = app
+
+    def stop_background_work():
+        worker = app.extensions.get('outbox')
+        if worker is not None:
+            worker.stop(timeout=SHUTDOWN_TIMEOUT_SECONDS)
+        with app.app_context():
+            db.engine.dispose()
+
+    asgi_app.shutdown_callbacks.append(stop_background_work)
+    return asgi_app
@@ -0,0 +1,82 @@
+"""
+Append-only audit trail.
+
+Every workflow action is one AuditEvent row, written with record_event() in
+the same transaction as the change it describes. Inserts cost the same
+however long the history is, concurrent writers never overwrite each other,
+and events_query() filters by action, time range, application or user on
+indexed columns. The JSON audit_log blobs written before this table existed
+are read with legacy_entries() (migration 0005 copies them across).
+"""
+import json
+from datetime import datetime
+from app import db
+from app.queries import load
+
+# Actions recorded by the blueprints
+ACTIONS = (
+    'audit_completed',
+    'milestone_verified',
+    'milestone_rejected',
+    'application_review_started',
+    'application_approved',
+    'application_rejected',
+    'funds_released',
+    'milestone_paid',
+)
+
+
+def record_event(action, user_id, application_id=None, audit=None, details=None):
+    """Add an AuditEvent to the session; it is stored when the caller commits"""
+    from app.models import AuditEvent
+    event = AuditEvent(
+        action=action,
+        user_id=user_id,
+        application_id=application_id,
+        audit=audit,
+        details=json.dumps(details) if details is not None else None,
+    )
+    db.session.add(event)
+    return event
+
+
+def legacy_entries(audit_log):
+    """Parse a legacy audit_log JSON blob into a list of entries"""
+    if not audit_log:
+        return []
+    try:
+        entries = json.loads(audit_log)
+    except ValueError:
+        return []
+    return entries if isinstance(entries, list) else []
+
+
+def parse_timestamp(value):
+    """datetime from an ISO date or date-time string, or None if empty/invalid"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def events_query(action=None, since=None, until=None, application_id=None, user_id=None):
+    """AuditEvents matching the filters, with user and application loaded.
+
+    `since` is inclusive and `until` exclusive. Callers order or paginate on
+    (created_at, id), which the action/application composite indexes cover.
+    """
+    from app.models import AuditEvent
+    query = load(AuditEvent, 'user', 'application')
+    if action:
+        query = query.filter(AuditEvent.action == action)
+    if application_id:
+        query = query.filter(AuditEvent.application_id == application_id)
+    if user_id:
+        query = query.filter(AuditEvent.user_id == user_id)
+    if since:
+        query = query.filter(AuditEvent.created_at >= since)
+    if until:
+        query = query.filter(AuditEvent.created_at < until)
+    return query
@@ -0,0 +1,187 @@
+"""
+Cache for the shared role dashboards.
+
+Auditors, government officials and bank officers each look at one shared
+queue (pending, auditor_verified, govt_approved). The dashboard keeps each
+queue page as plain data in a cache keyed by queue, cursor and a generation
+number. Every workflow transition (and every new application) bumps the
+generation after its commit, which orphans all cached pages at once; TTL and
+LRU eviction take care of the rest.
+
+DASHBOARD_CACHE selects the backend:
+- 'memory' (default): per-process LRU. Other workers only see a change once
+  their entries expire (DASHBOARD_CACHE_TTL seconds).
+- 'redis': shared by all workers through REDIS_URL, so invalidation is
+  immediate everywhere. Needs the redis package.
+- 'none': no caching.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from types import SimpleNamespace
+from flask import current_app, request
+from sqlalchemy import event
+from app import db
+from app.queries import KeysetPage, count, load, paginate
+from app.workflow import transitioned
+
+DEFAULT_TTL = 30
+MAX_ENTRIES = 256
+GENERATION_KEY = 'dashboard:generation'
+
+
+class MemoryCache:
+    """Thread-safe LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}  # kept out of the LRU so they are never evicted
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisCache:
+    """Redis-backed cache shared by every worker; values are stored as JSON"""
+
+    def __init__(self, url, prefix='smarthydropay:', client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+
+def init_cache(app):
+    app.config.setdefault('DASHBOARD_CACHE', os.environ.get('DASHBOARD_CACHE', 'memory'))
+    app.config.setdefault('DASHBOARD_CACHE_TTL', int(os.environ.get('DASHBOARD_CACHE_TTL', DEFAULT_TTL)))
+    app.config.setdefault('DASHBOARD_CACHE_MAX_ENTRIES', int(os.environ.get('DASHBOARD_CACHE_MAX_ENTRIES', MAX_ENTRIES)))
+
+    backend = app.config['DASHBOARD_CACHE']
+    if backend == 'memory':
+        cache = MemoryCache(app.config['DASHBOARD_CACHE_MAX_ENTRIES'])
+    elif backend == 'redis':
+        cache = RedisCache(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    elif backend == 'none':
+        cache = None
+    else:
+        raise ValueError(f'Unknown DASHBOARD_CACHE {backend!r}')
+    app.extensions['dashboard_cache'] = cache
+    transitioned.connect(_invalidate_on_transition)
+
+
+def get_cache():
+    return current_app.extensions.get('dashboard_cache')
+
+
+def cached(key, compute):
+    """Return the cached value for key in the current generation, computing it on a miss"""
+    cache = get_cache()
+    if cache is None:
+        return compute()
+    key = f'dashboard:{cache.counter(GENERATION_KEY)}:{key}'
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, current_app.config['DASHBOARD_CACHE_TTL'])
+    return value
+
+
+def _row(application):
+    return {
+        'id': application.id,
+        'project_name': application.project_name,
+        'capacity': application.capacity,
+        'status': application.status,
+        'project_details': application.project_details,
+        'created_at': application.created_at.isoformat(),
+        'producer_name': application.producer.name,
+    }
+
+
+def _item(row):
+    # Attribute access like the Application rows the dashboard template expects
+    return SimpleNamespace(
+        id=row['id'], project_name=row['project_name'], capacity=row['capacity'],
+        status=row['status'], project_details=row['project_details'],
+        created_at=datetime.fromisoformat(row['created_at']),
+        producer=SimpleNamespace(name=row['producer_name']),
+    )
+
+
+def queue_page(status, name='cursor'):
+    """Keyset page of applications in a shared status queue, served from the cache"""
+    from app.models import Application
+
+    def compute():
+        page = paginate(load(Application, 'producer').filter_by(status=status), Application, name=name)
+        return {'rows': [_row(application) for application in page],
+                'next_cursor': page.next_cursor, 'prev_cursor': page.prev_cursor}
+
+    data = cached(f'queue:{status}:{request.args.get(name, "")}', compute)
+    return KeysetPage([_item(row) for row in data['rows']], name, data['next_cursor'], data['prev_cursor'])
+
+
+def queue_count(status):
+    """Number of applications in a shared status queue, served from the cache"""
+    from app.models import Application
+    return cached(f'count:{status}', lambda: count(Application.query.filter_by(status=status)))
+
+
+def invalidate_dashboards():
+    """Drop every cached queue once the caller's transaction commits"""
+    db.session.info['dashboards_changed'] = True
+
+
+def _invalidate_on_transition(application, **kwargs):
+    invalidate_dashboards()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_dashboard_generation(session):
+    if session.info.pop('dashboards_changed', False):
+        cache = current_app.extensions.get('dashboard_cache')
+        if cache is not None:
+            cache.incr(GENERATION_KEY)
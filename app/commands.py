@@ -0,0 +1,416 @@
+"""
+Flask CLI commands for SmartHydroPay (run with `flask --app run <command>`)
+"""
+import click
+from flask import g
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from app import db
+
+# GET endpoints that change state or are not worth planning
+SKIP_ENDPOINTS = {'static', 'auth.logout', 'main.debug_profile'}
+
+
+def register_commands(app):
+    """Attach the CLI commands to the app"""
+    app.cli.add_command(index_report)
+    app.cli.add_command(schema_check)
+    app.cli.add_command(startup_report)
+    app.cli.add_command(outbox_worker)
+    app.cli.add_command(outbox_flush)
+    app.cli.add_command(outbox_prune)
+    app.cli.add_command(idempotency_prune)
+    app.cli.add_command(sanction_approved)
+    app.cli.add_command(subsidy_what_if)
+    app.cli.add_command(reconcile_statement)
+    app.cli.add_command(rebuild_summaries)
+    app.cli.add_command(reindex_search)
+    app.cli.add_command(slow_queries)
+    app.cli.add_command(precompile_templates_command)
+
+
+def capture_view_queries(app):
+    """Render every argument-free GET page as each role and record its SQL.
+
+    Uses the first user of each role in the database, so the statements are
+    exactly the ones the blueprints issue, including pages added later.
+    Returns {statement: (parameters, endpoint)} keeping the first sighting.
+    """
+    from app.models import User
+
+    captured = {}
+    current = {}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.setdefault(statement, (parameters, current.get('endpoint')))
+
+    client = app.test_client()
+    endpoints = [
+        rule for rule in app.url_map.iter_rules()
+        if 'GET' in rule.methods and not rule.arguments and rule.endpoint not in SKIP_ENDPOINTS
+    ]
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for role in ('producer', 'auditor', 'government', 'bank'):
+            user = User.query.filter_by(role=role).first()
+            if user is None:
+                click.echo(f'No {role} user in the database, skipping {role} pages')
+                continue
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user.id)
+                session['_fresh'] = True
+            for rule in endpoints:
+                current['endpoint'] = f'{role} {rule.endpoint}'
+                # Requests share the CLI's app context, so drop Flask-Login's cached user
+                g.pop('_login_user', None)
+                try:
+                    client.get(rule.rule)
+                except Exception as e:
+                    # Broken pages still issued their queries up to the failure
+                    click.echo(f'{role} {rule.endpoint} failed to render: {e}')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def explain(statement, parameters):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def plan_problems(statement, plan):
+    """Full scans and sort steps that an index should have removed"""
+    problems = []
+    if ' WHERE ' in statement:
+        problems += [line for line in plan if line.startswith('SCAN') and ' USING ' not in line]
+    if ' ORDER BY ' in statement:
+        problems += [line for line in plan if 'TEMP B-TREE FOR ORDER BY' in line]
+    return problems
+
+
+@click.command('index-report')
+@click.option('--verbose', is_flag=True, help='Print the plan of every query, not only problems.')
+@with_appcontext
+def index_report(verbose):
+    """Run the app's real queries under EXPLAIN QUERY PLAN and report table scans."""
+    from flask import current_app
+
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('index-report uses EXPLAIN QUERY PLAN and only supports SQLite')
+
+    captured = capture_view_queries(current_app._get_current_object())
+    flagged = 0
+    for statement, (parameters, endpoint) in captured.items():
+        plan = explain(statement, parameters)
+        problems = plan_problems(statement, plan)
+        if problems or verbose:
+            click.echo(f'[{endpoint}] {" ".join(statement.split())}')
+            for line in plan:
+                marker = '!!' if line in problems else '  '
+                click.echo(f'    {marker} {line}')
+        flagged += bool(problems)
+
+    click.echo(f'{len(captured)} queries checked, {flagged} with full table scans or sorts')
+    if flagged:
+        raise SystemExit(1)
+
+
+@click.command('schema-check')
+@with_appcontext
+def schema_check():
+    """Verify the database is at the head migration revision."""
+    from flask import current_app
+    from app.schema import check_schema_revision, database_revision
+
+    app = current_app._get_current_object()
+    if not check_schema_revision(app, db.engine):
+        raise click.ClickException('Database schema is not at the head revision')
+    click.echo(f'Database schema is at head revision {database_revision(db.engine)}')
+
+
+@click.command('startup-report')
+@click.option('--budget-ms', type=int, default=None,
+              help='Fail if cold start takes longer than this (default: STARTUP_BUDGET_MS).')
+@click.option('--runs', default=3, show_default=True, help='Cold starts to measure; the fastest counts.')
+def startup_report(budget_ms, runs):
+    """Time a worker cold start (import + create_app) phase by phase."""
+    import json
+    import os
+    import subprocess
+    import sys
+    from app.startup import COLD_START_PROBE, STARTUP_BUDGET_MS
+
+    budget_ms = budget_ms or int(os.environ.get('STARTUP_BUDGET_MS', STARTUP_BUDGET_MS))
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', COLD_START_PROBE], cwd=project_root,
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    best = min(results, key=lambda result: result['total_ms'])
+    click.echo(f'  {"import app":<14} {best["import_ms"]:8.1f} ms')
+    for name, ms in best['phases']:
+        click.echo(f'  {name:<14} {ms:8.1f} ms')
+    click.echo(f'  {"cold start":<14} {best["total_ms"]:8.1f} ms (budget {budget_ms} ms)')
+    if best['total_ms'] > budget_ms:
+        raise click.ClickException(f'Cold start is over the {budget_ms} ms budget')
+
+
+@click.command('outbox-worker')
+@click.option('--threads', default=2, show_default=True, help='Delivery threads.')
+@click.option('--batch-size', default=20, show_default=True, help='Emails claimed and sent per SMTP connection.')
+@with_appcontext
+def outbox_worker(threads, batch_size):
+    """Deliver outbox emails until interrupted (use with OUTBOX_WORKER_THREADS=0 on the web nodes)."""
+    import time
+    from flask import current_app
+    from app.outbox import OutboxWorker
+
+    worker = OutboxWorker(current_app._get_current_object(), threads=threads, batch_size=batch_size)
+    current_app.extensions['outbox'] = worker
+    worker.start()
+    worker.wake()
+    click.echo(f'Outbox worker running with {threads} threads, Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        worker.stop(timeout=30)
+
+
+@click.command('outbox-flush')
+@with_appcontext
+def outbox_flush():
+    """Deliver every email that is currently due, then exit."""
+    from app.outbox import deliver_pending
+
+    total = 0
+    while True:
+        handled = deliver_pending()
+        if not handled:
+            break
+        total += handled
+    click.echo(f'{total} outbox emails processed')
+
+
+@click.command('outbox-prune')
+@click.option('--days', default=30, show_default=True, help='Keep emails queued within this many days.')
+@with_appcontext
+def outbox_prune(days):
+    """Delete sent and failed outbox emails older than --days."""
+    from app.outbox import prune
+
+    click.echo(f'{prune(days)} outbox emails removed')
+
+
+@click.command('idempotency-prune')
+@click.option('--days', default=30, show_default=True, help='Keep keys used within this many days.')
+@with_appcontext
+def idempotency_prune(days):
+    """Delete old idempotency keys; retries older than --days run again."""
+    from app.idempotency import prune
+
+    click.echo(f'{prune(days)} idempotency keys removed')
+
+
+@click.command('sanction-approved')
+@click.option('--dry-run', is_flag=True, help='Only list the sanctions that would be posted.')
+@with_appcontext
+def sanction_approved(dry_run):
+    """Post the ledger sanction of approved applications that have none yet.
+
+    Applications approved before sanctions were posted at approval are
+    sanctioned their approved amount, or else the subsidy policy's quote.
+    """
+    from app import ledger
+    from app.models import Application, LedgerBalance
+    from app.policy_engine import get_policy_engine
+    from app.workflow import FUND_RELEASED, GOVT_APPROVED
+
+    has_sanction = (db.session.query(LedgerBalance.application_id)
+                    .filter(LedgerBalance.account == ledger.SANCTIONED,
+                            LedgerBalance.application_id == Application.id)
+                    .exists())
+    applications = (Application.query
+                    .filter(Application.status.in_((GOVT_APPROVED, FUND_RELEASED)), ~has_sanction)
+                    .order_by(Application.id).all())
+    engine = get_policy_engine()
+    amounts, unpriced = {}, []
+    for application in applications:
+        quote = engine.quote(application)
+        amount = application.total_sanctioned_amount or (quote.amount if quote else 0)
+        if amount:
+            amounts[application.id] = amount
+        else:
+            unpriced.append(application.id)
+    for application_id, amount in amounts.items():
+        click.echo(f'application {application_id}: ₹{amount:,.2f}')
+    for application_id in unpriced:
+        click.echo(f'application {application_id}: no approved amount and no policy prices it; sanction it by hand')
+    if not dry_run:
+        ledger.sanction_many(amounts)
+        db.session.commit()
+    click.echo(f'{len(amounts)} sanctions {"to post" if dry_run else "posted"}, {len(unpriced)} left unpriced')
+
+
+@click.command('reconcile-statement')
+@click.argument('statements', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--bank', 'bank_email', required=True, help='Email of the bank user the statement belongs to.')
+@click.option('--rematch', is_flag=True, help='Afterwards retry every unmatched line of the bank.')
+@with_appcontext
+def reconcile_statement(statements, bank_email, rematch):
+    """Import and match CSV bank statements too large to upload through the site."""
+    import os
+    import time
+    from app.models import StatementLine, User
+    from app.queries import status_counts
+    from app.reconciliation import StatementFormatError, import_statement, rematch as rematch_lines
+
+    bank = User.query.filter_by(email=bank_email, role='bank').first()
+    if bank is None:
+        raise click.BadParameter(f'no bank user {bank_email}', param_hint='--bank')
+
+    for path in statements:
+        started = time.perf_counter()
+        with open(path, 'rb') as stream:
+            try:
+                statement, imported = import_statement(bank.id, stream, os.path.basename(path))
+            except StatementFormatError as e:
+                db.session.rollback()
+                raise click.ClickException(f'{path}: {e}')
+        db.session.commit()
+        if not imported:
+            click.echo(f'{path}: already imported on {statement.created_at:%Y-%m-%d %H:%M}')
+            continue
+        click.echo(f'{path}: {statement.line_count} new lines, {statement.duplicate_count} already seen, '
+                   f'{(time.perf_counter() - started) * 1000:.0f} ms')
+    if rematch:
+        matched, mismatched = rematch_lines(bank.id)
+        db.session.commit()
+        click.echo(f'{matched} unmatched lines reconciled on retry, {mismatched} found but mismatched')
+
+    counts = status_counts(StatementLine.query.filter_by(bank_id=bank.id), StatementLine)
+    click.echo(', '.join(f'{counts.get(status, 0)} {status}' for status in ('matched', 'mismatched', 'unmatched')))
+
+
+@click.command('rebuild-summaries')
+@click.option('--check', is_flag=True, help='Only report summary rows that differ from the source tables.')
+@with_appcontext
+def rebuild_summaries(check):
+    """Recompute the reporting summary tables from applications, the ledger and transactions."""
+    import time
+    from app.summaries import drift, rebuild
+
+    started = time.perf_counter()
+    if check:
+        differences = drift()
+        for table, key, stored, computed in differences:
+            click.echo(f'{table} {key}: stored {stored}, computed {computed}')
+        click.echo(f'{len(differences)} summary rows differ ({(time.perf_counter() - started) * 1000:.0f} ms)')
+        if differences:
+            raise SystemExit(1)
+        return
+    rows = rebuild()
+    db.session.commit()
+    click.echo(f'{rows} summary rows rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+
+@click.command('reindex-search')
+@with_appcontext
+def reindex_search():
+    """Rebuild the full-text search index from applications, audits and milestones."""
+    import time
+    from flask import current_app
+    from app.search import rebuild
+
+    started = time.perf_counter()
+    documents = rebuild(db.session.connection(), current_app.config['SEARCH_BACKEND'])
+    db.session.commit()
+    click.echo(f'{documents} documents indexed in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+
+@click.command('slow-queries')
+@click.option('--top', default=10, show_default=True, help='Fingerprints to print.')
+@click.option('--log', 'path', type=click.Path(dir_okay=False), help='Slow-query log to read (default SLOW_QUERY_LOG).')
+@click.option('--clear', is_flag=True, help='Empty the log afterwards.')
+@with_appcontext
+def slow_queries(top, path, clear):
+    """Print the statements of the slow-query log that took the most time in total."""
+    import os
+    from flask import current_app
+    from app.slow_queries import top_fingerprints
+
+    path = path or current_app.config['SLOW_QUERY_LOG']
+    if not os.path.exists(path):
+        click.echo(f'No slow queries logged in {path} (threshold {current_app.config["SLOW_QUERY_MS"]} ms)')
+        return
+    summaries = top_fingerprints(path)
+    for rank, summary in enumerate(summaries[:top], 1):
+        click.echo(f'#{rank} {summary["fingerprint"]}  total {summary["total_ms"]:,.0f} ms  '
+                   f'count {summary["count"]}  mean {summary["total_ms"] / summary["count"]:,.0f} ms  '
+                   f'max {summary["max_ms"]:,.0f} ms  last {summary["last_seen"]}')
+        callers = sorted(summary['callers'].items(), key=lambda item: item[1], reverse=True)
+        click.echo('    from ' + ', '.join(f'{name} ({count})' for name, count in callers))
+        click.echo(f'    {summary["statement"]}')
+        click.echo(f'    parameters {summary["parameters"]}')
+        plan = summary['plan'] or []
+        problems = plan_problems(f' {summary["statement"]} ', plan)
+        for line in plan:
+            click.echo(f'    {"!!" if line in problems else "  "} {line}')
+    click.echo(f'{len(summaries)} slow statement fingerprints in {path}')
+    if clear:
+        open(path, 'w').close()
+
+
+@click.command('precompile-templates')
+@with_appcontext
+def precompile_templates_command():
+    """Compile every template into TEMPLATE_BYTECODE_DIR before the workers start."""
+    from flask import current_app
+    from app.templating import precompile_templates
+
+    app = current_app._get_current_object()
+    if app.jinja_env.bytecode_cache is None:
+        raise click.ClickException('No template bytecode cache; set TEMPLATE_BYTECODE_DIR')
+    count, took = precompile_templates(app)
+    click.echo(f'{count} templates compiled into {app.config["TEMPLATE_BYTECODE_DIR"]} in {took:.0f} ms')
+
+
+@click.command('subsidy-what-if')
+@click.option('--set', 'changes', multiple=True, metavar='POLICY_ID.FIELD=VALUE',
+              help='Proposed change, e.g. 3.rate_per_mw=4000000 or 3.active=false (repeatable).')
+@click.option('--by', 'groups', multiple=True, type=click.Choice(['technology', 'state', 'status']),
+              help='Groupings to print (default: all).')
+@with_appcontext
+def subsidy_what_if(changes, groups):
+    """Recompute every application's subsidy under current and proposed policies (needs NumPy)."""
+    import time
+    from app.policy_engine import get_policy_engine
+    from app.portfolio import GROUPS, Portfolio, parse_change, what_if
+
+    proposed = {}
+    for text in changes:
+        try:
+            policy_id, field, value = parse_change(text)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--set')
+        proposed.setdefault(policy_id, {})[field] = value
+
+    started = time.perf_counter()
+    with db.engine.connect() as connection:
+        portfolio = Portfolio.load(connection)
+    loaded = time.perf_counter()
+    report = what_if(portfolio, get_policy_engine().table(), proposed)
+    done = time.perf_counter()
+
+    for group in groups or GROUPS:
+        click.echo(f'\n{"by " + group:<28} {"current (₹)":>18} {"proposed (₹)":>18} {"change (₹)":>18}')
+        for label, (current, new) in sorted(report[group].items(), key=lambda item: -item[1][1]):
+            click.echo(f'{str(label):<28} {current:>18,.0f} {new:>18,.0f} {new - current:>+18,.0f}')
+    click.echo(f'\n{len(portfolio)} applications: loaded in {(loaded - started) * 1000:.0f} ms, '
+               f'recomputed twice in {(done - loaded) * 1000:.0f} ms')
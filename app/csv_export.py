@@ -0,0 +1,31 @@
+"""
+CSV downloads written a chunk at a time.
+
+stream_csv() turns an iterator of rows into an iterator of CSV text chunks,
+so an export read from the database with yield_per is never held in memory
+as a whole; wrap it in a streamed Response.
+"""
+import csv
+import io
+
+CHUNK_ROWS = 1000
+
+
+def stream_csv(header, rows, chunk_rows=CHUNK_ROWS):
+    """Yield header and rows as CSV text, chunk_rows rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def text_cell(value):
+    """Cell text that spreadsheet programs will not evaluate as a formula"""
+    value = '' if value is None else str(value)
+    return "'" + value if value[:1] in ('=', '+', '-', '@') else value
@@ -0,0 +1,64 @@
+"""
+Database settings from the environment and per-connection tuning.
+
+DATABASE_URL selects the backend (default: the local SQLite file). SQLite
+connections are switched to WAL with a busy timeout so the gunicorn workers
+can write concurrently; server databases get a sized, pre-pinged pool.
+"""
+import os
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URL = 'sqlite:///smarthydropay.db'
+
+
+def _env_int(environ, name, default):
+    return int(environ.get(name, default))
+
+
+def database_config(environ=os.environ):
+    """Return the SQLALCHEMY_* config for DATABASE_URL and the pool/pragma settings"""
+    url = environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    # Heroku-style URLs use the scheme SQLAlchemy 1.4+ no longer accepts
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+
+    if url.startswith('sqlite'):
+        busy_timeout_ms = _env_int(environ, 'SQLITE_BUSY_TIMEOUT_MS', 5000)
+        engine_options = {
+            # pysqlite waits this long for a lock before raising "database is locked"
+            'connect_args': {'timeout': busy_timeout_ms / 1000},
+        }
+        pragmas = {
+            'journal_mode': environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+            'synchronous': environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+            'busy_timeout': busy_timeout_ms,
+        }
+    else:
+        engine_options = {
+            'pool_size': _env_int(environ, 'DB_POOL_SIZE', 5),
+            'max_overflow': _env_int(environ, 'DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int(environ, 'DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _env_int(environ, 'DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': True,
+        }
+        pragmas = {}
+
+    return {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options,
+        'SQLITE_PRAGMAS': pragmas,
+    }
+
+
+def configure_engine(app, engine):
+    """Apply SQLITE_PRAGMAS to every new DBAPI connection of the engine"""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
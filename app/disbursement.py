@@ -0,0 +1,249 @@
+"""
+Batch disbursement runs for the bank role.
+
+A run pays many pending fund releases and verified milestones at once:
+
+1. plan() loads the selection in a few IN-list queries and validates it in
+   one pass (state, amount left in the ledger, producer bank details),
+   setting aside anything that cannot be paid with the reason.
+2. run_batch() claims everything with bulk conditional UPDATEs, writes all
+   Transaction rows with one bulk INSERT, posts them to the ledger in
+   bulk and commits once. A conflicting concurrent payment aborts the whole
+   run, so the caller rolls back and nothing is half paid.
+3. payment_file() streams the bank upload file for a run straight from the
+   database in chunks, so a 10k-row run is never built in memory.
+"""
+import json
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import select, update
+from app import db, ledger
+from app.csv_export import stream_csv, text_cell
+from app.queries import load
+from app.workflow import GOVT_APPROVED, transition_many
+
+# NEFT below this amount, RTGS from it (the RTGS minimum)
+RTGS_MINIMUM = 200000
+STREAM_CHUNK_ROWS = 1000
+
+FORMATS = {
+    'neft': ('Payment Type', 'Beneficiary Account Number', 'IFSC Code', 'Beneficiary Name', 'Amount',
+             'Value Date', 'Debit Narration', 'Customer Reference'),
+    'csv': ('Subsidy Request ID', 'Application ID', 'Project', 'Milestone ID', 'Transaction Type',
+            'Beneficiary Name', 'Beneficiary Account Number', 'Beneficiary Bank', 'IFSC Code', 'Amount',
+            'Disbursement Date'),
+}
+
+Payment = namedtuple('Payment', 'application milestone amount')
+
+
+class BatchConflict(Exception):
+    """Part of the batch was paid by someone else while it was being written"""
+
+
+def _by_id(model, ids, *paths):
+    found = {}
+    for chunk in ledger.chunked(ids):
+        found.update((row.id, row) for row in load(model, *paths).filter(model.id.in_(chunk)))
+    return found
+
+
+def _bank_details_missing(producer):
+    return not (producer.bank_account_number and producer.ifsc_code)
+
+
+def plan(application_ids, milestone_ids):
+    """Validate a selection in one pass.
+
+    Returns (payments, skipped): the Payments to make and a list of
+    {'kind', 'id', 'reason'} for everything left out. What an application
+    can still be paid is the available balance of the sanction posted when
+    it was approved.
+    """
+    from app.models import Application, Milestone
+    application_ids = list(dict.fromkeys(application_ids))
+    milestone_ids = list(dict.fromkeys(milestone_ids))
+    applications = _by_id(Application, application_ids, 'producer')
+    milestones = _by_id(Milestone, milestone_ids, 'application.producer')
+    involved = {**applications, **{m.application_id: m.application for m in milestones.values()}}
+
+    remaining = ledger.balances(list(involved), ledger.AVAILABLE)
+
+    def left_for(application):
+        return remaining.get(application.id, 0)
+
+    def take(application, amount):
+        remaining[application.id] = left_for(application) - amount
+
+    payments, skipped = [], []
+
+    # Milestones first; a release then pays out whatever is left
+    for milestone_id in milestone_ids:
+        milestone = milestones.get(milestone_id)
+        if milestone is None:
+            reason = 'not found'
+        elif milestone.status != 'completed':
+            reason = 'not completed'
+        elif milestone.auditor_verification_status != 'verified':
+            reason = 'not auditor verified'
+        elif milestone.payment_status != 'pending':
+            reason = 'already paid'
+        elif not milestone.milestone_amount:
+            reason = 'no amount'
+        elif _bank_details_missing(milestone.application.producer):
+            reason = 'producer bank details missing'
+        elif milestone.milestone_amount > left_for(milestone.application) + ledger.TOLERANCE:
+            reason = 'exceeds the remaining sanctioned amount'
+        else:
+            take(milestone.application, milestone.milestone_amount)
+            payments.append(Payment(milestone.application, milestone, milestone.milestone_amount))
+            continue
+        skipped.append({'kind': 'milestone', 'id': milestone_id, 'reason': reason})
+
+    for application_id in application_ids:
+        application = applications.get(application_id)
+        amount = left_for(application) if application is not None else 0
+        if application is None:
+            reason = 'not found'
+        elif application.status != GOVT_APPROVED:
+            reason = f'is {application.status.replace("_", " ")}'
+        elif _bank_details_missing(application.producer):
+            reason = 'producer bank details missing'
+        elif amount <= ledger.TOLERANCE:
+            reason = 'nothing left to disburse'
+        else:
+            take(application, amount)
+            payments.append(Payment(application, None, amount))
+            continue
+        skipped.append({'kind': 'application', 'id': application_id, 'reason': reason})
+
+    return payments, skipped
+
+
+def _claim_milestones(milestone_ids, now):
+    from app.models import Milestone
+    claimed = 0
+    for chunk in ledger.chunked(milestone_ids):
+        claimed += db.session.execute(
+            update(Milestone)
+            .where(Milestone.id.in_(chunk), Milestone.payment_status == 'pending')
+            .values(payment_status='paid', payment_date=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if claimed != len(milestone_ids):
+        raise BatchConflict('Some milestones in this batch were paid by another request; nothing was paid.')
+
+
+def run_batch(bank_id, application_ids, milestone_ids):
+    """Pay a selection in one transaction; returns (batch or None, skipped).
+
+    Raises workflow.InvalidTransition, ledger.OverDisbursement or
+    BatchConflict if a concurrent payment got in first; the caller should
+    roll back. The caller commits on success.
+    """
+    from app.models import AuditEvent, DisbursementBatch, Transaction
+    payments, skipped = plan(application_ids, milestone_ids)
+    if not payments:
+        return None, skipped
+
+    now = datetime.utcnow()
+    batch = DisbursementBatch(
+        bank_id=bank_id,
+        reference=f'DB{now.strftime("%Y%m%d")}{uuid.uuid4().hex[:16].upper()}',
+        item_count=len(payments),
+        total_amount=sum(payment.amount for payment in payments),
+        skipped=json.dumps(skipped) if skipped else None,
+        created_at=now,
+    )
+    db.session.add(batch)
+    db.session.flush()
+
+    transition_many([p.application for p in payments if p.milestone is None], 'release_funds')
+    _claim_milestones([p.milestone.id for p in payments if p.milestone is not None], now)
+
+    rows = []
+    for payment in payments:
+        producer = payment.application.producer
+        milestone = payment.milestone
+        rows.append({
+            'bank_id': bank_id,
+            'application_id': payment.application.id,
+            'milestone_id': milestone.id if milestone else None,
+            'batch_id': batch.id,
+            'subsidy_request_id': f'SR{now.strftime("%Y%m%d")}{uuid.uuid4().hex.upper()}',
+            'amount_disbursed': payment.amount,
+            'disbursement_date': now,
+            'transaction_type': 'milestone_payment' if milestone else 'subsidy_payment',
+            'beneficiary_account_number': producer.bank_account_number,
+            'beneficiary_bank_name': producer.bank_name,
+            'beneficiary_ifsc_code': producer.ifsc_code,
+            'disbursement_status': 'processing',  # completed once the bank confirms the file
+            'amount': payment.amount,
+            'comments': f'Milestone payment for: {milestone.milestone_name}' if milestone else None,
+            'date': now,
+            'created_at': now,
+            'updated_at': now,
+        })
+    # One executemany INSERT, then one query for the new ids (RETURNING would
+    # fall back to a statement per row on SQLite). Table-level inserts skip
+    # the ORM's per-row bookkeeping, which dominates at 10k rows.
+    db.session.execute(Transaction.__table__.insert(), rows)
+    transaction_ids = dict(db.session.execute(
+        select(Transaction.subsidy_request_id, Transaction.id).where(Transaction.batch_id == batch.id)).all())
+
+    ledger.disburse_many([(payment.application.id, payment.amount, transaction_ids[row['subsidy_request_id']])
+                          for payment, row in zip(payments, rows)])
+    db.session.execute(AuditEvent.__table__.insert(), [{
+        'created_at': now,
+        'action': 'milestone_paid' if payment.milestone else 'funds_released',
+        'user_id': bank_id,
+        'application_id': payment.application.id,
+        'details': json.dumps({'amount': payment.amount, 'batch': batch.reference,
+                               **({'milestone_id': payment.milestone.id} if payment.milestone else {})}),
+    } for payment in payments])
+    return batch, skipped
+
+
+def payable_ids():
+    """Ids of every pending release and payable milestone, for "pay everything" runs"""
+    from app.models import Application, Milestone
+    application_ids = db.session.scalars(
+        select(Application.id).where(Application.status == GOVT_APPROVED).order_by(Application.id)).all()
+    milestone_ids = db.session.scalars(
+        select(Milestone.id).where(Milestone.status == 'completed',
+                                   Milestone.auditor_verification_status == 'verified',
+                                   Milestone.payment_status == 'pending').order_by(Milestone.id)).all()
+    return application_ids, milestone_ids
+
+
+def _rows(batch, fmt):
+    from app.models import Application, Transaction, User
+    query = (
+        select(Transaction.subsidy_request_id, Transaction.application_id, Application.project_name,
+               Transaction.milestone_id, Transaction.transaction_type, User.company_name, User.name,
+               Transaction.beneficiary_account_number, Transaction.beneficiary_bank_name,
+               Transaction.beneficiary_ifsc_code, Transaction.amount_disbursed, Transaction.disbursement_date)
+        .join(Application, Application.id == Transaction.application_id)
+        .join(User, User.id == Application.producer_id)
+        .where(Transaction.batch_id == batch.id)
+        .order_by(Transaction.id)
+        .execution_options(yield_per=STREAM_CHUNK_ROWS)
+    )
+    for row in db.session.execute(query):
+        beneficiary = text_cell(row.company_name or row.name)
+        amount = f'{row.amount_disbursed:.2f}'
+        if fmt == 'neft':
+            yield ('RTGS' if row.amount_disbursed >= RTGS_MINIMUM else 'NEFT',
+                   text_cell(row.beneficiary_account_number), text_cell(row.beneficiary_ifsc_code), beneficiary, amount,
+                   row.disbursement_date.strftime('%d/%m/%Y'), batch.reference, row.subsidy_request_id)
+        else:
+            yield (row.subsidy_request_id, row.application_id, text_cell(row.project_name), row.milestone_id or '',
+                   row.transaction_type, beneficiary, text_cell(row.beneficiary_account_number),
+                   text_cell(row.beneficiary_bank_name), text_cell(row.beneficiary_ifsc_code), amount,
+                   row.disbursement_date.isoformat(sep=' ', timespec='seconds'))
+
+
+def payment_file(batch, fmt='neft'):
+    """Yield the payment file for a batch as CSV text, STREAM_CHUNK_ROWS rows at a time"""
+    return stream_csv(FORMATS[fmt], _rows(batch, fmt), STREAM_CHUNK_ROWS)
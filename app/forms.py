@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import StringField, PasswordField, SelectField, TextAreaField, FloatField, BooleanField, DateField, HiddenField, IntegerField
 from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional
 
@@ -196,6 +196,18 @@ class TransactionForm(FlaskForm):
     amount = FloatField('Amount (Legacy)', validators=[Optional(), NumberRange(min=0)])
     comments = TextAreaField('Comments (Legacy)', validators=[Optional()])
 
+class DisbursementBatchForm(FlaskForm):
+    # The selected application_ids / milestone_ids are plain checkboxes in the page
+    include_all = BooleanField('Include every pending release and verified milestone')
+
+class StatementUploadForm(FlaskForm):
+    statement = FileField('Bank Statement (CSV)', validators=[
+        FileRequired(), FileAllowed(['csv'], 'Upload the statement as a CSV file.')
+    ])
+
+class RematchForm(FlaskForm):
+    pass
+
 # Admin Forms for Policy Management
 class SubsidyPolicyForm(FlaskForm):
     policy_name = StringField('Policy Name', validators=[DataRequired(), Length(max=200)])
@@ -0,0 +1,171 @@
+"""
+Geohash index and server-side marker clustering for project locations.
+
+Every application with coordinates carries a geohash of its location
+(project_geohash, indexed), kept in step by mapper events in app.models.
+Points that share a geohash prefix lie in the same grid cell, so clustering
+a map view is one GROUP BY over a prefix of the column:
+
+1. The zoom level picks a prefix length whose cells are about an eighth of
+   the viewport wide. It is lowered until the viewport spans at most
+   MAX_CELLS cells, so a response never holds more than MAX_CELLS markers
+   however many plants are in view.
+2. The bounding box is snapped to that cell grid (so nearby pans share cache
+   entries) and turned into a few geohash prefix ranges. The ranges let the
+   query use the index instead of scanning every application.
+3. Each cell with applications becomes one marker at its members' centroid.
+   Cells holding a single application carry that application's details.
+
+A geohash column works the same on SQLite, PostgreSQL and MySQL, which an
+SQLite R*Tree virtual table would not.
+"""
+import math
+from sqlalchemy import and_, func, or_
+from app import db
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12
+MAX_CELLS = 256
+MAX_RANGES = 16
+# Viewport width in degrees at zoom 0 for a ~1000px map (256px tiles)
+VIEWPORT_DEGREES = 1440
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        bounds, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def location_hash(latitude, longitude):
+    """Geohash for an application's coordinates, or None if it has none"""
+    if latitude is None or longitude is None:
+        return None
+    return encode(max(-90.0, min(90.0, latitude)), max(-180.0, min(180.0, longitude)))
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def _grid(south, west, north, east, precision):
+    """Rows and columns of the cell grid covering a box"""
+    height, width = cell_size(precision)
+    rows = math.floor((north + 90) / height) - math.floor((south + 90) / height) + 1
+    columns = math.floor((east + 180) / width) - math.floor((west + 180) / width) + 1
+    return max(rows, 1), max(columns, 1)
+
+
+def cell_count(south, west, north, east, precision):
+    rows, columns = _grid(south, west, north, east, precision)
+    return rows * columns
+
+
+def covering(south, west, north, east, precision):
+    """Geohash prefixes of the cells covering a box"""
+    height, width = cell_size(precision)
+    rows, columns = _grid(south, west, north, east, precision)
+    first_row = math.floor((south + 90) / height)
+    first_column = math.floor((west + 180) / width)
+    return sorted({
+        encode(min(-90 + (first_row + row + 0.5) * height, 90.0),
+               min(-180 + (first_column + column + 0.5) * width, 180.0), precision)
+        for row in range(rows) for column in range(columns)
+    })
+
+
+def precision_for(zoom, south, west, north, east):
+    """Prefix length for a zoom level, coarsened until the box spans at most MAX_CELLS cells"""
+    target = VIEWPORT_DEGREES / 2 ** max(zoom, 0) / 8
+    precision = next((p for p in range(1, PRECISION + 1) if cell_size(p)[1] <= target), PRECISION)
+    while precision > 1 and cell_count(south, west, north, east, precision) > MAX_CELLS:
+        precision -= 1
+    return precision
+
+
+def snap(south, west, north, east, precision):
+    """Grow a box to the edges of the cells it touches"""
+    height, width = cell_size(precision)
+    return (max(-90.0, math.floor((south + 90) / height) * height - 90),
+            max(-180.0, math.floor((west + 180) / width) * width - 180),
+            min(90.0, math.ceil((north + 90) / height) * height - 90),
+            min(180.0, math.ceil((east + 180) / width) * width - 180))
+
+
+def _ranges(south, west, north, east, precision):
+    # The finest prefixes that still keep the OR short
+    while precision > 1 and cell_count(south, west, north, east, precision) > MAX_RANGES:
+        precision -= 1
+    from app.models import Application
+    column = Application.project_geohash
+    # '{' sorts right after 'z', the last geohash character
+    return or_(*(and_(column >= prefix, column < prefix + '{')
+                 for prefix in covering(south, west, north, east, precision)))
+
+
+def view(south, west, north, east, zoom):
+    """(precision, boxes) for a map view: the prefix length and the snapped box(es) to cluster.
+
+    A box with west > east crosses the antimeridian and is split in two.
+    """
+    boxes = [(south, west, north, east)] if west <= east else [(south, west, north, 180.0),
+                                                               (south, -180.0, north, east)]
+    precision = min(precision_for(zoom, *box) for box in boxes)
+    return precision, [snap(*box, precision) for box in boxes]
+
+
+def clusters(filters, precision, boxes):
+    """Clustered markers for the applications matching `filters` in a view() result.
+
+    Returns {'precision', 'total', 'clusters': [...]}; each cluster has lat,
+    lng and count, and single applications also id, name, status and
+    capacity_mw.
+    """
+    from app.models import Application
+    cell = func.substr(Application.project_geohash, 1, precision)
+    markers = []
+    for box_south, box_west, box_north, box_east in boxes:
+        rows = (
+            db.session.query(cell, func.count(), func.avg(Application.project_latitude),
+                             func.avg(Application.project_longitude), func.min(Application.id))
+            .filter(*filters, _ranges(box_south, box_west, box_north, box_east, precision),
+                    Application.project_latitude.between(box_south, box_north),
+                    Application.project_longitude.between(box_west, box_east))
+            .group_by(cell)
+            .all()
+        )
+        markers += [{'lat': round(lat, 6), 'lng': round(lng, 6), 'count': count, 'id': first}
+                    for _, count, lat, lng, first in rows]
+
+    singles = {marker['id']: marker for marker in markers if marker['count'] == 1}
+    if singles:
+        for row in (db.session.query(Application.id, Application.project_name, Application.status,
+                                     Application.capacity_mw)
+                    .filter(Application.id.in_(list(singles)))):
+            singles[row.id].update(name=row.project_name, status=row.status, capacity_mw=row.capacity_mw)
+    for marker in markers:
+        if marker['count'] > 1:
+            del marker['id']
+
+    return {
+        'precision': precision,
+        'total': sum(marker['count'] for marker in markers),
+        'clusters': markers,
+    }
@@ -0,0 +1,102 @@
+"""
+Idempotency keys for the disbursement endpoints.
+
+Forms that move money carry a hidden `idempotency_key` generated when the
+page is rendered (API clients send an `Idempotency-Key` header instead).
+The first POST with a key inserts an idempotency_key row inside the same
+transaction as the payment, so the key is claimed if and only if the
+payment commits. A retry or double-click with the same key finds the row
+and is answered from it with one indexed lookup: the stored redirect is
+replayed and the view never runs again. If the view rolls back (validation
+error, invalid transition), the claim rolls back with it and the key can be
+retried.
+
+Reusing a key for a different request (another endpoint or other form
+values) is refused with 422.
+"""
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import abort, flash, make_response, redirect, request
+from flask_login import current_user
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+HEADER = 'Idempotency-Key'
+FIELD = 'idempotency_key'
+IGNORED_FIELDS = {FIELD, 'csrf_token'}
+
+
+def new_key():
+    """Key for a form about to be rendered"""
+    return secrets.token_hex(16)
+
+
+def request_hash():
+    """SHA-256 of the endpoint, its arguments and the submitted form and files"""
+    digest = hashlib.sha256(request.endpoint.encode())
+    for name, value in sorted((request.view_args or {}).items()):
+        digest.update(f'\0{name}={value}'.encode())
+    for name in sorted(set(request.form) - IGNORED_FIELDS):
+        for value in request.form.getlist(name):
+            digest.update(f'\0{name}={value}'.encode())
+    for name in sorted(request.files):
+        for file in request.files.getlist(name):
+            digest.update(f'\0{name}@{file.filename}'.encode())
+    return digest.hexdigest()
+
+
+def _replay(claim, fingerprint):
+    if claim.endpoint != request.endpoint or claim.request_hash != fingerprint:
+        abort(422, description='This idempotency key was already used for a different request.')
+    flash('This request was already processed.', 'info')
+    return redirect(claim.response_location or request.path, code=claim.response_status or 302)
+
+
+def idempotent(view):
+    """Run a POST view at most once per (user, idempotency key)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from app.models import IdempotencyKey
+        key = request.headers.get(HEADER) or request.form.get(FIELD)
+        if request.method != 'POST' or not key:
+            return view(*args, **kwargs)
+        if len(key) > 64:
+            abort(400, description='Idempotency key is too long.')
+
+        fingerprint = request_hash()
+        claim = IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).first()
+        if claim is not None:
+            return _replay(claim, fingerprint)
+
+        claim = IdempotencyKey(user_id=current_user.id, key=key, endpoint=request.endpoint,
+                               request_hash=fingerprint)
+        db.session.add(claim)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # A concurrent request with the same key committed first
+            db.session.rollback()
+            claim = IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).one()
+            return _replay(claim, fingerprint)
+
+        # Views may return a rendered page rather than a Response (e.g. a form with errors)
+        response = make_response(view(*args, **kwargs))
+        # Only a committed claim is kept; if the view rolled back, the key is free again
+        if inspect(claim).persistent and response.status_code in (301, 302, 303):
+            claim.response_status = response.status_code
+            claim.response_location = response.location
+            db.session.commit()
+        return response
+    return wrapper
+
+
+def prune(days):
+    """Delete keys older than `days`; returns how many were removed"""
+    from app.models import IdempotencyKey
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    removed = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
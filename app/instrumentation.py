@@ -0,0 +1,259 @@
+"""
+Opt-in request instrumentation.
+
+With INSTRUMENTATION on, every request is counted and timed by endpoint for
+the /metrics endpoint (Prometheus text format). A random
+INSTRUMENTATION_SAMPLE_RATE share of requests is also profiled: number and
+time of SQL statements (engine cursor events), template render time and
+time spent in document storage. A profiled request answers with a
+Server-Timing header, which the browser's network panel shows next to the
+request, and writes one JSON line to the app.requests logger.
+
+Requests that are not sampled only pay for two clock reads and a counter
+update; the per-statement and per-template hooks return at once. Set the
+rate to 1 while chasing one slow page.
+
+Metrics are kept per process. Behind gunicorn or uvicorn with several
+workers each scrape sees one worker, so scrape them one by one or run a
+single worker where exact totals matter. When METRICS_TOKEN is set,
+/metrics wants it as `Authorization: Bearer <token>`.
+"""
+import hmac
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import Response, abort, current_app, g, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from app import db
+from app.startup import env_flag
+
+DEFAULT_SAMPLE_RATE = 0.01
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Components of a profiled request, as named in Server-Timing and the metrics
+COMPONENTS = ('sql', 'template', 'storage')
+
+_profile = ContextVar('request_profile', default=None)
+
+
+class Profile:
+    """Where one sampled request spent its time"""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(COMPONENTS, 0.0)
+        self.sql_statements = 0
+        self.started = {}
+
+    def start(self, component):
+        self.started.setdefault(component, []).append(time.perf_counter())
+
+    def stop(self, component):
+        started = self.started.get(component)
+        if started:
+            self.seconds[component] += time.perf_counter() - started.pop()
+
+
+@contextmanager
+def timed(component):
+    """Charge the block to `component` of the current request, if it is being profiled"""
+    profile = _profile.get()
+    if profile is None:
+        yield
+        return
+    profile.start(component)
+    try:
+        yield
+    finally:
+        profile.stop(component)
+
+
+class Metrics:
+    """Thread-safe request counters and histograms of one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.durations = {}
+        self.upload_bytes = Counter()
+        self.sampled = Counter()
+        self.sql_statements = Counter()
+        self.component_seconds = Counter()
+
+    def observe(self, endpoint, method, status, seconds, upload_bytes, profile=None):
+        with self._lock:
+            self.requests[endpoint, method, status] += 1
+            histogram = self.durations.get(endpoint)
+            if histogram is None:
+                histogram = self.durations[endpoint] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            if upload_bytes:
+                self.upload_bytes[endpoint] += upload_bytes
+            if profile is not None:
+                self.sampled[endpoint] += 1
+                self.sql_statements[endpoint] += profile.sql_statements
+                for component, spent in profile.seconds.items():
+                    self.component_seconds[endpoint, component] += spent
+
+    def render(self):
+        with self._lock:
+            lines = []
+            family(lines, 'smarthydropay_http_requests_total', 'counter', 'Requests handled.')
+            for (endpoint, method, status), value in sorted(self.requests.items()):
+                lines.append(sample('smarthydropay_http_requests_total', value,
+                                    endpoint=endpoint, method=method, status=status))
+            family(lines, 'smarthydropay_http_request_duration_seconds', 'histogram',
+                   'Time from the first before_request hook to the response.')
+            for endpoint, histogram in sorted(self.durations.items()):
+                for bound, value in zip(DURATION_BUCKETS, histogram):
+                    lines.append(sample('smarthydropay_http_request_duration_seconds_bucket', value,
+                                        endpoint=endpoint, le=repr(float(bound))))
+                lines.append(sample('smarthydropay_http_request_duration_seconds_bucket', histogram[-1],
+                                    endpoint=endpoint, le='+Inf'))
+                lines.append(sample('smarthydropay_http_request_duration_seconds_sum', histogram[-2],
+                                    endpoint=endpoint))
+                lines.append(sample('smarthydropay_http_request_duration_seconds_count', histogram[-1],
+                                    endpoint=endpoint))
+            family(lines, 'smarthydropay_http_upload_bytes_total', 'counter', 'Request body bytes received.')
+            for endpoint, value in sorted(self.upload_bytes.items()):
+                lines.append(sample('smarthydropay_http_upload_bytes_total', value, endpoint=endpoint))
+            family(lines, 'smarthydropay_profiled_requests_total', 'counter', 'Requests sampled for profiling.')
+            for endpoint, value in sorted(self.sampled.items()):
+                lines.append(sample('smarthydropay_profiled_requests_total', value, endpoint=endpoint))
+            family(lines, 'smarthydropay_profiled_sql_statements_total', 'counter',
+                   'SQL statements run by profiled requests.')
+            for endpoint, value in sorted(self.sql_statements.items()):
+                lines.append(sample('smarthydropay_profiled_sql_statements_total', value, endpoint=endpoint))
+            family(lines, 'smarthydropay_profiled_seconds_total', 'counter',
+                   'Time profiled requests spent in SQL, template rendering and document storage.')
+            for (endpoint, component), value in sorted(self.component_seconds.items()):
+                lines.append(sample('smarthydropay_profiled_seconds_total', value,
+                                    endpoint=endpoint, component=component))
+            return '\n'.join(lines) + '\n'
+
+
+def family(lines, name, kind, help_text):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def sample(name, value, **labels):
+    rendered = ','.join(f'{key}="{escape_label(str(label))}"' for key, label in labels.items())
+    return f'{name}{{{rendered}}} {value}'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def server_timing(total, profile):
+    parts = [f'app;dur={total * 1000:.1f}',
+             f'sql;dur={profile.seconds["sql"] * 1000:.1f};desc="{profile.sql_statements} statements"']
+    parts += [f'{component};dur={profile.seconds[component] * 1000:.1f}' for component in COMPONENTS[1:]]
+    return ', '.join(parts)
+
+
+def init_instrumentation(app):
+    """Profile and count requests when INSTRUMENTATION is on; adds /metrics"""
+    app.config.setdefault('INSTRUMENTATION', env_flag('INSTRUMENTATION'))
+    app.config.setdefault('INSTRUMENTATION_SAMPLE_RATE',
+                          float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)))
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+    if not app.config['INSTRUMENTATION']:
+        return
+
+    metrics = Metrics()
+    app.extensions['metrics'] = metrics
+    logger = app.logger.getChild('requests')
+    if not logger.level:
+        logger.setLevel('INFO')
+    sample_rate = app.config['INSTRUMENTATION_SAMPLE_RATE']
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_request():
+        g.instrumentation_started = time.perf_counter()
+        if random.random() < sample_rate:
+            g.instrumentation_token = _profile.set(Profile())
+
+    @app.after_request
+    def finish_request(response):
+        started = g.get('instrumentation_started')
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        upload_bytes = request.content_length or 0
+        profile = _profile.get()
+        metrics.observe(endpoint, request.method, str(response.status_code), total, upload_bytes, profile)
+        if profile is not None:
+            response.headers['Server-Timing'] = server_timing(total, profile)
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(total * 1000, 2),
+                'sql_statements': profile.sql_statements,
+                'sql_ms': round(profile.seconds['sql'] * 1000, 2),
+                'template_ms': round(profile.seconds['template'] * 1000, 2),
+                'storage_ms': round(profile.seconds['storage'] * 1000, 2),
+                'upload_bytes': upload_bytes,
+            }))
+        return response
+
+    @app.teardown_request
+    def end_profile(exc):
+        token = g.pop('instrumentation_token', None)
+        if token is not None:
+            _profile.reset(token)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            abort(401)
+    return Response(current_app.extensions['metrics'].render(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile.get()
+    if profile is not None:
+        profile.sql_statements += 1
+        profile.start('sql')
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile.get()
+    if profile is not None:
+        profile.stop('sql')
+
+
+def _before_render(sender, template, context, **extra):
+    profile = _profile.get()
+    if profile is not None:
+        profile.start('template')
+
+
+def _after_render(sender, template, context, **extra):
+    profile = _profile.get()
+    if profile is not None:
+        profile.stop('template')
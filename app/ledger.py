@@ -0,0 +1,205 @@
+"""
+Double-entry ledger of subsidy sanctions and disbursements.
+
+Each application has three accounts:
+- sanctioned: credited with the amount the scheme has committed
+- available: debited by the sanction and credited by every disbursement,
+  so its balance is what can still be paid out
+- disbursed: debited by every disbursement
+
+Every posting is a journal of ledger_entry lines whose debits equal their
+credits. ledger_balance keeps each account's running debit-minus-credit
+balance, so a balance check is a primary-key lookup rather than a SUM over
+transactions, and a disbursement claims funds with a conditional UPDATE on
+the available balance: two payments racing for the last of a sanction
+cannot both succeed.
+
+Sanctions (and bulk disbursements, whose Transactions the ORM never sees)
+are also counted into the reporting totals of app.summaries.
+"""
+import uuid
+from sqlalchemy import bindparam, insert, update
+from app import db
+
+SANCTIONED = 'sanctioned'
+AVAILABLE = 'available'
+DISBURSED = 'disbursed'
+
+# Amounts are rupees in floats; differences below a paisa are rounding
+TOLERANCE = 0.005
+
+
+class OverDisbursement(Exception):
+    """A disbursement would take more than the application has left"""
+
+    def __init__(self, application_id, amount, available):
+        self.application_id = application_id
+        self.amount = amount
+        self.available = available
+        super().__init__(f'Cannot disburse ₹{amount:,.2f} for application {application_id}: '
+                         f'only ₹{available:,.2f} of the sanctioned amount remains')
+
+
+def balance(application_id, account):
+    """Debit-minus-credit balance of an account (0 if it has no postings)"""
+    from app.models import LedgerBalance
+    value = (db.session.query(LedgerBalance.balance)
+             .filter_by(application_id=application_id, account=account).scalar())
+    return value or 0
+
+
+def sanctioned(application_id):
+    return -balance(application_id, SANCTIONED)
+
+
+def available(application_id):
+    return balance(application_id, AVAILABLE)
+
+
+def disbursed(application_id):
+    return balance(application_id, DISBURSED)
+
+
+def _post(application_id, lines, transaction=None, claim=None):
+    """Write one balanced journal of (account, debit, credit) lines.
+
+    With claim=(account, amount) that account's balance is only reduced if it
+    holds at least `amount`; returns False (having written nothing) if not.
+    """
+    from app.models import LedgerBalance, LedgerEntry
+    assert abs(sum(debit - credit for _, debit, credit in lines)) < TOLERANCE, 'unbalanced journal'
+
+    journal = uuid.uuid4().hex
+    for account, debit, credit in lines:
+        delta = debit - credit
+        query = (update(LedgerBalance)
+                 .where(LedgerBalance.application_id == application_id, LedgerBalance.account == account))
+        if claim is not None and claim[0] == account:
+            query = query.where(LedgerBalance.balance >= claim[1] - TOLERANCE)
+        result = db.session.execute(
+            query.values(balance=LedgerBalance.balance + delta, updated_at=db.func.now())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            if claim is not None and claim[0] == account:
+                return False
+            db.session.execute(insert(LedgerBalance).values(
+                application_id=application_id, account=account, balance=delta))
+    db.session.add_all([
+        LedgerEntry(journal=journal, application_id=application_id, account=account,
+                    debit=debit, credit=credit, transaction_id=transaction.id if transaction else None)
+        for account, debit, credit in lines
+    ])
+    return True
+
+
+def sanction(application, amount):
+    """Commit `amount` of subsidy to the application"""
+    from app.summaries import record_sanction
+    _post(application.id, [(AVAILABLE, amount, 0), (SANCTIONED, 0, amount)])
+    application.total_sanctioned_amount = sanctioned(application.id)
+    record_sanction(application.id, amount)
+
+
+def disburse(application_id, amount, transaction):
+    """Pay `amount` out of the application's available balance, in the current transaction.
+
+    Raises OverDisbursement if less than `amount` remains; the caller should
+    roll back.
+    """
+    # The claimed (credited) line goes first so nothing is written when it fails
+    if not _post(application_id, [(AVAILABLE, 0, amount), (DISBURSED, amount, 0)],
+                 transaction=transaction, claim=(AVAILABLE, amount)):
+        raise OverDisbursement(application_id, amount, available(application_id))
+
+
+def balances(application_ids, account):
+    """{application_id: balance} for one account of many applications"""
+    from app.models import LedgerBalance
+    found = {}
+    for chunk in chunked(application_ids):
+        found.update(db.session.query(LedgerBalance.application_id, LedgerBalance.balance)
+                     .filter(LedgerBalance.application_id.in_(chunk), LedgerBalance.account == account))
+    return found
+
+
+def sanction_many(amounts):
+    """Sanction {application_id: amount} in bulk; the applications must have no sanction yet"""
+    from app.models import Application, LedgerBalance, LedgerEntry
+    from app.summaries import record_sanction
+    if not amounts:
+        return
+    entries, rows = [], []
+    for application_id, amount in amounts.items():
+        journal = uuid.uuid4().hex
+        entries += [
+            {'journal': journal, 'application_id': application_id, 'account': AVAILABLE, 'debit': amount, 'credit': 0},
+            {'journal': journal, 'application_id': application_id, 'account': SANCTIONED, 'debit': 0, 'credit': amount},
+        ]
+        rows += [
+            {'application_id': application_id, 'account': AVAILABLE, 'balance': amount},
+            {'application_id': application_id, 'account': SANCTIONED, 'balance': -amount},
+        ]
+    db.session.execute(LedgerEntry.__table__.insert(), entries)
+    db.session.execute(LedgerBalance.__table__.insert(), rows)
+    db.session.execute(update(Application), [
+        {'id': application_id, 'total_sanctioned_amount': amount} for application_id, amount in amounts.items()
+    ])
+    for application_id, amount in amounts.items():
+        record_sanction(application_id, amount)
+
+
+def disburse_many(payments):
+    """Post [(application_id, amount, transaction_id)] disbursements in bulk, in the current transaction.
+
+    Balances are moved with one executemany UPDATE per account and then
+    checked; raises OverDisbursement (the caller should roll back) if any
+    application ends up paying out more than it had available.
+    """
+    from app.models import LedgerBalance, LedgerEntry
+    from app.summaries import record_payments
+    if not payments:
+        return
+    totals = {}
+    entries = []
+    for application_id, amount, transaction_id in payments:
+        totals[application_id] = totals.get(application_id, 0) + amount
+        journal = uuid.uuid4().hex
+        entries += [
+            {'journal': journal, 'application_id': application_id, 'account': AVAILABLE,
+             'debit': 0, 'credit': amount, 'transaction_id': transaction_id},
+            {'journal': journal, 'application_id': application_id, 'account': DISBURSED,
+             'debit': amount, 'credit': 0, 'transaction_id': transaction_id},
+        ]
+
+    missing = set(totals) - set(balances(list(totals), DISBURSED))
+    if missing:
+        db.session.execute(LedgerBalance.__table__.insert(), [
+            {'application_id': application_id, 'account': DISBURSED, 'balance': 0} for application_id in missing
+        ])
+    table = LedgerBalance.__table__
+    connection = db.session.connection()
+    for account, sign in ((AVAILABLE, -1), (DISBURSED, 1)):
+        connection.execute(
+            table.update()
+            .where(table.c.application_id == bindparam('b_application_id'), table.c.account == account)
+            .values(balance=table.c.balance + sign * bindparam('b_amount'), updated_at=db.func.now()),
+            [{'b_application_id': application_id, 'b_amount': amount} for application_id, amount in totals.items()],
+        )
+
+    remaining = balances(list(totals), AVAILABLE)
+    for application_id, amount in totals.items():
+        if application_id not in remaining:
+            raise OverDisbursement(application_id, amount, 0)
+        if remaining[application_id] < -TOLERANCE:
+            raise OverDisbursement(application_id, amount, remaining[application_id] + amount)
+    db.session.execute(LedgerEntry.__table__.insert(), entries)
+    # Batch Transactions are bulk-inserted, so the ORM flush hook never sees them
+    record_payments([transaction_id for _, _, transaction_id in payments])
+
+
+def chunked(values, size=500):
+    """Split a list of ids into pieces small enough for an IN clause"""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
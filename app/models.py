@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 import json
@@ -51,6 +52,12 @@ class User(UserMixin, db.Model):
         return f'<User {self.name}>'
 
 class Application(db.Model):
+    # Listings filter on status/producer and page on (created_at, id)
+    __table_args__ = (
+        db.Index('ix_application_status_created_at', 'status', 'created_at'),
+        db.Index('ix_application_producer_created_at', 'producer_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     producer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
@@ -64,8 +71,16 @@ class Application(db.Model):
     project_location = db.Column(db.String(200), nullable=True)
     project_latitude = db.Column(db.Float, nullable=True)  # Latitude for map display
     project_longitude = db.Column(db.Float, nullable=True)  # Longitude for map display
+    project_geohash = db.Column(db.String(12), nullable=True, index=True)  # set from the coordinates, see app.geo
     capex_estimate = db.Column(db.Float, nullable=True)
     opex_estimate = db.Column(db.Float, nullable=True)
+    expected_completion_date = db.Column(db.Date, nullable=True)
+    
+    # Infrastructure & compliance
+    land_acquisition_status = db.Column(db.String(100), nullable=True)
+    power_supply_arrangement = db.Column(db.String(200), nullable=True)
+    water_source = db.Column(db.String(200), nullable=True)
+    environmental_clearance = db.Column(db.Boolean, default=False)
     
     # Legacy fields for backward compatibility
     capacity = db.Column(db.Float, nullable=False, default=0)
@@ -102,33 +117,64 @@ class Application(db.Model):
     
     def calculate_subsidy_amount(self):
         """Calculate total subsidy amount based on rates and capacity"""
+        from app.policy_engine import CRORE
         total = 0
         if self.subsidy_rate_per_ton and self.capacity_tons:
             total += self.subsidy_rate_per_ton * self.capacity_tons
         if self.subsidy_rate_per_mw and self.capacity_mw:
             total += self.subsidy_rate_per_mw * self.capacity_mw
         if self.subsidy_rate_percentage and self.capex_estimate:
-            total += (self.subsidy_rate_percentage / 100) * self.capex_estimate
+            total += (self.subsidy_rate_percentage / 100) * self.capex_estimate * CRORE
         return total
     
     def __repr__(self):
         return f'<Application {self.project_name}>'
 
+@event.listens_for(Application, 'before_insert')
+@event.listens_for(Application, 'before_update')
+def _index_location(mapper, connection, application):
+    # Keep the geohash in step with the coordinates on every ORM write
+    from app.geo import location_hash
+    application.project_geohash = location_hash(application.project_latitude, application.project_longitude)
+
 class Milestone(db.Model):
+    __table_args__ = (
+        # The bank's payment queue: completed, verified and unpaid, newest first
+        db.Index('ix_milestone_payment_queue', 'status', 'auditor_verification_status', 'payment_status',
+                 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False)
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False, index=True)
     milestone_name = db.Column(db.String(200), nullable=False)
     milestone_date = db.Column(db.DateTime, nullable=False)
     production_data_tons_month = db.Column(db.Float, nullable=True)
     expenditure_report_path = db.Column(db.String(300), nullable=True)  # PDF/Excel file path
     compliance_certificate_path = db.Column(db.String(300), nullable=True)  # PDF file path
     status = db.Column(db.String(20), default='pending')  # pending, completed, verified
+    milestone_amount = db.Column(db.Float, nullable=True)
+    milestone_description = db.Column(db.Text, nullable=True)
+    milestone_percentage = db.Column(db.Float, nullable=True)
+    planned_completion_date = db.Column(db.Date, nullable=True)
+    milestone_document_path = db.Column(db.String(300), nullable=True)
+    
+    # Auditor verification and payment tracking
+    auditor_verification_status = db.Column(db.String(20), default='pending')  # pending, verified, rejected
+    auditor_verification_date = db.Column(db.DateTime, nullable=True)
+    auditor_verification_comments = db.Column(db.Text, nullable=True)
+    payment_status = db.Column(db.String(20), default='pending')  # pending, paid
+    payment_date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<Milestone {self.milestone_name}>'
 
 class Audit(db.Model):
+    __table_args__ = (
+        db.Index('ix_audit_application_auditor', 'application_id', 'auditor_id'),
+        db.Index('ix_audit_auditor_created_at', 'auditor_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False)
     auditor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -137,38 +183,79 @@ class Audit(db.Model):
     audit_report_path = db.Column(db.String(300), nullable=True)  # PDF file path
     audit_comments = db.Column(db.Text, nullable=True)
     compliance_status = db.Column(db.String(10), nullable=False, default='pending')  # pass, fail, pending
+    technical_compliance = db.Column(db.String(30), nullable=True)  # compliant, non_compliant, partially_compliant
+    financial_compliance = db.Column(db.String(30), nullable=True)
+    environmental_compliance = db.Column(db.String(30), nullable=True)
+    overall_compliance_score = db.Column(db.Integer, nullable=True)  # 0-100
+    recommendations = db.Column(db.Text, nullable=True)
+    audit_date = db.Column(db.DateTime, nullable=True)
     
     # Legacy fields
     comments = db.Column(db.Text, nullable=True)
     verified = db.Column(db.Boolean, default=False)
     
-    # Audit logs (auto-generated)
+    # Legacy audit log, superseded by AuditEvent (read with Audit.history())
     audit_log = db.Column(db.Text, nullable=True)  # JSON string of audit actions
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def add_audit_log(self, action, user_id, details=None):
-        """Add an entry to the audit log"""
-        if not self.audit_log:
-            self.audit_log = '[]'
-        
-        log_entries = json.loads(self.audit_log)
-        log_entry = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'action': action,
-            'user_id': user_id,
-            'details': details
-        }
-        log_entries.append(log_entry)
-        self.audit_log = json.dumps(log_entries)
+        """Add an entry to the audit log (one AuditEvent insert; the audit row is not touched)"""
+        from app.audit_trail import record_event
+        return record_event(action, user_id, application_id=self.application_id, audit=self, details=details)
+    
+    def history(self):
+        """Entries from the legacy audit_log blob followed by this audit's events, oldest first"""
+        from app.audit_trail import legacy_entries
+        events = AuditEvent.query.filter_by(audit_id=self.id).order_by(AuditEvent.created_at, AuditEvent.id)
+        return legacy_entries(self.audit_log) + [event.to_entry() for event in events]
     
     def __repr__(self):
         return f'<Audit {self.id}>'
 
+class AuditEvent(db.Model):
+    """Append-only record of one workflow action"""
+    __tablename__ = 'audit_event'
+    __table_args__ = (
+        db.Index('ix_audit_event_action_created_at', 'action', 'created_at'),
+        db.Index('ix_audit_event_application_created_at', 'application_id', 'created_at'),
+        db.Index('ix_audit_event_audit_created_at', 'audit_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    action = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=True)
+    audit_id = db.Column(db.Integer, db.ForeignKey('audit.id'), nullable=True)
+    details = db.Column(db.Text, nullable=True)  # JSON
+    
+    user = db.relationship('User')
+    application = db.relationship('Application')
+    audit = db.relationship('Audit')
+    
+    def to_entry(self):
+        """The event in the shape of a legacy audit_log entry"""
+        return {
+            'timestamp': self.created_at.isoformat(),
+            'action': self.action,
+            'user_id': self.user_id,
+            'details': json.loads(self.details) if self.details else None,
+        }
+    
+    def __repr__(self):
+        return f'<AuditEvent {self.id} {self.action}>'
+
 class Transaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_transaction_bank_created_at', 'bank_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     bank_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False)
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False, index=True)
+    milestone_id = db.Column(db.Integer, db.ForeignKey('milestone.id'), nullable=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('disbursement_batch.id'), nullable=True, index=True)
     
     # Bank transaction details
     subsidy_request_id = db.Column(db.String(100), unique=True, nullable=False)  # Auto-generated
@@ -176,6 +263,12 @@ class Transaction(db.Model):
     amount_disbursed = db.Column(db.Float, nullable=False)
     disbursement_date = db.Column(db.DateTime, nullable=True)
     payment_confirmation_path = db.Column(db.String(300), nullable=True)  # Bank statement upload
+    transaction_type = db.Column(db.String(30), nullable=True)  # subsidy_payment, milestone_payment, ...
+    
+    # Beneficiary account the funds were sent to
+    beneficiary_account_number = db.Column(db.String(50), nullable=True)
+    beneficiary_bank_name = db.Column(db.String(100), nullable=True)
+    beneficiary_ifsc_code = db.Column(db.String(20), nullable=True)
     
     # Status tracking
     disbursement_status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
@@ -191,22 +284,219 @@ class Transaction(db.Model):
     def generate_request_id(self):
         """Generate unique subsidy request ID"""
         import uuid
-        self.subsidy_request_id = f"SR{datetime.utcnow().strftime('%Y%m%d')}{str(uuid.uuid4().hex[:6]).upper()}"
+        self.subsidy_request_id = f"SR{datetime.utcnow().strftime('%Y%m%d')}{uuid.uuid4().hex.upper()}"
+        return self.subsidy_request_id
     
     def __repr__(self):
         return f'<Transaction {self.subsidy_request_id}>'
 
+class DisbursementBatch(db.Model):
+    """One bank run paying many releases and milestones together"""
+    __tablename__ = 'disbursement_batch'
+    __table_args__ = (
+        db.Index('ix_disbursement_batch_bank_created_at', 'bank_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bank_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    reference = db.Column(db.String(40), unique=True, nullable=False)  # Debit narration in the payment file
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    skipped = db.Column(db.Text, nullable=True)  # JSON list of items left out and why
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    bank = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<DisbursementBatch {self.reference}>'
+
+class BankStatement(db.Model):
+    """One uploaded bank statement file"""
+    __tablename__ = 'bank_statement'
+    __table_args__ = (
+        db.UniqueConstraint('bank_id', 'sha256', name='uq_bank_statement_bank_sha256'),
+        db.Index('ix_bank_statement_bank_created_at', 'bank_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bank_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(200), nullable=True)
+    sha256 = db.Column(db.String(64), nullable=False)  # the same file is only imported once
+    
+    line_count = db.Column(db.Integer, nullable=False, default=0)  # new lines added by this file
+    duplicate_count = db.Column(db.Integer, nullable=False, default=0)  # lines already seen in earlier files
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BankStatement {self.filename}>'
+
+class StatementLine(db.Model):
+    """A bank statement line and what it was reconciled against"""
+    __tablename__ = 'statement_line'
+    __table_args__ = (
+        db.UniqueConstraint('bank_id', 'line_hash', name='uq_statement_line_bank_hash'),
+        db.Index('ix_statement_line_bank_status_created_at', 'bank_id', 'status', 'created_at'),
+        # A bank's lines in import order, whatever their status (reconciliation page, CSV report)
+        db.Index('ix_statement_line_bank_created_at', 'bank_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    statement_id = db.Column(db.Integer, db.ForeignKey('bank_statement.id'), nullable=False)
+    bank_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    line_number = db.Column(db.Integer, nullable=False)
+    line_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the line's content
+    value_date = db.Column(db.Date, nullable=True)
+    amount = db.Column(db.Float, nullable=True)
+    reference = db.Column(db.String(100), nullable=True)
+    narration = db.Column(db.String(300), nullable=True)
+    
+    # matched, mismatched (found its transaction but amount/date disagree), unmatched
+    status = db.Column(db.String(20), nullable=False)
+    reason = db.Column(db.String(200), nullable=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=True, unique=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    statement = db.relationship('BankStatement')
+    transaction = db.relationship('Transaction')
+    
+    def __repr__(self):
+        return f'<StatementLine {self.statement_id}:{self.line_number} {self.status}>'
+
 class SubsidyPolicy(db.Model):
     """Policy database for subsidy rules and rates"""
     id = db.Column(db.Integer, primary_key=True)
     policy_name = db.Column(db.String(200), nullable=False)
-    technology_type = db.Column(db.String(100), nullable=False)
+    technology_type = db.Column(db.String(100), nullable=False, index=True)
     rate_per_ton = db.Column(db.Float, nullable=True)
     rate_per_mw = db.Column(db.Float, nullable=True)
     rate_percentage_capex = db.Column(db.Float, nullable=True)
+    min_capacity_threshold = db.Column(db.Float, nullable=True)  # MW
+    max_capacity_threshold = db.Column(db.Float, nullable=True)  # MW
+    policy_start_date = db.Column(db.Date, nullable=True)
+    policy_end_date = db.Column(db.Date, nullable=True)
     eligibility_criteria = db.Column(db.Text, nullable=True)  # JSON string
     is_active = db.Column(db.Boolean, default=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<SubsidyPolicy {self.policy_name}>'
+
+class PolicyRevision(db.Model):
+    """Single-row counter bumped whenever subsidy policies change"""
+    __tablename__ = 'policy_revision'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+class IdempotencyKey(db.Model):
+    """Client-supplied key claimed by the first request that carries it"""
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the endpoint and form
+    response_status = db.Column(db.Integer, nullable=True)
+    response_location = db.Column(db.String(300), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key}>'
+
+class LedgerEntry(db.Model):
+    """One line of a balanced ledger journal; never updated or deleted"""
+    __tablename__ = 'ledger_entry'
+    __table_args__ = (
+        db.Index('ix_ledger_entry_application_account', 'application_id', 'account'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    journal = db.Column(db.String(32), nullable=False, index=True)  # lines of one posting share it
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False)
+    account = db.Column(db.String(20), nullable=False)  # sanctioned, available, disbursed
+    debit = db.Column(db.Float, nullable=False, default=0)
+    credit = db.Column(db.Float, nullable=False, default=0)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<LedgerEntry {self.journal} {self.account}>'
+
+class LedgerBalance(db.Model):
+    """Running debit-minus-credit balance of one ledger account"""
+    __tablename__ = 'ledger_balance'
+    
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), primary_key=True)
+    account = db.Column(db.String(20), primary_key=True)
+    balance = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<LedgerBalance {self.application_id} {self.account} {self.balance}>'
+
+class ApplicationSummary(db.Model):
+    """Applications and their capacity per technology and status, kept by app.summaries"""
+    __tablename__ = 'application_summary'
+    
+    technology = db.Column(db.String(100), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    application_count = db.Column(db.Integer, nullable=False, default=0)
+    capacity_mw = db.Column(db.Float, nullable=False, default=0)
+    capacity_tons = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ApplicationSummary {self.technology} {self.status} {self.application_count}>'
+
+class FundingSummary(db.Model):
+    """Sanctioned and disbursed totals per technology, kept by app.summaries"""
+    __tablename__ = 'funding_summary'
+    
+    technology = db.Column(db.String(100), primary_key=True)
+    sanctioned_amount = db.Column(db.Float, nullable=False, default=0)
+    disbursed_amount = db.Column(db.Float, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<FundingSummary {self.technology}>'
+
+class BankSummary(db.Model):
+    """Disbursed total per bank, kept by app.summaries"""
+    __tablename__ = 'bank_summary'
+    
+    bank_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    disbursed_amount = db.Column(db.Float, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<BankSummary {self.bank_id}>'
+
+class OutboxEmail(db.Model):
+    """Email queued in the same transaction as the change that triggered it"""
+    __tablename__ = 'outbox_email'
+    __table_args__ = (
+        db.Index('ix_outbox_email_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=True)
+    html = db.Column(db.Text, nullable=True)
+    
+    # Delivery state
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # retry time or claim lease expiry
+    claim_token = db.Column(db.String(32), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} {self.status}>'
@@ -0,0 +1,43 @@
+"""
+Status-change emails to producers, driven by workflow transitions.
+
+The email is queued in the outbox inside the transaction that changed the
+status, so it is sent only if that change commits.
+"""
+from flask import current_app
+from app.outbox import queue_email
+from app.startup import env_flag
+from app.workflow import transitioned
+
+STATUS_MESSAGES = {
+    'auditor_verified': 'has passed the technical audit and is awaiting government approval',
+    'requires_revision': 'needs revisions requested by the auditor',
+    'under_government_review': 'is under government review',
+    'govt_approved': 'has been approved by the government and is queued for fund release',
+    'fund_released': 'has had its subsidy funds released',
+    'rejected': 'has been rejected',
+}
+
+
+def notify_producer(application, transition, from_status, to_status):
+    if not current_app.config.get('STATUS_EMAILS'):
+        return
+    message = STATUS_MESSAGES.get(to_status)
+    producer = application.producer
+    if message is None or producer is None or not producer.email:
+        return
+    queue_email(
+        producer.email,
+        f'SmartHydroPay - {application.project_name}: {to_status.replace("_", " ").title()}',
+        body=f'''
+        Your application "{application.project_name}" {message}.
+
+        Sign in to SmartHydroPay to see the details.
+        ''',
+    )
+
+
+def init_notifications(app):
+    """Email producers on status changes unless STATUS_EMAILS is off"""
+    app.config.setdefault('STATUS_EMAILS', env_flag('STATUS_EMAILS', default=True))
+    transitioned.connect(notify_producer)
@@ -0,0 +1,207 @@
+"""
+Transactional email outbox.
+
+Views call queue_email() before committing, so the email row is written in
+the same transaction as the change that triggered it and the request
+returns right after the commit. A small pool of background threads (or
+`flask outbox-worker`) claims due rows in batches, sends each batch over a
+single SMTP connection and retries failures with exponential backoff.
+
+MAIL_BACKEND = 'file' writes each message as an .eml file under
+MAIL_FILE_SINK_DIR instead of talking to SMTP, for development and tests.
+
+Bodies carry one-time passwords, so they are blanked once a message is
+sent; `flask outbox-prune` deletes sent and failed rows after a while.
+"""
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from flask_mail import Message
+from sqlalchemy import event, update
+from app import db, mail
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+CLAIM_LEASE_SECONDS = 300
+POLL_SECONDS = 5
+
+
+def queue_email(recipient, subject, body=None, html=None):
+    """Add an email to the outbox; it is sent once the caller commits"""
+    from app.models import OutboxEmail
+    email = OutboxEmail(recipient=recipient, subject=subject, body=body, html=html)
+    db.session.add(email)
+    db.session.info['outbox_queued'] = True
+    return email
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """Atomically claim up to batch_size due emails and return them.
+
+    Rows stuck in 'sending' past their lease (a worker died mid-send) are
+    claimable again. The claim is a conditional UPDATE, so several threads
+    or processes never pick up the same row.
+    """
+    from app.models import OutboxEmail
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    due = db.session.query(OutboxEmail.id).filter(
+        OutboxEmail.status.in_(('pending', 'sending')),
+        OutboxEmail.next_attempt_at <= now,
+    ).order_by(OutboxEmail.next_attempt_at).limit(batch_size).subquery()
+
+    db.session.execute(
+        update(OutboxEmail)
+        .where(OutboxEmail.id.in_(db.select(due.c.id)))
+        .where(OutboxEmail.next_attempt_at <= now)
+        .values(status='sending', claim_token=token,
+                attempts=OutboxEmail.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return OutboxEmail.query.filter_by(claim_token=token, status='sending').all()
+
+
+def to_message(email):
+    from flask import current_app
+    sender = current_app.config.get('MAIL_DEFAULT_SENDER') or current_app.config.get('MAIL_USERNAME')
+    return Message(email.subject, sender=sender, recipients=[email.recipient],
+                   body=email.body, html=email.html)
+
+
+def send_batch(emails):
+    """Send claimed emails, returning {id: error or None}"""
+    from flask import current_app
+    results = {}
+
+    if current_app.config.get('MAIL_BACKEND') == 'file':
+        sink = current_app.config['MAIL_FILE_SINK_DIR']
+        os.makedirs(sink, exist_ok=True)
+        for email in emails:
+            path = os.path.join(sink, f'{email.id:08d}-{email.claim_token}.eml')
+            with open(path, 'w') as f:
+                f.write(to_message(email).as_string())
+            results[email.id] = None
+        return results
+
+    try:
+        with mail.connect() as connection:
+            for email in emails:
+                try:
+                    connection.send(to_message(email))
+                    results[email.id] = None
+                except Exception as e:
+                    results[email.id] = str(e)
+    except Exception as e:
+        # Could not reach the SMTP server at all
+        for email in emails:
+            results.setdefault(email.id, str(e))
+    return results
+
+
+def deliver_pending(batch_size=BATCH_SIZE):
+    """Claim and send one batch; returns the number of emails handled"""
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0
+
+    results = send_batch(emails)
+    now = datetime.utcnow()
+    for email in emails:
+        error = results.get(email.id, 'not sent')
+        if error is None:
+            email.status = 'sent'
+            email.sent_at = now
+            email.last_error = None
+            email.body = email.html = None
+        elif email.attempts >= MAX_ATTEMPTS:
+            email.status = 'failed'
+            email.last_error = error
+        else:
+            email.status = 'pending'
+            email.last_error = error
+            email.next_attempt_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (email.attempts - 1))
+        email.claim_token = None
+    db.session.commit()
+    return len(emails)
+
+
+def prune(days):
+    """Delete sent and failed emails created more than `days` ago; returns how many were removed"""
+    from app.models import OutboxEmail
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    removed = OutboxEmail.query.filter(
+        OutboxEmail.status.in_(('sent', 'failed')),
+        OutboxEmail.created_at < cutoff,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+class OutboxWorker:
+    """Background threads that drain the outbox for one app"""
+
+    def __init__(self, app, threads=1, batch_size=BATCH_SIZE, poll_seconds=POLL_SECONDS):
+        self.app = app
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pool = []
+
+    def start(self):
+        for n in range(self.threads):
+            thread = threading.Thread(target=self._run, name=f'outbox-{n}', daemon=True)
+            thread.start()
+            self._pool.append(thread)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._pool:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    # Keep going while full batches come back
+                    while deliver_pending(self.batch_size) == self.batch_size:
+                        pass
+                except Exception:
+                    self.app.logger.exception('Outbox delivery failed')
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+def init_outbox(app, start_worker=True):
+    """Configure mail delivery and, unless disabled, start the worker threads"""
+    app.config.setdefault('MAIL_BACKEND', os.environ.get('MAIL_BACKEND', 'smtp'))
+    app.config.setdefault('MAIL_FILE_SINK_DIR', os.environ.get(
+        'MAIL_FILE_SINK_DIR', os.path.join(app.instance_path, 'mail_sink')))
+    app.config.setdefault('OUTBOX_WORKER_THREADS', int(os.environ.get('OUTBOX_WORKER_THREADS', 1)))
+
+    worker = OutboxWorker(app, threads=app.config['OUTBOX_WORKER_THREADS'])
+    app.extensions['outbox'] = worker
+    if start_worker and worker.threads > 0:
+        worker.start()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_outbox_worker(session):
+    # Deliver right away instead of waiting for the next poll
+    if session.info.pop('outbox_queued', False):
+        from flask import current_app
+        worker = current_app.extensions.get('outbox')
+        if worker is not None:
+            worker.wake()
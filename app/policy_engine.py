@@ -0,0 +1,218 @@
+"""
+Subsidy policy engine.
+
+Active SubsidyPolicy rows are compiled once into an in-process table keyed
+by technology type, with their eligibility criteria parsed. Pricing an
+application is then a dictionary lookup plus arithmetic, and every quote
+explains each amount and eligibility check.
+
+The compiled table is tagged with the version stored in policy_revision.
+Policy edits call bump_policy_version() in the same transaction; the editing
+process recompiles right after the commit, and other workers notice the new
+version within POLICY_VERSION_CHECK_SECONDS.
+"""
+import json
+import operator
+import os
+import threading
+import time
+from datetime import date
+from flask import current_app
+from sqlalchemy import event, update
+from app import db
+
+CRORE = 10_000_000  # CAPEX estimates are entered in crores of rupees
+POLICY_VERSION_CHECK_SECONDS = 5
+
+# eligibility_criteria keys checked automatically: key -> (application attribute, test, unit)
+CRITERIA = {
+    'min_capacity_mw': ('capacity_mw', operator.ge, 'MW'),
+    'max_capacity_mw': ('capacity_mw', operator.le, 'MW'),
+    'min_capacity_tons': ('capacity_tons', operator.ge, 'tons/year'),
+    'max_capacity_tons': ('capacity_tons', operator.le, 'tons/year'),
+    'max_capex_crores': ('capex_estimate', operator.le, 'crores'),
+}
+
+
+def parse_criteria(text):
+    """Eligibility criteria JSON as a dict; free text is kept under 'notes'"""
+    if not text:
+        return {}
+    try:
+        criteria = json.loads(text)
+    except ValueError:
+        return {'notes': text}
+    return criteria if isinstance(criteria, dict) else {'notes': text}
+
+
+class CompiledPolicy:
+    """Immutable snapshot of one active policy"""
+
+    def __init__(self, policy):
+        self.id = policy.id
+        self.policy_name = policy.policy_name
+        self.technology_type = policy.technology_type
+        self.rate_per_ton = policy.rate_per_ton
+        self.rate_per_mw = policy.rate_per_mw
+        self.rate_percentage_capex = policy.rate_percentage_capex
+        self.min_capacity_threshold = policy.min_capacity_threshold
+        self.max_capacity_threshold = policy.max_capacity_threshold
+        self.policy_start_date = policy.policy_start_date
+        self.policy_end_date = policy.policy_end_date
+        self.criteria = parse_criteria(policy.eligibility_criteria)
+
+    def checks(self, application, today):
+        """[(passed, message)]; passed is None for criteria that need a manual check"""
+        results = []
+        if self.policy_start_date and today < self.policy_start_date:
+            results.append((False, f'Policy starts on {self.policy_start_date}'))
+        if self.policy_end_date and today > self.policy_end_date:
+            results.append((False, f'Policy ended on {self.policy_end_date}'))
+
+        # The policy's capacity thresholds take precedence over the same keys in its criteria JSON
+        limits = {key: value for key, value in self.criteria.items() if key != 'notes'}
+        if self.min_capacity_threshold is not None:
+            limits['min_capacity_mw'] = self.min_capacity_threshold
+        if self.max_capacity_threshold is not None:
+            limits['max_capacity_mw'] = self.max_capacity_threshold
+        for key, limit in limits.items():
+            if limit is None:
+                continue
+            if key not in CRITERIA:
+                results.append((None, f'{key.replace("_", " ")}: {limit} (verify manually)'))
+                continue
+            try:
+                limit = float(limit)
+            except (TypeError, ValueError):
+                results.append((None, f'{key.replace("_", " ")}: {limit} (verify manually)'))
+                continue
+            attribute, test, unit = CRITERIA[key]
+            value = getattr(application, attribute)
+            label = attribute.replace('_', ' ')
+            if value is None:
+                results.append((False, f'{label} not stated ({key.replace("_", " ")} {limit:g} {unit})'))
+            else:
+                sign = '≥' if test is operator.ge else '≤'
+                results.append((bool(test(value, limit)), f'{label} {value:g} {unit} {sign} {limit:g} {unit}'))
+        if 'notes' in self.criteria:
+            results.append((None, str(self.criteria['notes'])))
+        return results
+
+    def lines(self, application):
+        """[(description, amount)] for each rate that applies to the application"""
+        lines = []
+        if self.rate_per_ton and application.capacity_tons:
+            lines.append((f'{application.capacity_tons:g} tons × ₹{self.rate_per_ton:,.0f}/ton',
+                          self.rate_per_ton * application.capacity_tons))
+        if self.rate_per_mw and application.capacity_mw:
+            lines.append((f'{application.capacity_mw:g} MW × ₹{self.rate_per_mw:,.0f}/MW',
+                          self.rate_per_mw * application.capacity_mw))
+        if self.rate_percentage_capex and application.capex_estimate:
+            lines.append((f'{self.rate_percentage_capex:g}% of ₹{application.capex_estimate:g} crore CAPEX',
+                          self.rate_percentage_capex / 100 * application.capex_estimate * CRORE))
+        return lines
+
+
+class SubsidyQuote:
+    """Recommended amount for an application under one policy, with its explanation"""
+
+    def __init__(self, policy, lines, checks):
+        self.policy = policy
+        self.lines = lines
+        self.checks = checks
+        self.amount = sum(amount for _, amount in lines) if self.eligible else 0
+
+    @property
+    def eligible(self):
+        return all(passed is not False for passed, _ in self.checks)
+
+
+class PolicyEngine:
+    """Compiled active policies, recompiled when policy_revision changes"""
+
+    def __init__(self, check_seconds=POLICY_VERSION_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self.version = None
+        self._table = {}
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self.version = None
+
+    def current_version(self):
+        from app.models import PolicyRevision
+        return db.session.query(PolicyRevision.version).scalar() or 0
+
+    def refresh(self):
+        """Recompile if stale; costs one small query per check interval"""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            version = self.current_version()
+            if version != self.version:
+                self._table = self.compile()
+                self.version = version
+            self._checked_at = now
+
+    def compile(self):
+        from app.models import SubsidyPolicy
+        table = {}
+        # Newest policy first within each technology
+        for policy in SubsidyPolicy.query.filter_by(is_active=True).order_by(SubsidyPolicy.created_at.desc(), SubsidyPolicy.id.desc()):
+            table.setdefault(policy.technology_type, []).append(CompiledPolicy(policy))
+        return table
+
+    def table(self):
+        """The compiled {technology_type: [CompiledPolicy]} table, refreshed if stale"""
+        self.refresh()
+        return self._table
+
+    def policies_for(self, technology_type):
+        """Policies that can price this technology, specific ones before 'all'"""
+        self.refresh()
+        table = self._table
+        return table.get(technology_type, []) + table.get('all', [])
+
+    def quotes(self, application, today=None):
+        today = today or date.today()
+        return [SubsidyQuote(policy, policy.lines(application), policy.checks(application, today))
+                for policy in self.policies_for(application.technology_type)]
+
+    def quote(self, application, today=None):
+        """Quote from the first policy the application is eligible for, else the first that applies"""
+        quotes = self.quotes(application, today)
+        for quote in quotes:
+            if quote.eligible:
+                return quote
+        return quotes[0] if quotes else None
+
+
+def init_policy_engine(app):
+    app.config.setdefault('POLICY_VERSION_CHECK_SECONDS', int(os.environ.get(
+        'POLICY_VERSION_CHECK_SECONDS', POLICY_VERSION_CHECK_SECONDS)))
+    app.extensions['policy_engine'] = PolicyEngine(app.config['POLICY_VERSION_CHECK_SECONDS'])
+
+
+def get_policy_engine():
+    return current_app.extensions['policy_engine']
+
+
+def bump_policy_version():
+    """Mark compiled policies stale everywhere once the caller commits"""
+    from app.models import PolicyRevision
+    db.session.execute(
+        update(PolicyRevision).values(version=PolicyRevision.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.info['policies_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_policy_engine(session):
+    # Recompile in this process on next use instead of waiting for the check interval
+    if session.info.pop('policies_changed', False):
+        engine = current_app.extensions.get('policy_engine')
+        if engine is not None:
+            engine.invalidate()
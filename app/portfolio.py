@@ -0,0 +1,201 @@
+"""
+Whole-portfolio subsidy recomputation for policy what-ifs.
+
+The pricing inputs of every application are loaded column-wise into NumPy
+arrays once (technology, state and status as integer codes), then each
+compiled policy is applied to all rows at once with the same precedence and
+eligibility rules as app.policy_engine: technology-specific policies before
+'all', the first policy an application is eligible for prices it. Totals by
+technology, state and status come from np.bincount, so a recompute is a few
+array passes regardless of how many applications there are.
+
+Needs NumPy (`pip install numpy`); it is only imported by the CLI command
+and the benchmark, never by the web app.
+"""
+import copy
+from datetime import date
+import numpy as np
+from app.policy_engine import CRITERIA, CRORE
+
+# Fields a what-if may override on a policy
+POLICY_FIELDS = {
+    'rate_per_ton': float,
+    'rate_per_mw': float,
+    'rate_percentage_capex': float,
+    'min_capacity_threshold': float,
+    'max_capacity_threshold': float,
+}
+GROUPS = ('technology', 'state', 'status')
+FETCH_SIZE = 50_000
+
+
+def location_state(location):
+    """State from a 'City, State' project location"""
+    if not location:
+        return 'Unknown'
+    return location.rsplit(',', 1)[-1].strip().title() or 'Unknown'
+
+
+class Codes:
+    """Maps labels to consecutive integer codes"""
+
+    def __init__(self):
+        self.index = {}
+        self.labels = []
+
+    def __call__(self, label):
+        code = self.index.get(label)
+        if code is None:
+            code = self.index[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+
+class Portfolio:
+    """Pricing inputs of every application as parallel arrays"""
+
+    def __init__(self, capacity_tons, capacity_mw, capex_crores, codes, labels):
+        self.capacity_tons = capacity_tons
+        self.capacity_mw = capacity_mw
+        self.capex_crores = capex_crores
+        self.codes = codes      # {group: int32 array}
+        self.labels = labels    # {group: [label, ...]}
+
+    def __len__(self):
+        return len(self.capacity_mw)
+
+    @classmethod
+    def load(cls, connection, fetch_size=FETCH_SIZE):
+        """Read the portfolio with one streamed SELECT, never building ORM objects"""
+        from sqlalchemy import select
+        from app.models import Application
+
+        tons, mw, capex = [], [], []
+        coders = {group: Codes() for group in GROUPS}
+        codes = {group: [] for group in GROUPS}
+        result = connection.execution_options(stream_results=True).execute(select(
+            Application.capacity_tons, Application.capacity_mw, Application.capex_estimate,
+            Application.technology_type, Application.project_location, Application.status,
+        ))
+        for rows in result.partitions(fetch_size):
+            columns = list(zip(*rows))
+            tons.extend(columns[0])
+            mw.extend(columns[1])
+            capex.extend(columns[2])
+            codes['technology'].extend(map(coders['technology'], columns[3]))
+            codes['state'].extend(coders['state'](location_state(value)) for value in columns[4])
+            codes['status'].extend(map(coders['status'], columns[5]))
+
+        as_float = lambda values: np.array(values, dtype=np.float64)  # None -> nan
+        return cls(as_float(tons), as_float(mw), as_float(capex),
+                   {group: np.array(values, dtype=np.int32) for group, values in codes.items()},
+                   {group: coder.labels for group, coder in coders.items()})
+
+    def column(self, attribute):
+        return {'capacity_tons': self.capacity_tons, 'capacity_mw': self.capacity_mw,
+                'capex_estimate': self.capex_crores}[attribute]
+
+    def eligible(self, policy, today):
+        """Boolean mask of rows that pass the policy's automatic checks"""
+        if ((policy.policy_start_date and today < policy.policy_start_date)
+                or (policy.policy_end_date and today > policy.policy_end_date)):
+            return np.zeros(len(self), dtype=bool)
+
+        limits = {key: value for key, value in policy.criteria.items() if key in CRITERIA}
+        if policy.min_capacity_threshold is not None:
+            limits['min_capacity_mw'] = policy.min_capacity_threshold
+        if policy.max_capacity_threshold is not None:
+            limits['max_capacity_mw'] = policy.max_capacity_threshold
+
+        mask = np.ones(len(self), dtype=bool)
+        for key, limit in limits.items():
+            try:
+                limit = float(limit)
+            except (TypeError, ValueError):
+                continue  # needs a manual check, as in PolicyEngine
+            attribute, test, _ = CRITERIA[key]
+            # Comparisons with nan are False: an unstated value fails the check
+            mask &= test(self.column(attribute), limit)
+        return mask
+
+    def amounts(self, policy):
+        """Subsidy for every row under one policy (missing inputs contribute 0)"""
+        total = np.zeros(len(self))
+        if policy.rate_per_ton:
+            total += np.nan_to_num(self.capacity_tons) * policy.rate_per_ton
+        if policy.rate_per_mw:
+            total += np.nan_to_num(self.capacity_mw) * policy.rate_per_mw
+        if policy.rate_percentage_capex:
+            total += np.nan_to_num(self.capex_crores) * (policy.rate_percentage_capex / 100 * CRORE)
+        return total
+
+    def recompute(self, table, today=None):
+        """Subsidy per application under a compiled policy table {technology: [CompiledPolicy]}"""
+        today = today or date.today()
+        result = np.zeros(len(self))
+        technology = self.codes['technology']
+        priced = {}  # id(policy) -> (eligible mask, amounts), so 'all' policies are priced once
+        for code, label in enumerate(self.labels['technology']):
+            rows = np.flatnonzero(technology == code)
+            if not len(rows):
+                continue
+            unpriced = np.ones(len(rows), dtype=bool)
+            for policy in table.get(label, []) + table.get('all', []):
+                if id(policy) not in priced:
+                    priced[id(policy)] = (self.eligible(policy, today), self.amounts(policy))
+                eligible, amounts = priced[id(policy)]
+                take = unpriced & eligible[rows]
+                result[rows[take]] = amounts[rows[take]]
+                unpriced &= ~take
+                if not unpriced.any():
+                    break
+        return result
+
+    def totals(self, amounts):
+        """{group: {label: total}} for the given per-application amounts"""
+        return {
+            group: dict(zip(self.labels[group], np.bincount(
+                self.codes[group], weights=amounts, minlength=len(self.labels[group])).tolist()))
+            for group in GROUPS
+        }
+
+
+def apply_changes(table, changes):
+    """Copy of a compiled policy table with {policy_id: {field: value or None}} applied.
+
+    Setting the field 'active' to False drops the policy.
+    """
+    proposed = {}
+    for technology, policies in table.items():
+        for policy in policies:
+            fields = changes.get(policy.id, {})
+            if 'active' in fields and not fields['active']:
+                continue
+            if fields:
+                policy = copy.copy(policy)
+                for field, value in fields.items():
+                    if field != 'active':
+                        setattr(policy, field, value)
+            proposed.setdefault(technology, []).append(policy)
+    return proposed
+
+
+def parse_change(text):
+    """'3.rate_per_mw=4000000' -> (3, 'rate_per_mw', 4000000.0); 'none' clears a threshold"""
+    target, _, value = text.partition('=')
+    policy_id, _, field = target.partition('.')
+    if field == 'active':
+        return int(policy_id), field, value.lower() in ('1', 'true', 'yes')
+    if field not in POLICY_FIELDS:
+        raise ValueError(f'Unknown policy field {field!r}; use one of {", ".join(POLICY_FIELDS)} or active')
+    return int(policy_id), field, None if value.lower() == 'none' else POLICY_FIELDS[field](value)
+
+
+def what_if(portfolio, table, changes, today=None):
+    """Baseline and proposed totals: {group: {label: (current, proposed)}}"""
+    current = portfolio.totals(portfolio.recompute(table, today))
+    proposed = portfolio.totals(portfolio.recompute(apply_changes(table, changes), today))
+    return {
+        group: {label: (current[group][label], proposed[group][label]) for label in current[group]}
+        for group in GROUPS
+    }
@@ -0,0 +1,186 @@
+"""
+Shared query layer for list and dashboard views.
+
+Views declare the relationships their templates follow as dotted paths
+(e.g. 'producer' or 'application.producer') and get back a query that loads
+them up front instead of issuing one lazy SELECT per row. Listings are
+keyset-paginated on (created_at, id) and badge counts come from aggregate
+queries rather than len() over materialised lists.
+"""
+import base64
+from contextlib import contextmanager
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, event, func, or_
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+from app import db
+
+PER_PAGE = 50
+
+
+def eager(model, *paths):
+    """Build loader options for dotted relationship paths on a model.
+
+    Many-to-one hops (producer, application, auditor, bank) are joined into
+    the main SELECT; collections (audits, transactions, milestones) are
+    select-in loaded with one extra query per collection.
+    """
+    # Backref relationships only exist once the mappers are configured
+    configure_mappers()
+
+    options = []
+    for path in paths:
+        target, loader = model, None
+        for name in path.split('.'):
+            attr = getattr(target, name)
+            strategy = selectinload if attr.property.uselist else joinedload
+            if loader is None:
+                loader = strategy(attr)
+            else:
+                loader = getattr(loader, strategy.__name__)(attr)
+            target = attr.property.mapper.class_
+        options.append(loader)
+    return options
+
+
+def load(model, *paths):
+    """Return `model.query` with the given relationship paths eager-loaded"""
+    return model.query.options(*eager(model, *paths))
+
+
+class KeysetPage:
+    """One page of a listing ordered newest first by (created_at, id).
+
+    Iterates like the list it replaces, so templates can keep using
+    `{% for app in applications %}`. The cursors are opaque strings to put
+    back into the query string under the page's parameter name.
+    """
+
+    def __init__(self, items, name, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.name = name
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def encode_cursor(direction, row):
+    """Encode a row's (created_at, id) position as an opaque cursor"""
+    raw = f'{direction}|{row.created_at.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (direction, created_at, id) for a cursor, or None if invalid"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, row_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        if direction not in ('after', 'before'):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate(query, model, name='cursor', per_page=PER_PAGE):
+    """Fetch one keyset page of `query`, reading the cursor from request.args.
+
+    Pages are anchored on the (created_at, id) of their first or last row,
+    so links stay stable while new applications keep arriving and the
+    database never has to skip over OFFSET rows.
+    """
+    created_at, row_id = model.created_at, model.id
+    position = decode_cursor(request.args.get(name))
+
+    if position and position[0] == 'before':
+        _, anchor_at, anchor_id = position
+        rows = query.filter(or_(
+            created_at > anchor_at,
+            and_(created_at == anchor_at, row_id > anchor_id),
+        )).order_by(created_at.asc(), row_id.asc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if position:
+            _, anchor_at, anchor_id = position
+            query = query.filter(or_(
+                created_at < anchor_at,
+                and_(created_at == anchor_at, row_id < anchor_id),
+            ))
+        rows = query.order_by(created_at.desc(), row_id.desc()).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = position is not None
+
+    next_cursor = encode_cursor('after', rows[-1]) if rows and has_next else None
+    prev_cursor = encode_cursor('before', rows[0]) if rows and has_prev else None
+    return KeysetPage(rows, name, next_cursor, prev_cursor)
+
+
+def count(query):
+    """SELECT COUNT(*) for a query without loading any rows"""
+    return query.enable_eagerloads(False).order_by(None).with_entities(func.count()).scalar()
+
+
+def status_counts(query, model):
+    """Return {status: count} for a query in a single GROUP BY"""
+    rows = query.enable_eagerloads(False).order_by(None).with_entities(model.status, func.count()).group_by(model.status).all()
+    return {status: total for status, total in rows}
+
+
+@contextmanager
+def count_queries():
+    """Record every SQL statement issued on the app engine inside the block.
+
+    Yields the list of statements so callers can assert on its length:
+
+        with count_queries() as statements:
+            client.get('/auditor/applications')
+        assert len(statements) <= 5
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail if the block issues more than `limit` SQL statements.
+
+    The limit should not depend on the number of rows rendered, so a view
+    that slips back into N+1 lazy loading trips it as soon as the fixture
+    data has more than a handful of rows.
+    """
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        raise AssertionError(
+            f'Expected at most {limit} queries, got {len(statements)}:\n'
+            + '\n'.join(statements)
+        )
@@ -0,0 +1,317 @@
+"""
+Bank statement reconciliation.
+
+import_statement() reads an uploaded CSV statement as a stream, a chunk of
+lines at a time, and matches every line against the bank's open
+transactions (those not yet tied to a statement line) through in-memory
+hash indexes:
+
+- by reference: subsidy_request_id and the bank's own transaction_id (UTR),
+  found in the statement's reference column or narration;
+- by amount (in paise) and value date, within DATE_WINDOW_DAYS either side.
+
+A reference hit whose amount or date disagrees is recorded as mismatched; a
+line nothing claims is unmatched. Each line is stored with its outcome and
+a hash of its content that is unique per bank, so a statement overlapping
+an earlier one only adds (and matches) the lines not seen before, and
+re-uploading the same file is a no-op. rematch() gives the unmatched lines
+another try once more transactions exist.
+"""
+import csv
+import hashlib
+import io
+import re
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+from sqlalchemy import exists, select, update
+from app import db
+from app.csv_export import text_cell
+from app.ledger import TOLERANCE, chunked
+
+DATE_WINDOW_DAYS = 3
+CHUNK_LINES = 1000
+REFERENCE_PATTERN = re.compile(r'SR\d{8}[0-9A-F]{6,32}')
+
+# Accepted header names (lower case) for each statement field
+COLUMNS = {
+    'value_date': ('value date', 'value_date', 'date', 'txn date', 'transaction date', 'posting date'),
+    'amount': ('amount', 'debit', 'debit amount', 'withdrawal', 'withdrawal amount', 'withdrawal amt.'),
+    'reference': ('reference', 'ref', 'ref no', 'ref no.', 'reference number', 'customer reference', 'utr',
+                  'utr number', 'chq./ref.no.', 'cheque/ref no'),
+    'narration': ('narration', 'description', 'particulars', 'remarks', 'details'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d-%b-%Y', '%d %b %Y', '%d/%m/%y', '%d-%m-%y')
+
+REPORT_HEADER = ('Status', 'Statement', 'Line', 'Date', 'Statement Amount', 'Reference', 'Subsidy Request ID',
+                 'Disbursed Amount', 'Reason')
+
+StatementRow = namedtuple('StatementRow', 'line_number value_date amount reference narration')
+OpenTransaction = namedtuple('OpenTransaction', 'id amount day')
+
+
+class StatementFormatError(ValueError):
+    """The file is not a statement CSV we can read"""
+
+
+def parse_amount(text):
+    text = (text or '').replace(',', '').replace('₹', '').replace('INR', '').strip()
+    text = re.sub(r'\s*(Dr|DR|Cr|CR)\.?$', '', text)
+    try:
+        return abs(float(text))
+    except ValueError:
+        return None
+
+
+# A statement repeats the same few dates thousands of times
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    text = (text or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def read_statement(text_stream):
+    """Yield StatementRows from a CSV statement, one line at a time"""
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if header is None:
+        raise StatementFormatError('The statement is empty.')
+    names = [name.strip().lower() for name in header]
+    positions = {}
+    for field, aliases in COLUMNS.items():
+        position = next((n for n, name in enumerate(names) if name in aliases), None)
+        if position is not None:
+            positions[field] = position
+    if 'amount' not in positions or not ({'reference', 'narration', 'value_date'} & set(positions)):
+        raise StatementFormatError('The statement needs an amount column and a reference, narration or date column.')
+
+    def cell(values, field):
+        position = positions.get(field)
+        return values[position].strip() if position is not None and position < len(values) else ''
+
+    for line_number, values in enumerate(reader, 2):
+        if not any(value.strip() for value in values):
+            continue
+        yield StatementRow(line_number, parse_date(cell(values, 'value_date')), parse_amount(cell(values, 'amount')),
+                           cell(values, 'reference')[:100] or None, cell(values, 'narration')[:300] or None)
+
+
+def _paise(amount):
+    return round(amount * 100)
+
+
+class OpenTransactions:
+    """Hash indexes over a bank's transactions that no statement line has claimed yet"""
+
+    def __init__(self, bank_id):
+        from app.models import StatementLine, Transaction
+        self.by_reference = {}
+        self.by_amount_date = defaultdict(list)
+        self.taken = set()
+        self.size = 0
+        query = (
+            select(Transaction.id, Transaction.subsidy_request_id, Transaction.transaction_id,
+                   Transaction.amount_disbursed, Transaction.disbursement_date, Transaction.created_at)
+            .where(Transaction.bank_id == bank_id,
+                   ~exists().where(StatementLine.transaction_id == Transaction.id))
+            .execution_options(yield_per=CHUNK_LINES)
+        )
+        for row in db.session.execute(query):
+            when = row.disbursement_date or row.created_at
+            transaction = OpenTransaction(row.id, row.amount_disbursed, when.date() if when else None)
+            for reference in (row.subsidy_request_id, row.transaction_id):
+                if reference:
+                    self.by_reference[reference.strip().upper()] = transaction
+            self.by_amount_date[(_paise(row.amount_disbursed), transaction.day)].append(transaction)
+            self.size += 1
+
+    def __len__(self):
+        return self.size - len(self.taken)
+
+    def match(self, row):
+        """(status, transaction_id, reason) for a statement line; claims the transaction it matches"""
+        if row.amount is None:
+            return 'unmatched', None, 'amount could not be read'
+
+        references = [row.reference] if row.reference else []
+        for text in (row.reference, row.narration):
+            references += REFERENCE_PATTERN.findall((text or '').upper())
+        for reference in references:
+            transaction = self.by_reference.get(reference.strip().upper())
+            if transaction is None:
+                continue
+            if transaction.id in self.taken:
+                return 'unmatched', None, f'{reference} is already matched to another statement line'
+            self.taken.add(transaction.id)
+            problems = []
+            if abs(transaction.amount - row.amount) > TOLERANCE:
+                problems.append(f'amount {row.amount:,.2f} on the statement, {transaction.amount:,.2f} disbursed')
+            if row.value_date and transaction.day and abs((row.value_date - transaction.day).days) > DATE_WINDOW_DAYS:
+                problems.append(f'dated {row.value_date}, disbursed {transaction.day}')
+            if problems:
+                return 'mismatched', transaction.id, '; '.join(problems)
+            return 'matched', transaction.id, f'reference {reference}'
+
+        if row.value_date is None:
+            return 'unmatched', None, 'no known reference and no date'
+        candidates = [
+            transaction
+            for offset in range(-DATE_WINDOW_DAYS, DATE_WINDOW_DAYS + 1)
+            for transaction in self.by_amount_date.get((_paise(row.amount), row.value_date + timedelta(days=offset)), ())
+            if transaction.id not in self.taken
+        ]
+        if len(candidates) == 1:
+            self.taken.add(candidates[0].id)
+            return 'matched', candidates[0].id, 'amount and date'
+        if candidates:
+            return 'unmatched', None, f'{len(candidates)} transactions have this amount and date'
+        return 'unmatched', None, 'no transaction found'
+
+
+def line_hash(row, occurrence):
+    content = f'{row.value_date}|{row.amount}|{row.reference}|{row.narration}|{occurrence}'
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _mark_completed(transaction_ids):
+    # Batch payments stay 'processing' until the bank statement shows them
+    from app.models import Transaction
+    for chunk in chunked(transaction_ids):
+        db.session.execute(
+            update(Transaction)
+            .where(Transaction.id.in_(chunk), Transaction.disbursement_status == 'processing')
+            .values(disbursement_status='completed')
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _chunks(rows, size=CHUNK_LINES):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_statement(bank_id, stream, filename=None):
+    """Import and reconcile a CSV statement from a binary, seekable stream.
+
+    Returns (statement, imported): imported is False if this exact file was
+    imported before. Raises StatementFormatError for unreadable files. The
+    caller commits.
+    """
+    from app.models import BankStatement, StatementLine
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(1 << 16), b''):
+        digest.update(block)
+    stream.seek(0)
+    existing = BankStatement.query.filter_by(bank_id=bank_id, sha256=digest.hexdigest()).first()
+    if existing is not None:
+        return existing, False
+
+    statement = BankStatement(bank_id=bank_id, filename=(filename or '')[:200] or None, sha256=digest.hexdigest())
+    db.session.add(statement)
+    db.session.flush()
+
+    index = OpenTransactions(bank_id)
+    occurrences = Counter()
+    matched = []
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        for chunk in _chunks(read_statement(text)):
+            hashes = []
+            for row in chunk:
+                key = (row.value_date, row.amount, row.reference, row.narration)
+                hashes.append(line_hash(row, occurrences[key]))
+                occurrences[key] += 1
+            seen = set(db.session.scalars(select(StatementLine.line_hash).where(
+                StatementLine.bank_id == bank_id, StatementLine.line_hash.in_(hashes))))
+            lines = []
+            for row, row_hash in zip(chunk, hashes):
+                if row_hash in seen:
+                    statement.duplicate_count += 1
+                    continue
+                status, transaction_id, reason = index.match(row)
+                if status == 'matched':
+                    matched.append(transaction_id)
+                lines.append({
+                    'statement_id': statement.id, 'bank_id': bank_id, 'line_number': row.line_number,
+                    'line_hash': row_hash, 'value_date': row.value_date, 'amount': row.amount,
+                    'reference': row.reference, 'narration': row.narration, 'status': status,
+                    'reason': reason, 'transaction_id': transaction_id, 'created_at': statement.created_at,
+                })
+            if lines:
+                db.session.execute(StatementLine.__table__.insert(), lines)
+                statement.line_count += len(lines)
+    finally:
+        text.detach()
+    _mark_completed(matched)
+    return statement, True
+
+
+def rematch(bank_id):
+    """Retry the bank's unmatched lines against its open transactions.
+
+    Returns (matched, mismatched): lines that now match, and lines found by
+    reference whose amount or date disagrees.
+    """
+    from app.models import StatementLine
+    index = OpenTransactions(bank_id)
+    if not len(index):
+        return 0, 0
+    query = (
+        select(StatementLine.id, StatementLine.line_number, StatementLine.value_date, StatementLine.amount,
+               StatementLine.reference, StatementLine.narration)
+        .where(StatementLine.bank_id == bank_id, StatementLine.status == 'unmatched')
+        .order_by(StatementLine.id)
+    )
+    updates, matched = [], []
+    for row in db.session.execute(query).all():
+        status, transaction_id, reason = index.match(StatementRow(*row[1:]))
+        if transaction_id is not None:
+            updates.append({'id': row.id, 'status': status, 'reason': reason, 'transaction_id': transaction_id})
+            if status == 'matched':
+                matched.append(transaction_id)
+    if updates:
+        db.session.execute(update(StatementLine), updates)
+    _mark_completed(matched)
+    return len(matched), len(updates) - len(matched)
+
+
+def report_rows(bank_id):
+    """Unmatched and mismatched lines, then transactions no statement shows, for the CSV report"""
+    from app.models import StatementLine, Transaction
+    lines = (
+        select(StatementLine.status, StatementLine.statement_id, StatementLine.line_number, StatementLine.value_date,
+               StatementLine.amount, StatementLine.reference, StatementLine.reason, Transaction.subsidy_request_id,
+               Transaction.amount_disbursed)
+        .outerjoin(Transaction, Transaction.id == StatementLine.transaction_id)
+        .where(StatementLine.bank_id == bank_id, StatementLine.status != 'matched')
+        .order_by(StatementLine.created_at, StatementLine.id)
+        .execution_options(yield_per=CHUNK_LINES)
+    )
+    for row in db.session.execute(lines):
+        yield (row.status, row.statement_id, row.line_number, row.value_date or '',
+               '' if row.amount is None else f'{row.amount:.2f}', text_cell(row.reference),
+               row.subsidy_request_id or '', '' if row.amount_disbursed is None else f'{row.amount_disbursed:.2f}',
+               text_cell(row.reason))
+
+    outstanding = (
+        select(Transaction.subsidy_request_id, Transaction.transaction_id, Transaction.amount_disbursed,
+               Transaction.disbursement_date)
+        .where(Transaction.bank_id == bank_id, ~exists().where(StatementLine.transaction_id == Transaction.id))
+        .order_by(Transaction.created_at, Transaction.id)
+        .execution_options(yield_per=CHUNK_LINES)
+    )
+    for row in db.session.execute(outstanding):
+        yield ('not on statement', '', '', row.disbursement_date.date() if row.disbursement_date else '', '',
+               text_cell(row.transaction_id), row.subsidy_request_id, f'{row.amount_disbursed:.2f}',
+               'disbursed but not yet seen on any statement')
@@ -0,0 +1,110 @@
+"""
+Schema revision checks and helpers for online data migrations.
+
+The schema itself is owned by the Alembic chain in migrations/ (applied with
+`flask db upgrade`); the app never creates or reflects tables on boot.
+Flask-Migrate, and the Alembic import behind it, is only initialised for CLI
+commands and scripts that migrate, keeping it out of worker start-up.
+"""
+import os
+import time
+import click
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+BATCH_SIZE = 5000
+# Tables created by hand in migrations that autogenerate should not try to drop
+# (search_index and, on SQLite, its FTS5 shadow tables)
+UNMANAGED_TABLE_PREFIXES = ('search_index',)
+
+
+def migrations_dir(app):
+    return os.path.join(os.path.dirname(app.root_path), 'migrations')
+
+
+def running_under_cli():
+    """True while create_app() is being called by the `flask` command line"""
+    return click.get_current_context(silent=True) is not None
+
+
+def include_name(name, type_, parent_names):
+    """Alembic filter that hides the unmanaged tables from autogenerate and `db check`"""
+    if type_ == 'table':
+        return not name.startswith(UNMANAGED_TABLE_PREFIXES)
+    return True
+
+
+def init_migrations(app):
+    """Register Flask-Migrate on the app (needed by `flask db` and upgrade())"""
+    if 'migrate' in app.extensions:
+        return
+    from flask_migrate import Migrate
+    from app import db
+    Migrate(app, db, directory=migrations_dir(app), render_as_batch=True, include_name=include_name)
+
+
+def upgrade_schema(app):
+    """Apply all pending migrations, for use from maintenance scripts"""
+    from flask_migrate import upgrade
+    init_migrations(app)
+    with app.app_context():
+        upgrade()
+
+
+def head_revision(app):
+    """Return the head revision of the migration chain on disk"""
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option('script_location', migrations_dir(app))
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+def database_revision(engine):
+    """Return the revision stamped in alembic_version, or None if unmanaged"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text('SELECT version_num FROM alembic_version')).scalar()
+    except (OperationalError, ProgrammingError):
+        return None
+
+
+def check_schema_revision(app, engine):
+    """Log a warning when the database is not at the migration head.
+
+    Only reads the single alembic_version row, so it is cheap enough to run
+    on every boot.
+    """
+    current, head = database_revision(engine), head_revision(app)
+    if current is None:
+        app.logger.warning(
+            'Database is not under migration control. Run "flask --app run db upgrade" '
+            '(databases created by the old db.create_all() boot step: "flask --app run db stamp 0001" first).'
+        )
+    elif current != head:
+        app.logger.warning(f'Database schema is at revision {current}, code expects {head}. '
+                           'Run "flask --app run db upgrade".')
+    return current == head
+
+
+def backfill(connection, table, assignment, where=None, batch_size=BATCH_SIZE, pause=0):
+    """Run `UPDATE table SET assignment` in primary-key windows of batch_size rows.
+
+    Call it inside `op.get_context().autocommit_block()` so every window is
+    its own short transaction: writers from the running app only ever wait
+    for one batch instead of the whole table. `pause` (seconds) leaves room
+    for them between batches. Returns the number of rows updated.
+    """
+    low, high = connection.execute(text(f'SELECT MIN(id), MAX(id) FROM "{table}"')).one()
+    if low is None:
+        return 0
+
+    condition = f' AND ({where})' if where else ''
+    statement = text(f'UPDATE "{table}" SET {assignment} WHERE id >= :start AND id < :end{condition}')
+    updated = 0
+    for start in range(low, high + 1, batch_size):
+        updated += connection.execute(statement, {'start': start, 'end': start + batch_size}).rowcount
+        if pause:
+            time.sleep(pause)
+    return updated
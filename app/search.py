@@ -0,0 +1,283 @@
+"""
+Full-text search over applications, audits and milestones.
+
+Every Application, Audit and Milestone has one row in search_index holding
+its searchable text: descriptions and project details, review notes, and
+audit, government and milestone comments. The row id is derived from the
+document (id * 3 + kind), so re-indexing a document is a delete and an
+insert by primary key. Edits made through the ORM are noted in session.info
+while flushing and re-indexed just before the commit, in the same
+transaction. Rows written with Core or raw SQL need `flask reindex-search`.
+
+SEARCH_BACKEND (chosen from DATABASE_URL) decides how the index is stored:
+
+- fts5 (SQLite): an FTS5 virtual table, ranked with bm25()
+- postgresql: a plain table with a GIN index on its tsvector, ranked with
+  ts_rank()
+- like: a plain table matched with LIKE and not ranked, for other databases
+
+search_index is not managed by Alembic autogenerate (see
+app.schema.include_name); migration 0012 creates the right kind of table.
+"""
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, and_, event, func, inspect, literal_column, select, text
+from sqlalchemy.engine import make_url
+from app import db
+from app.ledger import chunked
+from app.schema import BATCH_SIZE
+
+TABLE = 'search_index'
+KINDS = ('application', 'audit', 'milestone')
+PER_PAGE = 20
+# Deeper pages mean ranking and skipping ever more matches; refine the query instead
+MAX_RESULTS = 1000
+# bm25() weights of the title and body columns
+TITLE_WEIGHT, BODY_WEIGHT = 5.0, 1.0
+SNIPPET_WORDS = 24
+
+search_index = Table(
+    TABLE, MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('kind', String(20)),
+    Column('application_id', Integer),
+    Column('title', Text),
+    Column('body', Text),
+)
+
+# Indexed columns of each kind of document; for applications and milestones the first is the title
+FIELDS = {
+    'application': ('project_name', 'project_title', 'project_description', 'project_details', 'project_location',
+                    'technology_type', 'review_notes', 'approval_reason', 'govt_comments'),
+    'audit': ('audit_comments', 'comments'),
+    'milestone': ('milestone_name', 'auditor_verification_comments'),
+}
+TITLED = ('application', 'milestone')
+
+
+def backend_for(dialect_name):
+    return {'sqlite': 'fts5', 'postgresql': 'postgresql'}.get(dialect_name, 'like')
+
+
+def init_search(app):
+    """Pick the index flavour for the configured database"""
+    dialect_name = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    app.config.setdefault('SEARCH_BACKEND', backend_for(dialect_name))
+
+
+def _tsvector():
+    # Must match the indexed expression for PostgreSQL to use the GIN index
+    return "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(body, ''))"
+
+
+def create_index(connection, backend):
+    """Create an empty search_index of the given flavour"""
+    if backend == 'fts5':
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            "title, body, kind UNINDEXED, application_id UNINDEXED, tokenize='unicode61 remove_diacritics 2', prefix='3')"))
+        return
+    search_index.create(connection)
+    if backend == 'postgresql':
+        connection.execute(text(f'CREATE INDEX ix_{TABLE}_document ON {TABLE} USING gin ({_tsvector()})'))
+
+
+def _model(kind):
+    from app.models import Application, Audit, Milestone
+    return {'application': Application, 'audit': Audit, 'milestone': Milestone}[kind]
+
+
+def row_id(kind, document_id):
+    return document_id * len(KINDS) + KINDS.index(kind)
+
+
+def _documents(connection, kind, where):
+    """search_index rows for the documents of a kind matching `where`"""
+    model = _model(kind)
+    columns = [model.id, getattr(model, 'application_id', model.id)] + [getattr(model, name) for name in FIELDS[kind]]
+    rows = []
+    for document_id, application_id, *values in connection.execute(select(*columns).where(where)):
+        title = values.pop(0) if kind in TITLED else None
+        rows.append({
+            'rowid': row_id(kind, document_id),
+            'kind': kind,
+            'application_id': application_id,
+            'title': title or '',
+            'body': '\n'.join(value for value in values if value),
+        })
+    return rows
+
+
+def reindex(connection, kind, document_ids):
+    """Replace the index rows of some documents; ids that no longer exist are dropped"""
+    model = _model(kind)
+    for chunk in chunked(sorted(document_ids)):
+        connection.execute(search_index.delete().where(
+            search_index.c.rowid.in_([row_id(kind, document_id) for document_id in chunk])))
+        rows = _documents(connection, kind, model.id.in_(chunk))
+        if rows:
+            connection.execute(search_index.insert(), rows)
+
+
+def rebuild(connection, backend, batch_size=BATCH_SIZE):
+    """Rebuild the whole index from the source tables; returns the number of documents"""
+    connection.execute(search_index.delete())
+    total = 0
+    for kind in KINDS:
+        model = _model(kind)
+        low, high = connection.execute(select(func.min(model.id), func.max(model.id))).one()
+        if low is None:
+            continue
+        for start in range(low, high + 1, batch_size):
+            rows = _documents(connection, kind, and_(model.id >= start, model.id < start + batch_size))
+            if rows:
+                connection.execute(search_index.insert(), rows)
+                total += len(rows)
+    if backend == 'fts5':
+        # Merge the b-tree segments written batch by batch, so queries read one
+        connection.execute(text(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')"))
+    return total
+
+
+# Keeping the index in step with ORM writes
+
+def _pending():
+    return db.session.info.setdefault('search_pending', {kind: set() for kind in KINDS})
+
+
+def _changed(instance, kind):
+    state = inspect(instance)
+    return any(state.attrs[name].history.has_changes() for name in FIELDS[kind])
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_flushed_documents(session, flush_context):
+    models = {_model(kind): kind for kind in KINDS}
+    for instance in session.new:
+        kind = models.get(type(instance))
+        if kind:
+            _pending()[kind].add(instance.id)
+    for instance in session.deleted:
+        kind = models.get(type(instance))
+        if kind:
+            _pending()[kind].add(instance.id)
+    for instance in session.dirty:
+        kind = models.get(type(instance))
+        if kind and _changed(instance, kind):
+            _pending()[kind].add(instance.id)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _reindex_before_commit(session):
+    session.flush()
+    pending = session.info.pop('search_pending', None)
+    if pending:
+        connection = session.connection()
+        for kind, document_ids in pending.items():
+            if document_ids:
+                reindex(connection, kind, document_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('search_pending', None)
+
+
+# Querying
+
+def terms(query):
+    """Lower-cased words of a search box entry, at most 8"""
+    return re.findall(r'\w+', query.lower())[:8]
+
+
+def _match(backend, words):
+    """(WHERE clause, rank expression) for the words of a query"""
+    if backend == 'fts5':
+        table = literal_column(TABLE)
+        # Quoted, so nothing typed is read as FTS5 syntax. The last word is also a prefix, so
+        # "electroly" finds electrolysers (no stemming: it breaks prefix queries); earlier
+        # words match exactly, as a prefix costs a merge of every word it expands to
+        expression = ' '.join(f'"{word}"' for word in words) + '*'
+        return table.op('MATCH')(expression), func.bm25(table, TITLE_WEIGHT, BODY_WEIGHT)
+    if backend == 'postgresql':
+        document = literal_column(_tsvector())
+        query = func.to_tsquery('simple', ' & '.join(words[:-1] + [f'{words[-1]}:*']))
+        return document.op('@@')(query), -func.ts_rank(document, query)
+    text_column = search_index.c.title + ' ' + search_index.c.body
+    return and_(*(text_column.ilike(f'%{word}%') for word in words)), literal_column('0')
+
+
+def snippet(body, words, size=SNIPPET_WORDS):
+    """About `size` words of body around the first match, escaped, with the matches in <mark>"""
+    tokens = list(re.finditer(r'\w+', body or ''))
+    if not tokens:
+        return Markup()
+
+    def matches(token):
+        word = token.group().lower()
+        return word in words[:-1] or word.startswith(words[-1])
+
+    first = next((n for n, token in enumerate(tokens) if matches(token)), 0)
+    start = max(0, min(first - size // 4, len(tokens) - size))
+    window = tokens[start:start + size]
+    parts = ['…' if start else '']
+    position = window[0].start()
+    for token in window:
+        parts.append(escape(body[position:token.start()]))
+        parts.append(Markup('<mark>%s</mark>') % token.group() if matches(token) else escape(token.group()))
+        position = token.end()
+    parts.append('…' if start + size < len(tokens) else escape(body[position:]))
+    return Markup('').join(parts)
+
+
+def search(query, filters=(), page=1, per_page=PER_PAGE, backend='fts5'):
+    """One page of documents matching `query`, best first.
+
+    `filters` are conditions on Application that scope the results (by
+    producer, status, ...). Returns (results, has_next); each result is a
+    dict with kind, id, application, title, snippet (safe HTML) and score
+    (lower is better).
+    """
+    from app.models import Application
+    from app.queries import load
+    words = terms(query)
+    offset = (page - 1) * per_page
+    if not words or offset >= MAX_RESULTS:
+        return [], False
+
+    where, rank = _match(backend, words)
+    matches = select(search_index.c.rowid).select_from(search_index)
+    if filters:
+        # The join is only needed to scope the results, and costs a lookup per match
+        matches = matches.join(Application.__table__, Application.id == search_index.c.application_id)
+    matches = matches.where(where, *filters)
+
+    # Every match is scored and sorted in SQL; only the page comes back
+    ranked = db.session.execute(
+        matches.with_only_columns(search_index.c.rowid, rank.label('score'))
+        .order_by(literal_column('score'), search_index.c.rowid)
+        .limit(per_page + 1).offset(offset)
+    ).all()
+    has_next = len(ranked) > per_page and offset + per_page < MAX_RESULTS
+    ranked = ranked[:per_page]
+    # The stored columns only for the page: reading them in the ranking query would fetch
+    # every candidate's row, and a snippet built there would be made for each of them too
+    documents = {row.rowid: row for row in db.session.execute(
+        select(search_index).where(search_index.c.rowid.in_([row.rowid for row in ranked])))} if ranked else {}
+
+    applications = {application.id: application for application in
+                    load(Application, 'producer').filter(Application.id.in_(
+                        {document.application_id for document in documents.values()}))}
+    results = []
+    for rowid, score in ranked:
+        document = documents[rowid]
+        if document.application_id in applications:
+            results.append({
+                'kind': document.kind,
+                'id': rowid // len(KINDS),
+                'application': applications[document.application_id],
+                'title': document.title,
+                'snippet': snippet(document.body, words),
+                'score': score,
+            })
+    return results, has_next
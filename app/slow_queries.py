@@ -0,0 +1,188 @@
+"""
+Slow-query log for the app engine.
+
+Every statement is timed. One taking SLOW_QUERY_MS (default 200) or longer
+is appended as a JSON line to SLOW_QUERY_LOG (default
+instance/slow_queries.jsonl) with:
+- its fingerprint: the statement with literals, placeholders, IN lists and
+  multi-row VALUES collapsed, so runs with other values group together
+- the route that ran it, or the CLI command or background thread
+- its bound parameters, redacted: numbers, dates and booleans are kept,
+  text and bytes are reduced to their length
+- the first time this process sees the fingerprint, the query plan
+  (EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere), taken on the same
+  connection with the same parameters
+
+`flask slow-queries` folds the log into the fingerprints that cost the most
+time in total. Every worker appends to the same file; rotate it with
+copytruncate. SLOW_QUERY_MS=0 turns the log off.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+import click
+from flask import has_request_context, request
+from sqlalchemy import event
+from app import db
+
+DEFAULT_THRESHOLD_MS = 200
+STARTED_KEY = 'slow_query_started'
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+
+
+def normalise(statement):
+    """The statement with every value replaced by ?, whitespace collapsed"""
+    statement = _STRING.sub('?', statement)
+    statement = _PLACEHOLDER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _LIST.sub('(?)', statement)
+    statement = _ROWS.sub('(?)', statement)
+    return ' '.join(statement.split())
+
+
+def fingerprint(statement):
+    return hashlib.sha1(normalise(statement).encode()).hexdigest()[:12]
+
+
+def redact(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date, time_of_day)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<bytes:{len(value)}>'
+    if isinstance(value, str):
+        return f'<str:{len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def redact_parameters(parameters, executemany):
+    if executemany:
+        return f'<{len(parameters)} rows>'
+    if isinstance(parameters, dict):
+        return {name: redact(value) for name, value in parameters.items()}
+    return [redact(value) for value in parameters or ()]
+
+
+def caller():
+    """The route, CLI command or thread a statement was run for"""
+    if has_request_context():
+        return f'{request.method} {request.endpoint or request.path}'
+    command = click.get_current_context(silent=True)
+    if command is not None:
+        return f'cli {command.info_name}'
+    return f'thread {threading.current_thread().name}'
+
+
+class SlowQueryLog:
+    """Appends statements over the threshold to a JSON lines file"""
+
+    def __init__(self, path, threshold_ms):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self._explained = set()
+        self._lock = threading.Lock()
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(STARTED_KEY, []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        took = time.perf_counter() - conn.info[STARTED_KEY].pop()
+        if took >= self.threshold:
+            self.record(conn, cursor, statement, parameters, executemany, took)
+
+    def handle_error(self, exception_context):
+        started = exception_context.connection.info.get(STARTED_KEY) if exception_context.connection else None
+        if started:
+            started.pop()
+
+    def record(self, conn, cursor, statement, parameters, executemany, took):
+        key = fingerprint(statement)
+        entry = {
+            'at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'fingerprint': key,
+            'ms': round(took * 1000, 1),
+            'caller': caller(),
+            'statement': normalise(statement),
+            'parameters': redact_parameters(parameters, executemany),
+        }
+        with self._lock:
+            first = key not in self._explained
+            self._explained.add(key)
+        if first and not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            entry['plan'] = self.explain(conn, cursor, statement, parameters)
+        line = json.dumps(entry, default=str) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a') as log:
+                log.write(line)
+
+    def explain(self, conn, cursor, statement, parameters):
+        """The plan lines of a statement, run on the raw connection so no events fire"""
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            rows = explain_cursor.fetchall()
+        except Exception as e:
+            return [f'EXPLAIN failed: {e}']
+        finally:
+            explain_cursor.close()
+        if conn.dialect.name == 'sqlite':
+            return [row[-1] for row in rows]
+        return [' '.join(str(value) for value in row) for row in rows]
+
+
+def init_slow_queries(app):
+    """Log statements slower than SLOW_QUERY_MS to SLOW_QUERY_LOG"""
+    app.config.setdefault('SLOW_QUERY_MS', int(os.environ.get('SLOW_QUERY_MS', DEFAULT_THRESHOLD_MS)))
+    app.config.setdefault('SLOW_QUERY_LOG', os.environ.get(
+        'SLOW_QUERY_LOG', os.path.join(app.instance_path, 'slow_queries.jsonl')))
+    if not app.config['SLOW_QUERY_MS']:
+        return
+    log = SlowQueryLog(app.config['SLOW_QUERY_LOG'], app.config['SLOW_QUERY_MS'])
+    app.extensions['slow_queries'] = log
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', log.before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', log.after_cursor_execute)
+        event.listen(db.engine, 'handle_error', log.handle_error)
+
+
+def top_fingerprints(path, limit=None):
+    """Fold a slow-query log into one summary per fingerprint, most total time first"""
+    summaries = {}
+    with open(path) as log:
+        for line in log:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by rotation or a crash
+                continue
+            summary = summaries.get(entry['fingerprint'])
+            if summary is None:
+                summary = summaries[entry['fingerprint']] = {
+                    'fingerprint': entry['fingerprint'], 'statement': entry['statement'],
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'callers': {}, 'plan': None,
+                }
+            summary['count'] += 1
+            summary['total_ms'] += entry['ms']
+            summary['max_ms'] = max(summary['max_ms'], entry['ms'])
+            summary['callers'][entry['caller']] = summary['callers'].get(entry['caller'], 0) + 1
+            summary['parameters'] = entry['parameters']
+            summary['last_seen'] = entry['at']
+            if entry.get('plan'):
+                summary['plan'] = entry['plan']
+    ranked = sorted(summaries.values(), key=lambda summary: summary['total_ms'], reverse=True)
+    return ranked[:limit] if limit else ranked
@@ -0,0 +1,69 @@
+"""
+Startup-time budget for create_app().
+
+Every gunicorn worker and every maintenance script pays for create_app(),
+so its phases are timed and can be checked against a fixed budget.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+# Cold start budget for `import app` + create_app() in a fresh interpreter
+STARTUP_BUDGET_MS = 750
+
+
+class StartupTimer:
+    """Wall-clock timings for the phases of create_app"""
+
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - started) * 1000))
+
+    @property
+    def total_ms(self):
+        return sum(ms for _, ms in self.phases)
+
+    def report(self):
+        lines = [f'  {name:<14} {ms:8.1f} ms' for name, ms in self.phases]
+        lines.append(f'  {"total":<14} {self.total_ms:8.1f} ms')
+        return '\n'.join(lines)
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def report_startup(app, timer):
+    """Log the phase timings when STARTUP_REPORT is on and warn over budget"""
+    app.extensions['startup_timer'] = timer
+    budget = app.config['STARTUP_BUDGET_MS']
+    if app.config['STARTUP_REPORT']:
+        app.logger.warning(f'create_app phases:\n{timer.report()}')
+    if timer.total_ms > budget:
+        app.logger.warning(f'create_app took {timer.total_ms:.0f} ms, over the {budget} ms startup budget')
+
+
+# Run by `flask startup-report` in a fresh interpreter so module imports count
+COLD_START_PROBE = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+timer = flask_app.extensions['startup_timer']
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'phases': timer.phases,
+    'total_ms': (time.perf_counter() - started) * 1000,
+}))
+'''
@@ -0,0 +1,206 @@
+"""
+Content-addressed storage for uploaded documents.
+
+Every upload path goes through save_upload(), which streams the file to a
+temporary file in fixed-size chunks while hashing it and then hands it to
+the configured backend under its SHA-256. The returned key never changes
+once issued and re-uploading the same document reuses the stored object.
+
+Backends (STORAGE_BACKEND):
+- 'local': files under the parent of UPLOAD_FOLDER (instance/ by default),
+  kept out of the static folder so nothing is served without a login.
+  Downloads are handed to the front proxy with X-Accel-Redirect when
+  LOCAL_ACCEL_REDIRECT_PREFIX is set, and only fall back to Flask's
+  send_from_directory in development.
+- 's3': any S3-compatible store (AWS, MinIO via S3_ENDPOINT_URL). Downloads
+  redirect to a short-lived presigned URL. Needs boto3.
+
+Templates link documents with document_url(key), which points at the
+login-protected main.download view rather than at the bytes themselves.
+Officials may open any document; a producer only the documents of their
+own applications and their own profile photo (can_download()).
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+from flask import current_app, redirect, send_from_directory, url_for, Response, abort
+from sqlalchemy import exists, or_, select
+from werkzeug.utils import secure_filename
+from app import db
+from app.instrumentation import timed
+
+CHUNK_SIZE = 64 * 1024
+PROFILE_PHOTOS = 'uploads/profile_photos/'
+OFFICIAL_ROLES = ('auditor', 'government', 'bank')
+
+
+def upload_key(category, digest, extension):
+    """Key of a stored object, e.g. uploads/feasibility/ab/ab12...ef.pdf"""
+    return f'uploads/{category}/{digest[:2]}/{digest}{extension}'
+
+
+class LocalStorage:
+    """Objects stored as files under `root`, which must not be served as static files"""
+
+    def __init__(self, root, accel_redirect_prefix=None):
+        self.root = root
+        self.accel_redirect_prefix = accel_redirect_prefix
+
+    def temp_dir(self):
+        # Same filesystem as the final location, so storing is a rename
+        path = os.path.join(self.root, 'uploads', '.incoming')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def store(self, temp_path, key):
+        final_path = self.path(key)
+        if os.path.exists(final_path):
+            os.remove(temp_path)
+            return
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(temp_path, final_path)
+
+    def download_response(self, key):
+        if self.accel_redirect_prefix:
+            # nginx serves the bytes from its internal location
+            response = Response(status=200)
+            response.headers['X-Accel-Redirect'] = self.accel_redirect_prefix.rstrip('/') + '/' + key
+            response.headers['Content-Type'] = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+            return response
+        return send_from_directory(self.root, key)
+
+
+class S3Storage:
+    """Objects stored in an S3-compatible bucket"""
+
+    def __init__(self, bucket, endpoint_url=None, region=None, prefix='', presign_expires=300):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.presign_expires = presign_expires
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+
+    def temp_dir(self):
+        return None
+
+    def object_name(self, key):
+        return self.prefix + key
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_name(key))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def store(self, temp_path, key):
+        try:
+            if not self.exists(key):
+                # upload_file streams from disk and switches to multipart for large files
+                self.client.upload_file(temp_path, self.bucket, self.object_name(key))
+        finally:
+            os.remove(temp_path)
+
+    def download_response(self, key):
+        url = self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self.object_name(key)},
+            ExpiresIn=self.presign_expires,
+        )
+        return redirect(url)
+
+
+def init_storage(app):
+    """Create the configured storage backend and the document_url template helper"""
+    backend = app.config.setdefault('STORAGE_BACKEND', os.environ.get('STORAGE_BACKEND', 'local'))
+    if backend == 's3':
+        storage = S3Storage(
+            bucket=os.environ['S3_BUCKET'],
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+            region=os.environ.get('S3_REGION'),
+            prefix=os.environ.get('S3_PREFIX', ''),
+            presign_expires=int(os.environ.get('S3_PRESIGN_EXPIRES', 300)),
+        )
+    elif backend == 'local':
+        storage = LocalStorage(
+            os.path.dirname(app.config['UPLOAD_FOLDER']),
+            accel_redirect_prefix=os.environ.get('LOCAL_ACCEL_REDIRECT_PREFIX'),
+        )
+    else:
+        raise ValueError(f'Unknown STORAGE_BACKEND {backend!r}')
+    app.extensions['storage'] = storage
+
+    @app.template_global()
+    def document_url(key):
+        return url_for('main.download', key=key)
+
+
+def get_storage():
+    return current_app.extensions['storage']
+
+
+def save_upload(file, category):
+    """Stream an uploaded FileStorage into storage and return its key.
+
+    The original extension is kept in the key so the document is served
+    with the right content type.
+    """
+    storage = get_storage()
+    extension = os.path.splitext(secure_filename(file.filename or ''))[1].lower()
+
+    digest = hashlib.sha256()
+    with timed('storage'):
+        fd, temp_path = tempfile.mkstemp(dir=storage.temp_dir(), prefix='upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    out.write(chunk)
+            key = upload_key(category, digest.hexdigest(), extension)
+            storage.store(temp_path, key)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return key
+
+
+def download_response(key):
+    """Response for a document download; never streams bytes through Python in production"""
+    if not key.startswith('uploads/') or '..' in key.split('/'):
+        abort(404)
+    return get_storage().download_response(key)
+
+
+def can_download(user, key):
+    """Whether the user may open a stored document.
+
+    Keys are content-addressed, so two producers uploading the same file
+    share one; a producer is let in if any of their own records holds it.
+    """
+    from app.models import Application, Audit, Milestone, Transaction
+    if user.role in OFFICIAL_ROLES:
+        return True
+    if key.startswith(PROFILE_PHOTOS):
+        return user.profile_photo == key[len(PROFILE_PHOTOS):]
+    # Application.documents is a JSON list of keys
+    own = Application.producer_id == user.id
+    holders = (
+        select(Application.id).where(own, Application.documents.contains(f'"{key}"', autoescape=True)),
+        select(Milestone.id).join(Application).where(own, or_(
+            Milestone.milestone_document_path == key,
+            Milestone.expenditure_report_path == key,
+            Milestone.compliance_certificate_path == key,
+        )),
+        select(Audit.id).join(Application).where(own, Audit.audit_report_path == key),
+        select(Transaction.id).join(Application).where(own, Transaction.payment_confirmation_path == key),
+    )
+    return any(db.session.scalar(select(exists(holder))) for holder in holders)
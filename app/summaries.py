@@ -0,0 +1,308 @@
+"""
+Materialised aggregates for the reporting pages.
+
+Three small tables hold the figures the government and bank pages show:
+
+- application_summary: applications, MW and tons per (technology, status)
+- funding_summary: sanctioned and disbursed amounts and payments per technology
+- bank_summary: disbursed amount and payments per bank
+
+They are kept up to date incrementally. Workflow transitions, application
+inserts and edits, new Transactions and ledger sanctions record deltas in
+session.info while the change is being made; just before the commit the
+deltas are folded into the tables with one `UPDATE ... SET x = x + :delta`
+per affected group, inside the same transaction. A report then reads O(#groups) rows instead of
+scanning application and transaction. A batch run of 10k payments costs a
+few statements, not one per payment.
+
+`flask rebuild-summaries` recomputes everything from the source tables (after
+bulk loads or raw SQL edits); with --check it only reports drift.
+"""
+from collections import defaultdict
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.ledger import SANCTIONED, chunked
+from app.workflow import FUND_RELEASED, GOVT_APPROVED, REJECTED, transitioned
+
+UNSPECIFIED = 'unspecified'
+APPROVED_STATUSES = (GOVT_APPROVED, FUND_RELEASED)
+TRACKED_COLUMNS = ('technology_type', 'status', 'capacity_mw', 'capacity_tons')
+
+# Lifecycle order for the funnel; statuses not listed follow in name order
+FUNNEL = ('pending', 'requires_revision', 'auditor_verified', 'under_government_review', GOVT_APPROVED,
+          FUND_RELEASED, REJECTED)
+
+
+def technology(value):
+    return value or UNSPECIFIED
+
+
+def _pending():
+    pending = db.session.info.get('summary_deltas')
+    if pending is None:
+        pending = db.session.info['summary_deltas'] = {
+            'applications': defaultdict(lambda: [0, 0.0, 0.0]),
+            'sanctions': defaultdict(float),
+            'payments': [],
+        }
+    return pending
+
+
+def _count_application(tech, status, capacity_mw, capacity_tons, sign):
+    row = _pending()['applications'][(technology(tech), status or 'pending')]
+    row[0] += sign
+    row[1] += sign * (capacity_mw or 0)
+    row[2] += sign * (capacity_tons or 0)
+
+
+def record_sanction(application_id, amount):
+    """Count a ledger sanction when the current transaction commits"""
+    _pending()['sanctions'][application_id] += amount
+
+
+def record_payments(transaction_ids):
+    """Count Transactions written without the ORM when the current transaction commits"""
+    _pending()['payments'].extend(transaction_ids)
+
+
+def _on_transition(application, transition, from_status, to_status):
+    _count_application(application.technology_type, from_status, application.capacity_mw,
+                       application.capacity_tons, -1)
+    _count_application(application.technology_type, to_status, application.capacity_mw,
+                       application.capacity_tons, 1)
+
+
+def _old(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[key].value
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_flushed_rows(session, flush_context):
+    # Applications inserted, deleted or edited and Transactions added through
+    # the ORM; workflow transitions use Core UPDATEs and arrive through the
+    # signal instead
+    from app.models import Application, Transaction
+    for instance in session.new:
+        if isinstance(instance, Application):
+            _count_application(instance.technology_type, instance.status, instance.capacity_mw,
+                               instance.capacity_tons, 1)
+        elif isinstance(instance, Transaction):
+            record_payments([instance.id])
+    for application in session.deleted:
+        if isinstance(application, Application):
+            state = inspect(application)
+            _count_application(*(_old(state, key) for key in TRACKED_COLUMNS), -1)
+    for application in session.dirty:
+        if not isinstance(application, Application):
+            continue
+        state = inspect(application)
+        if not any(state.attrs[key].history.has_changes() for key in TRACKED_COLUMNS):
+            continue
+        _count_application(*(_old(state, key) for key in TRACKED_COLUMNS), -1)
+        _count_application(application.technology_type, application.status, application.capacity_mw,
+                           application.capacity_tons, 1)
+
+
+def _bump(model, keys, deltas):
+    """Add deltas to one summary row, creating it on first use"""
+    columns = model.__table__.c
+    result = db.session.execute(
+        update(model)
+        .where(*(columns[name] == value for name, value in keys.items()))
+        .values({name: columns[name] + delta for name, delta in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        return
+    try:
+        # A savepoint, so a concurrent first insert of the same group costs a retry, not the commit
+        with db.session.begin_nested():
+            db.session.execute(model.__table__.insert().values(**keys, **deltas))
+    except IntegrityError:
+        _bump(model, keys, deltas)
+
+
+def _technologies(application_ids):
+    found = {}
+    from app.models import Application
+    for chunk in chunked(application_ids):
+        found.update(db.session.execute(
+            select(Application.id, Application.technology_type).where(Application.id.in_(chunk))).all())
+    return found
+
+
+def apply_pending():
+    """Fold the recorded deltas into the summary tables, in the current transaction"""
+    from app.models import Application, ApplicationSummary, BankSummary, FundingSummary, Transaction
+    pending = db.session.info.pop('summary_deltas', None)
+    if not pending:
+        return
+
+    funding = defaultdict(lambda: [0.0, 0.0, 0])
+    banks = defaultdict(lambda: [0.0, 0])
+    if pending['sanctions']:
+        technologies = _technologies(list(pending['sanctions']))
+        for application_id, amount in pending['sanctions'].items():
+            funding[technology(technologies.get(application_id))][0] += amount
+    for chunk in chunked(pending['payments']):
+        rows = db.session.execute(
+            select(Application.technology_type, Transaction.bank_id,
+                   func.sum(Transaction.amount_disbursed), func.count())
+            .join(Application, Application.id == Transaction.application_id)
+            .where(Transaction.id.in_(chunk))
+            .group_by(Application.technology_type, Transaction.bank_id)
+        )
+        for tech, bank_id, amount, payments in rows:
+            funding[technology(tech)][1] += amount or 0
+            funding[technology(tech)][2] += payments
+            if bank_id is not None:
+                banks[bank_id][0] += amount or 0
+                banks[bank_id][1] += payments
+
+    # Sorted, so concurrent commits lock the rows in the same order
+    for (tech, status), (count, mw, tons) in sorted(pending['applications'].items()):
+        if count or mw or tons:
+            _bump(ApplicationSummary, {'technology': tech, 'status': status},
+                  {'application_count': count, 'capacity_mw': mw, 'capacity_tons': tons})
+    for tech, (sanctioned, disbursed, payments) in sorted(funding.items()):
+        _bump(FundingSummary, {'technology': tech},
+              {'sanctioned_amount': sanctioned, 'disbursed_amount': disbursed, 'payment_count': payments})
+    for bank_id, (disbursed, payments) in sorted(banks.items()):
+        _bump(BankSummary, {'bank_id': bank_id}, {'disbursed_amount': disbursed, 'payment_count': payments})
+
+
+@event.listens_for(db.session, 'before_commit')
+def _apply_before_commit(session):
+    # Flush first, so edits still pending in the session record their deltas too
+    session.flush()
+    if 'summary_deltas' in session.info:
+        apply_pending()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('summary_deltas', None)
+
+
+def init_summaries(app):
+    """Count workflow transitions into the summaries"""
+    transitioned.connect(_on_transition)
+
+
+def computed():
+    """The summary rows recomputed from the source tables, keyed like the tables"""
+    from app.models import Application, LedgerBalance, Transaction
+    tech = func.coalesce(Application.technology_type, UNSPECIFIED)
+    applications = {
+        (row.technology, row.status): (row.applications, row.mw or 0, row.tons or 0)
+        for row in db.session.execute(
+            select(tech.label('technology'), func.coalesce(Application.status, 'pending').label('status'),
+                   func.count().label('applications'), func.sum(Application.capacity_mw).label('mw'),
+                   func.sum(Application.capacity_tons).label('tons'))
+            .group_by(tech, func.coalesce(Application.status, 'pending')))
+    }
+    funding = defaultdict(lambda: [0.0, 0.0, 0])
+    for row in db.session.execute(
+            select(tech.label('technology'), (-func.sum(LedgerBalance.balance)).label('sanctioned'))
+            .join(Application, Application.id == LedgerBalance.application_id)
+            .where(LedgerBalance.account == SANCTIONED).group_by(tech)):
+        funding[row[0]][0] = row[1] or 0
+    for row in db.session.execute(
+            select(tech.label('technology'), func.sum(Transaction.amount_disbursed), func.count())
+            .join(Application, Application.id == Transaction.application_id).group_by(tech)):
+        funding[row[0]][1:] = [row[1] or 0, row[2]]
+    banks = {
+        row[0]: (row[1] or 0, row[2])
+        for row in db.session.execute(
+            select(Transaction.bank_id, func.sum(Transaction.amount_disbursed), func.count())
+            .where(Transaction.bank_id.isnot(None)).group_by(Transaction.bank_id))
+    }
+    return applications, {key: tuple(value) for key, value in funding.items()}, banks
+
+
+def stored():
+    """The summary rows as stored, in the same shape as computed()"""
+    from app.models import ApplicationSummary, BankSummary, FundingSummary
+    applications = {(row.technology, row.status): (row.application_count, row.capacity_mw, row.capacity_tons)
+                    for row in ApplicationSummary.query if row.application_count}
+    funding = {row.technology: (row.sanctioned_amount, row.disbursed_amount, row.payment_count)
+               for row in FundingSummary.query}
+    banks = {row.bank_id: (row.disbursed_amount, row.payment_count) for row in BankSummary.query}
+    return applications, funding, banks
+
+
+def drift():
+    """[(table, key, stored, computed)] for every summary row that disagrees with the source tables"""
+    differences = []
+    for table, have, want in zip(('application_summary', 'funding_summary', 'bank_summary'), stored(), computed()):
+        for key in sorted(set(have) | set(want), key=str):
+            old, new = have.get(key), want.get(key)
+            zero = tuple(0 for _ in (old or new))
+            if any(abs(a - b) > 0.005 for a, b in zip(old or zero, new or zero)):
+                differences.append((table, key, old, new))
+    return differences
+
+
+def rebuild():
+    """Replace the summary tables with freshly computed rows; the caller commits"""
+    from app.models import ApplicationSummary, BankSummary, FundingSummary
+    applications, funding, banks = computed()
+    db.session.info.pop('summary_deltas', None)
+    for model in (ApplicationSummary, FundingSummary, BankSummary):
+        db.session.execute(model.__table__.delete())
+    if applications:
+        db.session.execute(ApplicationSummary.__table__.insert(), [
+            {'technology': tech, 'status': status, 'application_count': count, 'capacity_mw': mw,
+             'capacity_tons': tons} for (tech, status), (count, mw, tons) in applications.items()])
+    if funding:
+        db.session.execute(FundingSummary.__table__.insert(), [
+            {'technology': tech, 'sanctioned_amount': sanctioned, 'disbursed_amount': disbursed,
+             'payment_count': payments} for tech, (sanctioned, disbursed, payments) in funding.items()])
+    if banks:
+        db.session.execute(BankSummary.__table__.insert(), [
+            {'bank_id': bank_id, 'disbursed_amount': disbursed, 'payment_count': payments}
+            for bank_id, (disbursed, payments) in banks.items()])
+    return len(applications) + len(funding) + len(banks)
+
+
+def status_funnel():
+    """{status: applications}, in lifecycle order"""
+    from app.models import ApplicationSummary
+    rows = (db.session.query(ApplicationSummary.status, func.sum(ApplicationSummary.application_count))
+            .group_by(ApplicationSummary.status).all())
+    counts = {status: int(total) for status, total in rows if total}
+    order = {status: position for position, status in enumerate(FUNNEL)}
+    return dict(sorted(counts.items(), key=lambda item: (order.get(item[0], len(order)), item[0])))
+
+
+def by_technology():
+    """One dict per technology: applications, MW and tons (all and approved), sanctioned and disbursed"""
+    from app.models import ApplicationSummary, FundingSummary
+    report = defaultdict(lambda: dict(applications=0, capacity_mw=0.0, capacity_tons=0.0, approved_mw=0.0,
+                                      approved_tons=0.0, sanctioned=0.0, disbursed=0.0, payments=0))
+    for row in ApplicationSummary.query:
+        if row.status == REJECTED:
+            continue
+        entry = report[row.technology]
+        entry['applications'] += row.application_count
+        entry['capacity_mw'] += row.capacity_mw
+        entry['capacity_tons'] += row.capacity_tons
+        if row.status in APPROVED_STATUSES:
+            entry['approved_mw'] += row.capacity_mw
+            entry['approved_tons'] += row.capacity_tons
+    for row in FundingSummary.query:
+        entry = report[row.technology]
+        entry.update(sanctioned=row.sanctioned_amount, disbursed=row.disbursed_amount, payments=row.payment_count)
+    return [dict(technology=tech, **entry) for tech, entry in sorted(report.items())
+            if entry['applications'] or entry['payments'] or entry['sanctioned']]
+
+
+def bank_totals(bank_id):
+    """(disbursed amount, payments) for a bank"""
+    from app.models import BankSummary
+    row = db.session.get(BankSummary, bank_id, populate_existing=True)
+    return (row.disbursed_amount, row.payment_count) if row else (0, 0)
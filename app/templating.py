@@ -0,0 +1,136 @@
+"""
+Template fragment cache and precompiled templates.
+
+Wrap a block that only depends on a few rows in `{% cache %}` with a name
+and those rows:
+
+    {% cache 'application-details', application, application.producer %}
+        ...
+    {% endcache %}
+
+The rendered HTML is kept under a key made of the template, a digest of its
+source, the name and each row's table, id and updated_at. Saving a row
+moves its updated_at, so a changed row simply misses, and a deploy with an
+edited template misses too. Rows without an updated_at are never cached.
+Anything else in the tag (strings, numbers) is part of the key as is, so
+nothing user- or request-specific (forms, CSRF tokens, flashed messages)
+belongs inside the block.
+
+FRAGMENT_CACHE selects the backend:
+- 'memory' (default): a bounded per-process LRU of
+  FRAGMENT_CACHE_MAX_ENTRIES fragments.
+- 'redis': shared by all workers through REDIS_URL (needs redis).
+- 'none': render every time.
+
+Templates are compiled once into TEMPLATE_BYTECODE_DIR (Jinja's bytecode
+cache, keyed by source checksum), and each worker loads them all at startup
+unless TEMPLATE_PRECOMPILE is off, so no request pays for parsing a
+1,000-line template. `flask precompile-templates` fills the directory during
+a deploy, before the workers start.
+"""
+import hashlib
+import os
+import time
+from jinja2 import FileSystemBytecodeCache, TemplateNotFound, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from app.cache import MemoryCache, RedisCache
+from app.startup import env_flag
+
+FRAGMENT_MAX_ENTRIES = 1024
+FRAGMENT_TTL = 3600
+
+
+def version(value):
+    """Key part for a value: table, id and updated_at of a model row, else the value itself"""
+    table = getattr(value, '__tablename__', None)
+    if table is None:
+        return str(value)
+    updated_at = getattr(value, 'updated_at', None)
+    if updated_at is None:
+        return None
+    return f'{table}.{value.id}@{updated_at.isoformat()}'
+
+
+def source_digest(environment, name):
+    try:
+        source, _, _ = environment.loader.get_source(environment, name)
+    except (TemplateNotFound, TypeError):
+        source = ''
+    return hashlib.sha1(source.encode()).hexdigest()[:8]
+
+
+class FragmentCacheExtension(Extension):
+    """The {% cache name, row, ... %} ... {% endcache %} tag"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_cache_ttl=FRAGMENT_TTL)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        prefix = f'{parser.name}:{source_digest(self.environment, parser.name)}'
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render', [nodes.Const(prefix), nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, prefix, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        versions = [version(part) for part in parts]
+        if None in versions:
+            return caller()
+        key = f'fragment:{prefix}:' + ':'.join(versions)
+        html = cache.get(key)
+        if html is None:
+            html = str(caller())
+            cache.set(key, html, self.environment.fragment_cache_ttl)
+        return Markup(html)
+
+
+def init_templating(app):
+    """Add the fragment cache tag and the template bytecode cache to the app's Jinja environment"""
+    app.config.setdefault('FRAGMENT_CACHE', os.environ.get('FRAGMENT_CACHE', 'memory'))
+    app.config.setdefault('FRAGMENT_CACHE_MAX_ENTRIES',
+                          int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', FRAGMENT_MAX_ENTRIES)))
+    app.config.setdefault('FRAGMENT_CACHE_TTL', int(os.environ.get('FRAGMENT_CACHE_TTL', FRAGMENT_TTL)))
+    app.config.setdefault('TEMPLATE_BYTECODE_DIR', os.environ.get(
+        'TEMPLATE_BYTECODE_DIR', os.path.join(app.instance_path, 'jinja_bytecode')))
+    app.config.setdefault('TEMPLATE_PRECOMPILE', env_flag('TEMPLATE_PRECOMPILE', default=True))
+
+    backend = app.config['FRAGMENT_CACHE']
+    if backend == 'memory':
+        cache = MemoryCache(app.config['FRAGMENT_CACHE_MAX_ENTRIES'])
+    elif backend == 'redis':
+        cache = RedisCache(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    elif backend == 'none':
+        cache = None
+    else:
+        raise ValueError(f'Unknown FRAGMENT_CACHE {backend!r}')
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = cache
+    app.jinja_env.fragment_cache_ttl = app.config['FRAGMENT_CACHE_TTL']
+
+    directory = app.config['TEMPLATE_BYTECODE_DIR']
+    if directory:
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            app.logger.warning(f'Template bytecode cache disabled, cannot create {directory}: {e}')
+        else:
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def precompile_templates(app):
+    """Load every template into the Jinja environment; returns (count, milliseconds)"""
+    started = time.perf_counter()
+    names = app.jinja_env.list_templates(extensions=('html',))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names), (time.perf_counter() - started) * 1000
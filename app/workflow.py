@@ -0,0 +1,127 @@
+"""
+Application state machine.
+
+Every status change goes through transition(), which applies it as one
+conditional `UPDATE application SET status = :to WHERE id = :id AND status
+IN (:from)` and checks the row count. Two officials acting on the same
+application at once can therefore never both succeed: the second UPDATE
+matches no row and raises InvalidTransition, so the caller rolls back
+instead of, say, recording a second fund release. transition_many() does
+the same for a whole batch with IN-list UPDATEs.
+
+Each successful transition is sent on the `transitioned` signal while the
+caller's transaction is still open, so subscribers can add their own rows
+(outbox emails) or defer work until the commit (cache invalidation).
+"""
+from datetime import datetime
+from blinker import Namespace
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+
+PENDING = 'pending'
+REQUIRES_REVISION = 'requires_revision'
+AUDITOR_VERIFIED = 'auditor_verified'
+UNDER_GOVERNMENT_REVIEW = 'under_government_review'
+GOVT_APPROVED = 'govt_approved'
+FUND_RELEASED = 'fund_released'
+REJECTED = 'rejected'
+
+AUDITABLE = (PENDING, REQUIRES_REVISION)
+REVIEWABLE = (AUDITOR_VERIFIED, UNDER_GOVERNMENT_REVIEW)
+
+# name -> (statuses it may start from, status it ends in)
+TRANSITIONS = {
+    'audit_pass': (AUDITABLE, AUDITOR_VERIFIED),
+    'audit_fail': (AUDITABLE, REJECTED),
+    'request_revision': (AUDITABLE, REQUIRES_REVISION),
+    'start_review': ((AUDITOR_VERIFIED,), UNDER_GOVERNMENT_REVIEW),
+    'approve': (REVIEWABLE, GOVT_APPROVED),
+    'reject': (REVIEWABLE, REJECTED),
+    'release_funds': ((GOVT_APPROVED,), FUND_RELEASED),
+}
+
+signals = Namespace()
+# sender: the Application; kwargs: transition, from_status, to_status
+transitioned = signals.signal('application-transitioned')
+
+
+class InvalidTransition(Exception):
+    """The application was not in a state the transition can start from"""
+
+    def __init__(self, application_id, name, status):
+        self.application_id = application_id
+        self.name = name
+        self.status = status
+        super().__init__(f'Cannot {name.replace("_", " ")} application {application_id} '
+                         f'while it is {str(status).replace("_", " ")}')
+
+
+def can_transition(application, name):
+    """Whether the transition is allowed from the application's loaded status (for display only)"""
+    return application.status in TRANSITIONS[name][0]
+
+
+def transition(application, name, **values):
+    """Move the application along a transition, atomically, in the current transaction.
+
+    Extra column values are written by the same UPDATE. Raises
+    InvalidTransition when another request got there first or the
+    application is in the wrong state; the caller should roll back.
+    """
+    from app.models import Application
+    sources, target = TRANSITIONS[name]
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(Application)
+        .where(Application.id == application.id, Application.status.in_(sources))
+        .values(status=target, updated_at=now, **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        current = db.session.query(Application.status).filter_by(id=application.id).scalar()
+        raise InvalidTransition(application.id, name, current)
+
+    from_status = application.status
+    # Keep the loaded object in step without flushing the columns again
+    for key, value in dict(values, status=target, updated_at=now).items():
+        set_committed_value(application, key, value)
+    transitioned.send(application, transition=name, from_status=from_status, to_status=target)
+    return application
+
+
+def transition_many(applications, name, chunk_size=500):
+    """Move many applications along one transition with a few IN-list UPDATEs.
+
+    All or nothing: if any application is no longer in a source state,
+    InvalidTransition is raised for it and the caller should roll back.
+    """
+    from app.models import Application
+    sources, target = TRANSITIONS[name]
+    now = datetime.utcnow()
+    applications = list({application.id: application for application in applications}.values())
+    ids = [application.id for application in applications]
+    moved = 0
+    for start in range(0, len(ids), chunk_size):
+        moved += db.session.execute(
+            update(Application)
+            .where(Application.id.in_(ids[start:start + chunk_size]), Application.status.in_(sources))
+            .values(status=target, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if moved != len(ids):
+        # Rows this call moved carry its exact timestamp; any other one was stale
+        for start in range(0, len(ids), chunk_size):
+            stale = (db.session.query(Application.id, Application.status)
+                     .filter(Application.id.in_(ids[start:start + chunk_size]),
+                             (Application.status != target) | (Application.updated_at != now))
+                     .first())
+            if stale is not None:
+                raise InvalidTransition(stale.id, name, stale.status)
+
+    for application in applications:
+        from_status = application.status
+        set_committed_value(application, 'status', target)
+        set_committed_value(application, 'updated_at', now)
+        transitioned.send(application, transition=name, from_status=from_status, to_status=target)
+    return applications
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Sync vs ASGI deployment load benchmark.
+
+Seeds a throwaway database with producers, officials and their applications,
+then starts the app twice on local ports: as DEPLOYMENT.md's four sync
+gunicorn workers (`run:app`) and as four uvicorn workers (`asgi:app`).
+Each server gets the same load from CLIENTS concurrent keep-alive clients:
+first every client logs in over and over (login form, then the credentials
+POST that checks the password, issues the OTP and queues its email), then
+every client loads its dashboard with a signed session cookie. Reports
+requests/s and p50/p99 latency per request type for each server.
+
+Needs gunicorn and uvicorn (`pip install gunicorn uvicorn`). Both servers
+run on this machine alongside the client, so compare them with each other
+rather than with production numbers.
+
+    python -m benchmarks.asgi_load --clients 200 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from urllib.parse import urlencode
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+from benchmarks.batch_disbursement import make_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'bench-password'
+CSRF_TOKEN = re.compile(rb'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+def seed(app, producers):
+    from sqlalchemy import insert
+    from app import db
+    from app.models import Application, User
+    from app.schema import upgrade_schema
+
+    upgrade_schema(app)
+    random.seed(21)
+    with app.app_context():
+        government = User(name='Government', email='government@bench.example.in', role='government')
+        government.set_password(PASSWORD)
+        db.session.add(government)
+        db.session.flush()
+        db.session.execute(insert(User), [
+            {'name': role.title(), 'email': f'{role}@bench.example.in', 'role': role,
+             'password_hash': government.password_hash}
+            for role in ('auditor', 'bank')] + [
+            {'name': f'Producer {n}', 'email': f'producer{n}@bench.example.in', 'role': 'producer',
+             'password_hash': government.password_hash, 'company_name': f'Hydrogen Co {n}'}
+            for n in range(producers)])
+        users = [(user.id, user.email) for user in User.query.order_by(User.id)]
+        now = datetime.utcnow()
+        statuses = ('pending', 'auditor_verified', 'govt_approved', 'fund_released')
+        db.session.execute(insert(Application), [
+            {'producer_id': user_id, 'project_name': f'Plant {user_id}-{n}', 'project_title': 'Load',
+             'status': random.choice(statuses), 'capacity': 10, 'created_at': now, 'updated_at': now}
+            for user_id, email in users if email.startswith('producer') for n in range(5)])
+        db.session.commit()
+        return users
+
+
+def session_cookie(app, user_id):
+    """A signed Flask session cookie of a logged-in user, as verify_otp would set"""
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({'_user_id': str(user_id), '_fresh': True})
+
+
+def free_port():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        return listener.getsockname()[1]
+
+
+def start_server(kind, port, workers, env):
+    if kind == 'sync':
+        command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                   '--backlog', '2048', 'run:app']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', str(workers), '--port', str(port),
+                   '--backlog', '2048', '--no-access-log', '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'{kind} server exited:\n{server.stderr.read().decode(errors="replace")}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/auth/login', timeout=5).close()
+            return server
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit(f'{kind} server did not start on port {port}')
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+class Client:
+    """A minimal HTTP/1.1 client on one keep-alive connection, reconnecting when the server closes it"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+        self.cookies = {}
+
+    async def request(self, method, path, body=b'', headers=None):
+        for attempt in (1, 2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+            lines = [f'{method} {path} HTTP/1.1', f'Host: 127.0.0.1:{self.port}', f'Content-Length: {len(body)}']
+            if self.cookies:
+                lines.append('Cookie: ' + '; '.join(f'{name}={value}' for name, value in self.cookies.items()))
+            lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+            try:
+                self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+                head = await self.reader.readuntil(b'\r\n\r\n')
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # An idle keep-alive connection the server dropped; nothing was answered yet
+                self.close()
+                if attempt == 2:
+                    raise
+                continue
+            return await self.response(head)
+
+    async def response(self, head):
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, value = line.split(':', 1)
+                name, value = name.lower(), value.strip()
+                if name == 'set-cookie':
+                    cookie_name, cookie_value = value.split(';', 1)[0].split('=', 1)
+                    self.cookies[cookie_name] = cookie_value
+                headers[name] = value
+        if headers.get('transfer-encoding') == 'chunked':
+            content = b''
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).strip(), 16)
+                content += (await self.reader.readexactly(size + 2))[:size]
+                if not size:
+                    break
+        elif 'content-length' in headers:
+            content = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            content = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def login(client, email, record):
+    client.cookies.clear()
+    started = time.perf_counter()
+    status, page = await client.request('GET', '/auth/login')
+    record('login form', started, status == 200)
+    token = CSRF_TOKEN.search(page)
+    form = urlencode({'csrf_token': token.group(1).decode() if token else '', 'email': email,
+                      'password': PASSWORD}).encode()
+    started = time.perf_counter()
+    status, _ = await client.request('POST', '/auth/login', form,
+                                     {'Content-Type': 'application/x-www-form-urlencoded'})
+    # A good login redirects to the OTP step
+    record('login', started, status == 302)
+
+
+async def dashboard(client, cookie, record):
+    client.cookies = {'session': cookie}
+    started = time.perf_counter()
+    status, _ = await client.request('GET', '/dashboard')
+    record('dashboard', started, status == 200)
+
+
+async def load(port, clients, duration, step, users):
+    """Run `step` in a loop on every client for `duration` seconds; returns {label: (latencies, errors)}"""
+    results = {}
+    deadline = time.perf_counter() + duration
+
+    def record(label, started, ok):
+        latencies, errors = results.setdefault(label, ([], [0]))
+        latencies.append(time.perf_counter() - started)
+        errors[0] += not ok
+
+    async def run(n):
+        client = Client(port)
+        user = users[n % len(users)]
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    await step(client, user, record)
+                except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                    record('connection errors', time.perf_counter(), False)
+                    client.close()
+        finally:
+            client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(n) for n in range(clients)))
+    return results, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of load per scenario and server.')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes of each server.')
+    parser.add_argument('--producers', type=int, default=200)
+    parser.add_argument('--servers', default='sync,asgi')
+    args = parser.parse_args()
+
+    for module in ('gunicorn', 'uvicorn'):
+        try:
+            __import__(module)
+        except ImportError:
+            raise SystemExit(f'{module} is needed: pip install gunicorn uvicorn')
+
+    workdir = tempfile.mkdtemp(prefix='shp-asgi-')
+    report = []
+    try:
+        db_path = os.path.join(workdir, 'load.db')
+        app = make_app(db_path)
+        users = seed(app, args.producers)
+        cookies = [session_cookie(app, user_id) for user_id, _ in users]
+        emails = [email for _, email in users]
+
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', MAIL_BACKEND='file',
+                   MAIL_FILE_SINK_DIR=os.path.join(workdir, 'mail'), OUTBOX_WORKER_THREADS='1')
+        for kind in args.servers.split(','):
+            port = free_port()
+            server = start_server(kind, port, args.workers, env)
+            try:
+                for scenario, step, per_client in (('login', login, emails), ('dashboard', dashboard, cookies)):
+                    results, elapsed = asyncio.run(load(port, args.clients, args.duration, step, per_client))
+                    report.append((kind, scenario, results, elapsed))
+            finally:
+                stop_server(server)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{args.clients} clients, {args.workers} workers per server, {args.duration:.0f} s per scenario, '
+          f'{os.cpu_count()} CPU(s)')
+    print(f'  {"server":<6} {"request":<18} {"requests":>9} {"req/s":>8} {"p50":>9} {"p99":>9} {"errors":>7}')
+    for kind, scenario, results, elapsed in report:
+        for label, (latencies, errors) in results.items():
+            print(f'  {kind:<6} {label:<18} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} '
+                  f'{percentile(latencies, 0.5) * 1000:>7.0f}ms {percentile(latencies, 0.99) * 1000:>7.0f}ms '
+                  f'{errors[0]:>7}')
+
+
+if __name__ == '__main__':
+    main()
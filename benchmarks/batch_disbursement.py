@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Batch disbursement benchmark.
+
+Seeds a throwaway database with government-approved applications (each with
+a sanctioned amount and producer bank details) and verified milestones,
+then pays them all in one app.disbursement.run_batch() call, as the bank's
+"Disburse All Pending" button does, and streams the NEFT payment file for
+the run. Reports the statements issued, the time for each step and the
+peak Python memory while streaming, which should stay flat as the run grows.
+
+    python -m benchmarks.batch_disbursement --applications 10000 --milestones 2000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+
+def make_app(db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    return create_app()
+
+
+def seed(app, applications, milestones, unique_amounts=False):
+    """Approved applications with their sanctions posted; unique_amounts gives each its own amount"""
+    from sqlalchemy import insert
+    from app import db, ledger
+    from app.models import User, Application, Milestone
+    from app.schema import upgrade_schema
+
+    upgrade_schema(app)
+    with app.app_context():
+        bank = User(name='Bank', email='bank@bench.local', role='bank')
+        bank.set_password('bench')
+        db.session.add(bank)
+        db.session.flush()
+        producers = [{'name': f'Producer {n}', 'email': f'producer{n}@bench.local', 'role': 'producer',
+                      'password_hash': bank.password_hash, 'company_name': f'Hydrogen Co {n}',
+                      'bank_account_number': f'{10000000 + n}', 'bank_name': 'SBI', 'ifsc_code': 'SBIN0000001'}
+                     for n in range(max(1, applications // 10))]
+        db.session.execute(insert(User), producers)
+        producer_ids = [user.id for user in User.query.filter_by(role='producer').order_by(User.id)]
+        now = datetime.utcnow()
+        db.session.execute(insert(Application), [
+            {'producer_id': producer_ids[n % len(producer_ids)], 'project_name': f'Plant {n}',
+             'project_title': 'Batch', 'status': 'govt_approved', 'capacity': 10,
+             'created_at': now, 'updated_at': now}
+            for n in range(applications)
+        ])
+        application_ids = [row.id for row in db.session.query(Application.id).order_by(Application.id)]
+        ledger.sanction_many({application_id: 500000 + (n if unique_amounts else 100 * (n % 50))
+                              for n, application_id in enumerate(application_ids)})
+        if milestones:
+            db.session.execute(insert(Milestone), [
+                {'application_id': application_ids[n % len(application_ids)], 'milestone_name': f'Milestone {n}',
+                 'milestone_date': now, 'milestone_amount': 50000, 'status': 'completed',
+                 'auditor_verification_status': 'verified', 'payment_status': 'pending'}
+                for n in range(milestones)
+            ])
+        db.session.commit()
+        return bank.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=10000)
+    parser.add_argument('--milestones', type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='shp-batch-')
+    try:
+        app = make_app(os.path.join(workdir, 'batch.db'))
+        bank_id = seed(app, args.applications, args.milestones)
+
+        from app import db
+        from app.disbursement import payable_ids, payment_file, run_batch
+        from app.queries import count_queries
+        with app.test_request_context():
+            with count_queries() as statements:
+                started = time.perf_counter()
+                application_ids, milestone_ids = payable_ids()
+                batch, skipped = run_batch(bank_id, application_ids, milestone_ids)
+                db.session.commit()
+                paid = time.perf_counter() - started
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            size = rows = 0
+            for chunk in payment_file(batch, 'neft'):
+                size += len(chunk)
+                rows += chunk.count('\n')
+            streamed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'batch of {batch.item_count} payments ({args.applications} releases, {args.milestones} milestones), '
+          f'{len(skipped)} skipped, ₹{batch.total_amount:,.2f}')
+    print(f'  validate + write + commit: {paid * 1000:.0f} ms, {len(statements)} SQL statements')
+    print(f'  payment file: {rows - 1} rows, {size / 1024:.0f} KiB in {streamed * 1000:.0f} ms, '
+          f'peak Python memory while streaming {peak / 1024:.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
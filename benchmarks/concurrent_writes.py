@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Concurrent write benchmark for the SQLite backend.
+
+Several worker processes (like `gunicorn -w 4`) each run a loop of the app's
+hot writes - the OTP update on login and a milestone insert - interleaved
+with a dashboard read, against a throwaway database. The run is repeated
+with the old connection defaults (rollback journal, synchronous=FULL) and
+with the tuned settings from app.database (WAL, synchronous=NORMAL, busy
+timeout), reporting throughput and "database is locked" errors for each.
+Locked errors in the legacy run grow as workers are added or the busy
+timeout shrinks; the tuned run should report none.
+
+    python -m benchmarks.concurrent_writes --workers 4 --writes 300
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+PROFILES = {
+    'legacy': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL'},
+    'tuned': {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL'},
+}
+
+
+def make_app(db_path, profile, busy_timeout_ms):
+    os.environ.update(PROFILES[profile])
+    os.environ['SQLITE_BUSY_TIMEOUT_MS'] = str(busy_timeout_ms)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    return create_app()
+
+
+def seed(db_path, profile, busy_timeout_ms, workers):
+    from app import db
+    from app.models import User, Application
+    from app.schema import upgrade_schema
+
+    app = make_app(db_path, profile, busy_timeout_ms)
+    upgrade_schema(app)
+    with app.app_context():
+        for n in range(workers):
+            user = User(name=f'Producer {n}', email=f'producer{n}@bench.local', role='producer')
+            user.set_password('bench')
+            db.session.add(user)
+        db.session.flush()
+        producer_id = User.query.first().id
+        db.session.add_all([
+            Application(producer_id=producer_id, project_name=f'Plant {n}', project_title='Bench', status='pending')
+            for n in range(500)
+        ])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def worker(db_path, profile, busy_timeout_ms, worker_index, writes, results):
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from app.models import User, Application, Milestone
+
+    app = make_app(db_path, profile, busy_timeout_ms)
+    locked = committed = 0
+    with app.app_context():
+        user_id = User.query.filter_by(email=f'producer{worker_index}@bench.local').one().id
+        application_id = Application.query.first().id
+        for i in range(writes):
+            try:
+                Application.query.filter_by(status='pending').order_by(Application.created_at.desc()).limit(50).all()
+                user = db.session.get(User, user_id)
+                user.otp_code = f'{i % 1000000:06d}'
+                user.otp_expires = datetime.utcnow()
+                db.session.commit()
+                db.session.add(Milestone(application_id=application_id, milestone_name=f'M{worker_index}-{i}',
+                                         milestone_date=datetime.utcnow()))
+                db.session.commit()
+                committed += 2
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e):
+                    raise
+                locked += 1
+    results.put((committed, locked))
+
+
+def run(profile, workers, writes, busy_timeout_ms):
+    workdir = tempfile.mkdtemp(prefix='shp-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    try:
+        seed(db_path, profile, busy_timeout_ms, workers)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(db_path, profile, busy_timeout_ms, n, writes, results))
+            for n in range(workers)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    committed = sum(c for c, _ in totals)
+    locked = sum(l for _, l in totals)
+    return {'profile': profile, 'commits': committed, 'locked_errors': locked,
+            'seconds': elapsed, 'commits_per_second': committed / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--writes', type=int, default=300, help='loop iterations per worker (2 commits each)')
+    parser.add_argument('--busy-timeout-ms', type=int, default=5000)
+    parser.add_argument('--legacy-busy-timeout-ms', type=int, default=5000,
+                        help="busy timeout for the legacy run (default: pysqlite's implicit 5 s); "
+                             '0 shows the lock errors writers hit as soon as they contend')
+    args = parser.parse_args()
+
+    print(f'{"profile":<8} {"commits":>8} {"locked":>7} {"seconds":>8} {"commits/s":>10}')
+    for profile, busy in (('legacy', args.legacy_busy_timeout_ms), ('tuned', args.busy_timeout_ms)):
+        result = run(profile, args.workers, args.writes, busy)
+        print(f'{profile:<8} {result["commits"]:>8} {result["locked_errors"]:>7} '
+              f'{result["seconds"]:>8.2f} {result["commits_per_second"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
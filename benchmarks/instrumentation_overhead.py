@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Request instrumentation overhead benchmark.
+
+Fills a throwaway database with benchmarks.synthetic_data and builds the app
+three times against it: without instrumentation, with the default sample
+rate and with every request profiled. Rounds of benchmarks.workflow_load
+cycles then run on each app in turn, starting with a different one each
+round, so drift on the machine hits all three alike. Reports the median
+time per cycle and each variant's overhead against the uninstrumented app;
+the sampled one should stay under 1%, within the noise of the machine.
+
+    python -m benchmarks.instrumentation_overhead --rounds 15 --cycles 10
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+from benchmarks.batch_disbursement import make_app
+from benchmarks.workflow_load import Workload, load_users
+
+
+def build(db_path, workdir, instrumentation, sample_rate):
+    from app.storage import LocalStorage
+    os.environ['INSTRUMENTATION'] = '1' if instrumentation else '0'
+    os.environ['INSTRUMENTATION_SAMPLE_RATE'] = str(sample_rate)
+    app = make_app(db_path)
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.extensions['storage'] = LocalStorage(workdir)
+    return app
+
+
+def main():
+    from app.instrumentation import DEFAULT_SAMPLE_RATE
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=5000, help='Applications to generate.')
+    parser.add_argument('--rounds', type=int, default=15)
+    parser.add_argument('--cycles', type=int, default=10, help='Workflow cycles per variant and round.')
+    parser.add_argument('--sample-rate', type=float, default=DEFAULT_SAMPLE_RATE)
+    parser.add_argument('--seed', type=int, default=23)
+    args = parser.parse_args()
+
+    from benchmarks.synthetic_data import generate
+    from app.schema import upgrade_schema
+    workdir = tempfile.mkdtemp(prefix='shp-instrumentation-')
+    variants = (('off', False, 0), (f'sampled {args.sample_rate:g}', True, args.sample_rate), ('every request', True, 1))
+    try:
+        db_path = os.path.join(workdir, 'instrumentation.db')
+        apps = [build(db_path, workdir, instrumentation, rate) for _, instrumentation, rate in variants]
+        upgrade_schema(apps[0])
+        generate(apps[0], args.applications, seed=args.seed)
+        workloads = [Workload(app, load_users(app)) for app in apps]
+        per_cycle = [[] for _ in variants]
+        rng = random.Random(args.seed)
+        for workload in workloads:
+            workload.cycle(-1, rng, record=False)
+        n = 0
+        for round_number in range(args.rounds):
+            # A different variant goes first each round, so none always runs on a warmer cache
+            order = list(range(len(workloads)))
+            order = order[round_number % len(order):] + order[:round_number % len(order)]
+            for index in order:
+                workload = workloads[index]
+                started = time.perf_counter()
+                for _ in range(args.cycles):
+                    workload.cycle(n, rng, record=False)
+                    n += 1
+                per_cycle[index].append((time.perf_counter() - started) / args.cycles)
+        failures = [failure for workload in workloads for failure in workload.failures]
+        sampled = apps[1].extensions['metrics'].sampled.total()
+        requests = sum(apps[1].extensions['metrics'].requests.values())
+        for app in apps:
+            with app.app_context():
+                from app import db
+                db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{args.rounds} rounds of {args.cycles} workflow cycles per variant, {args.applications} applications')
+    print(f'  {"variant":<16} {"per cycle":>10} {"overhead":>9}')
+    baseline = statistics.median(per_cycle[0])
+    for (label, _, _), times in zip(variants, per_cycle):
+        median = statistics.median(times)
+        print(f'  {label:<16} {median * 1000:>8.1f}ms {median / baseline - 1:>+8.1%}')
+    print(f'  {sampled} of {requests} requests profiled in the sampled variant')
+    for failure in failures[:10]:
+        print(f'  FAILED {failure}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Map clustering benchmark.
+
+Seeds a throwaway database with plants scattered across India, then requests
+/map/clusters for a national view and for random zoomed-in views, and
+compares the response size and time with the per-application marker list
+the producer map used to embed. Each view's cluster total is checked against
+a plain count of the plants inside its box.
+
+    python -m benchmarks.map_clusters --applications 100000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+# Every request should hit the database
+os.environ.setdefault('DASHBOARD_CACHE', 'none')
+
+from benchmarks.batch_disbursement import make_app
+
+# Roughly mainland India, with a few dense industrial clusters
+BOUNDS = (8.0, 68.0, 35.0, 97.0)
+HUBS = ((22.3, 70.1), (21.7, 72.9), (13.1, 80.2), (19.0, 72.8))
+STATUSES = ('pending', 'auditor_verified', 'govt_approved', 'fund_released', 'rejected')
+
+
+def seed(app, applications):
+    from sqlalchemy import insert
+    from app import db
+    from app.geo import location_hash
+    from app.models import Application, User
+    from app.schema import upgrade_schema
+
+    upgrade_schema(app)
+    random.seed(19)
+    with app.app_context():
+        government = User(name='Government', email='government@bench.local', role='government')
+        government.set_password('bench')
+        db.session.add(government)
+        db.session.flush()
+        now = datetime.utcnow()
+        rows = []
+        for n in range(applications):
+            if n % 3:
+                latitude, longitude = random.uniform(BOUNDS[0], BOUNDS[2]), random.uniform(BOUNDS[1], BOUNDS[3])
+            else:
+                hub = HUBS[n % len(HUBS)]
+                latitude, longitude = random.gauss(hub[0], 0.3), random.gauss(hub[1], 0.3)
+            # Bulk inserts skip the mapper events, so the geohash is set here
+            rows.append({'producer_id': government.id, 'project_name': f'Plant {n}', 'project_title': 'Map',
+                         'status': STATUSES[n % len(STATUSES)], 'capacity': 10, 'capacity_mw': 5 + n % 20,
+                         'project_latitude': latitude, 'project_longitude': longitude,
+                         'project_geohash': location_hash(latitude, longitude),
+                         'created_at': now, 'updated_at': now})
+        for start in range(0, len(rows), 50000):
+            db.session.execute(insert(Application), rows[start:start + 50000])
+        db.session.commit()
+        return government.id
+
+
+def legacy_payload():
+    """The marker list my_applications_enhanced.html used to render, one entry per plant"""
+    from app.models import Application
+    return json.dumps([
+        {'lat': row.project_latitude, 'lng': row.project_longitude, 'title': row.project_name,
+         'status': row.status, 'capacity': f'{row.capacity_mw} MW'}
+        for row in Application.query.filter(Application.project_latitude.isnot(None))
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=100000)
+    parser.add_argument('--views', type=int, default=50, help='Random zoomed-in views to request.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='shp-map-')
+    try:
+        app = make_app(os.path.join(workdir, 'map.db'))
+        user_id = seed(app, args.applications)
+
+        from app import db
+        from app.models import Application
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+        with app.app_context():
+            started = time.perf_counter()
+            legacy_size = len(legacy_payload())
+            legacy_time = time.perf_counter() - started
+
+        random.seed(7)
+        views = [(5, BOUNDS)]
+        for _ in range(args.views):
+            zoom = random.randint(6, 14)
+            span = 1440 / 2 ** zoom / 2
+            south, west = random.uniform(BOUNDS[0], BOUNDS[2] - span), random.uniform(BOUNDS[1], BOUNDS[3] - span)
+            views.append((zoom, (south, west, south + span / 2, west + span)))
+
+        sizes, times, markers, mismatches = [], [], [], 0
+        for zoom, (south, west, north, east) in views:
+            started = time.perf_counter()
+            response = client.get(f'/map/clusters?south={south}&west={west}&north={north}&east={east}&zoom={zoom}')
+            times.append(time.perf_counter() - started)
+            data = response.get_json()
+            sizes.append(len(response.data))
+            markers.append(len(data['clusters']))
+            with app.app_context():
+                # The response covers the box snapped out to whole cells
+                from app.geo import view
+                _, boxes = view(south, west, north, east, zoom)
+                expected = sum(Application.query.filter(Application.project_latitude.between(box[0], box[2]),
+                                                        Application.project_longitude.between(box[1], box[3])).count()
+                               for box in boxes)
+            mismatches += data['total'] != expected
+        etag = response.headers['ETag']
+        revalidated = client.get(response.request.full_path, headers={'If-None-Match': etag}).status_code
+        with app.app_context():
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    national = sizes[0]
+    print(f'{args.applications} applications')
+    print(f'  per-plant marker list:   {legacy_size / 1024:9.1f} KB, built in {legacy_time * 1000:.0f} ms')
+    print(f'  national clusters:       {national / 1024:9.1f} KB, {markers[0]} markers, {times[0] * 1000:.0f} ms')
+    print(f'  zoomed views ({len(views) - 1}):       max {max(sizes[1:]) / 1024:.1f} KB, '
+          f'max {max(markers[1:])} markers, median {sorted(times[1:])[len(times) // 2] * 1000:.1f} ms')
+    print(f'  views whose total differs from a direct count: {mismatches}')
+    print(f'  unchanged view with If-None-Match: HTTP {revalidated}')
+
+
+if __name__ == '__main__':
+    main()
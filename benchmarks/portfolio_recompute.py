@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Portfolio recompute benchmark.
+
+Builds a synthetic portfolio (technology, state, status and capacities drawn
+at random) in memory and times app.portfolio's vectorised what-if: the
+baseline and the proposed recompute plus the grouped totals. No database is
+involved, so the number is the pure pricing cost `flask subsidy-what-if`
+adds on top of loading the columns.
+
+    python -m benchmarks.portfolio_recompute --applications 1000000
+"""
+import argparse
+import json
+import time
+from datetime import date
+
+import numpy as np
+
+TECHNOLOGIES = ['electrolysis', 'steam_reforming', 'biomass_gasification', 'solar_thermal']
+STATES = ['Maharashtra', 'Gujarat', 'Rajasthan', 'Tamil Nadu', 'Karnataka', 'Odisha']
+STATUSES = ['pending', 'auditor_verified', 'govt_approved', 'fund_released', 'rejected']
+
+
+class Row:
+    """Stand-in for a SubsidyPolicy row"""
+
+    def __init__(self, **fields):
+        defaults = dict(rate_per_ton=None, rate_per_mw=None, rate_percentage_capex=None,
+                        min_capacity_threshold=None, max_capacity_threshold=None,
+                        policy_start_date=None, policy_end_date=None, eligibility_criteria=None)
+        self.__dict__.update(defaults, **fields)
+
+
+def synthetic_portfolio(size, seed=0):
+    from app.portfolio import Portfolio
+
+    rng = np.random.default_rng(seed)
+    capacity_mw = rng.gamma(2.0, 5.0, size)
+    capacity_mw[rng.random(size) < 0.05] = np.nan  # some applications leave it blank
+    codes = {
+        'technology': rng.integers(0, len(TECHNOLOGIES), size, dtype=np.int32),
+        'state': rng.integers(0, len(STATES), size, dtype=np.int32),
+        'status': rng.integers(0, len(STATUSES), size, dtype=np.int32),
+    }
+    labels = {'technology': TECHNOLOGIES, 'state': STATES, 'status': STATUSES}
+    return Portfolio(capacity_mw * 150, capacity_mw, capacity_mw * 8, codes, labels)
+
+
+def policy_table():
+    from app.policy_engine import CompiledPolicy
+
+    rows = [
+        Row(id=1, policy_name='Electrolysis', technology_type='electrolysis', rate_per_ton=50000,
+            rate_per_mw=5000000, rate_percentage_capex=30, eligibility_criteria=json.dumps({'min_capacity_mw': 1})),
+        Row(id=2, policy_name='Steam reforming', technology_type='steam_reforming', rate_per_ton=30000,
+            rate_percentage_capex=20, max_capacity_threshold=40),
+        Row(id=3, policy_name='Biomass', technology_type='biomass_gasification', rate_per_ton=40000,
+            rate_percentage_capex=35),
+        Row(id=4, policy_name='Fallback', technology_type='all', rate_per_mw=1000000),
+    ]
+    table = {}
+    for row in rows:
+        table.setdefault(row.technology_type, []).append(CompiledPolicy(row))
+    return table
+
+
+def main():
+    from app.portfolio import what_if
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=1_000_000)
+    parser.add_argument('--runs', type=int, default=5, help='repeats; the fastest counts')
+    args = parser.parse_args()
+
+    portfolio = synthetic_portfolio(args.applications)
+    table = policy_table()
+    changes = {1: {'rate_per_mw': 4000000}, 2: {'max_capacity_threshold': 25}}
+
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        report = what_if(portfolio, table, changes, today=date.today())
+        timings.append(time.perf_counter() - started)
+
+    current = sum(c for c, _ in report['technology'].values())
+    proposed = sum(p for _, p in report['technology'].values())
+    print(f'{args.applications} applications: what-if in {min(timings) * 1000:.0f} ms '
+          f'(best of {args.runs}); total ₹{current:,.0f} -> ₹{proposed:,.0f}')
+
+
+if __name__ == '__main__':
+    main()
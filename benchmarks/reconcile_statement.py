@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Bank statement reconciliation benchmark.
+
+Pays a batch of government-approved applications (see
+benchmarks.batch_disbursement), writes a CSV statement for it in which most
+lines quote the subsidy request ID, some only carry the amount and date and
+a few are wrong or unknown, then imports it with
+app.reconciliation.import_statement() as the upload and the
+reconcile-statement command do. It then imports a second statement that
+shares half of its lines with the first, to show that only the new lines are processed.
+Reports the time and SQL statements of each import.
+
+    python -m benchmarks.reconcile_statement --transactions 20000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.batch_disbursement import make_app, seed
+
+
+def write_statement(path, transactions, start, stop):
+    with open(path, 'w', newline='') as out:
+        out.write('Value Date,Narration,Ref No,Withdrawal Amt.\n')
+        for n in range(start, stop):
+            subsidy_request_id, amount, day = transactions[n]
+            # Seeded per line, so overlapping statements repeat lines exactly
+            rng = random.Random(n)
+            kind = rng.random()
+            if kind < 0.8:
+                out.write(f'{day:%d/%m/%Y},NEFT {subsidy_request_id} SUBSIDY,,"{amount:,.2f}"\n')
+            elif kind < 0.95:
+                out.write(f'{day:%d/%m/%Y},NEFT PAYMENT {n},,{amount:.2f}\n')
+            elif kind < 0.98:
+                out.write(f'{day:%d/%m/%Y},RTGS,{subsidy_request_id},{amount + 10:.2f}\n')
+            else:
+                out.write(f'{day:%d/%m/%Y},UNKNOWN PAYEE {n},CHQ{n},{rng.randint(1, 10 ** 6):.2f}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transactions', type=int, default=20000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='shp-recon-')
+    try:
+        app = make_app(os.path.join(workdir, 'recon.db'))
+        # Unique amounts, so amount-and-date matching has something to find
+        bank_id = seed(app, args.transactions, 0, unique_amounts=True)
+
+        from app import db
+        from app.disbursement import payable_ids, run_batch
+        from app.models import StatementLine, Transaction
+        from app.queries import count_queries, status_counts
+        from app.reconciliation import import_statement
+        with app.test_request_context():
+            application_ids, milestone_ids = payable_ids()
+            run_batch(bank_id, application_ids, milestone_ids)
+            db.session.commit()
+            transactions = [(row.subsidy_request_id, row.amount_disbursed, row.disbursement_date.date())
+                            for row in db.session.query(Transaction.subsidy_request_id, Transaction.amount_disbursed,
+                                                        Transaction.disbursement_date).order_by(Transaction.id)]
+
+            third = len(transactions) // 3
+            files = [('first', 0, 2 * third), ('overlapping', third, len(transactions))]
+            results = []
+            for name, start, stop in files:
+                path = os.path.join(workdir, f'{name}.csv')
+                write_statement(path, transactions, start, stop)
+                with count_queries() as statements:
+                    started = time.perf_counter()
+                    with open(path, 'rb') as stream:
+                        statement, _ = import_statement(bank_id, stream, os.path.basename(path))
+                    db.session.commit()
+                    took = time.perf_counter() - started
+                results.append((name, stop - start, statement.line_count, statement.duplicate_count, took,
+                                len(statements)))
+            counts = status_counts(StatementLine.query.filter_by(bank_id=bank_id), StatementLine)
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{len(transactions)} disbursements')
+    for name, lines, new, duplicates, took, statements in results:
+        print(f'  {name} statement: {lines} lines ({new} new, {duplicates} already seen) in {took * 1000:.0f} ms, '
+              f'{statements} SQL statements')
+    print('  ' + ', '.join(f'{counts.get(status, 0)} {status}' for status in ('matched', 'mismatched', 'unmatched')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Reporting summaries benchmark.
+
+Seeds a throwaway database with applications across technologies and
+statuses and a disbursement for each approved one, then compares the
+government report and the bank totals computed live (GROUP BY over
+application, ledger_balance and transaction) with the same figures read
+from the summary tables kept by app.summaries. Also moves a block of
+applications through a workflow transition to show what keeping the
+summaries up to date adds to a commit.
+
+    python -m benchmarks.reporting_summaries --applications 200000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+from benchmarks.batch_disbursement import make_app
+
+TECHNOLOGIES = ('electrolysis', 'steam_reforming', 'biomass_gasification', 'solar_thermochemical', None)
+STATUSES = ('pending', 'auditor_verified', 'under_government_review', 'govt_approved', 'fund_released', 'rejected')
+
+
+def seed(app, applications):
+    from sqlalchemy import insert
+    from app import db
+    from app.models import Application, LedgerBalance, Transaction, User
+    from app.schema import upgrade_schema
+    from app.summaries import rebuild
+
+    upgrade_schema(app)
+    with app.app_context():
+        bank = User(name='Bank', email='bank@bench.local', role='bank')
+        bank.set_password('bench')
+        producer = User(name='Producer', email='producer@bench.local', role='producer',
+                        password_hash=bank.password_hash)
+        db.session.add_all([bank, producer])
+        db.session.flush()
+        now = datetime.utcnow()
+        rows = [{'producer_id': producer.id, 'project_name': f'Plant {n}', 'project_title': 'Report',
+                 'technology_type': TECHNOLOGIES[n % len(TECHNOLOGIES)], 'status': STATUSES[n % len(STATUSES)],
+                 'capacity': 10, 'capacity_mw': 5 + n % 20, 'capacity_tons': 100 + n % 900,
+                 'created_at': now, 'updated_at': now} for n in range(applications)]
+        for start in range(0, len(rows), 50000):
+            db.session.execute(insert(Application), rows[start:start + 50000])
+        released = [row.id for row in db.session.query(Application.id).filter_by(status='fund_released')]
+        db.session.execute(LedgerBalance.__table__.insert(), [
+            {'application_id': application_id, 'account': 'sanctioned', 'balance': -500000, 'updated_at': now}
+            for application_id in released])
+        db.session.execute(Transaction.__table__.insert(), [
+            {'bank_id': bank.id, 'application_id': application_id, 'subsidy_request_id': f'SR{application_id}',
+             'amount_disbursed': 500000, 'amount': 500000, 'disbursement_date': now, 'date': now,
+             'created_at': now, 'updated_at': now} for application_id in released])
+        # Bulk inserts bypass the incremental tracking, as any bulk load would
+        rebuild()
+        db.session.commit()
+        return bank.id
+
+
+def timed(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        took = time.perf_counter() - started
+        best = took if best is None else min(best, took)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=200000)
+    parser.add_argument('--transition', type=int, default=5000, help='Applications moved in the write test.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='shp-summaries-')
+    try:
+        app = make_app(os.path.join(workdir, 'summaries.db'))
+        bank_id = seed(app, args.applications)
+
+        from app import db
+        from app.models import Application
+        from app.queries import count_queries
+        from app.summaries import bank_totals, by_technology, computed, drift, status_funnel
+        from app.workflow import transition_many
+        with app.test_request_context():
+            _, live = timed(computed)
+            _, summary = timed(lambda: (status_funnel(), by_technology(), bank_totals(bank_id)))
+
+            applications = Application.query.filter_by(status='auditor_verified').limit(args.transition).all()
+            with count_queries() as statements:
+                started = time.perf_counter()
+                transition_many(applications, 'start_review')
+                db.session.commit()
+                moved = time.perf_counter() - started
+            differences = drift()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{args.applications} applications')
+    print(f'  report computed live:      {live * 1000:8.1f} ms')
+    print(f'  report from summaries:     {summary * 1000:8.1f} ms ({live / summary:.0f}x faster)')
+    print(f'  transition of {len(applications)} applications: {moved * 1000:.0f} ms, '
+          f'{len(statements)} SQL statements including the summary update')
+    print(f'  summary rows differing from a recompute afterwards: {len(differences)}')
+
+
+if __name__ == '__main__':
+    main()
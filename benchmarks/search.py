@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Full-text search benchmark.
+
+Seeds a throwaway database with applications, audits and milestones whose
+descriptions and comments are drawn from a project vocabulary, rebuilds the
+search index as `flask reindex-search` does, and times ranked searches for
+rare, common, prefix and multi-word queries. The same searches are also run
+as the LIKE scan over the source columns that finding a project took before.
+Then one application is edited through the ORM, to show what keeping the
+index in step adds to a commit.
+
+    python -m benchmarks.search --documents 100000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+from benchmarks.batch_disbursement import make_app
+
+COMMON = ('the', 'of', 'and', 'to', 'in', 'for', 'with', 'at', 'on', 'by', 'is', 'was', 'be', 'as', 'from',
+          'plant', 'project', 'hydrogen', 'green', 'per', 'will', 'has', 'are', 'this', 'site', 'unit')
+WORDS = ('alkaline', 'electrolyser', 'electrolysis', 'membrane', 'stack', 'solar', 'wind', 'hybrid', 'grid',
+         'storage', 'ammonia', 'methanol', 'refinery', 'fertiliser', 'steel', 'pipeline', 'compressor',
+         'desalination', 'water', 'oxygen', 'purity', 'capacity', 'tender', 'land', 'lease', 'clearance',
+         'environment', 'pollution', 'board', 'consent', 'commissioning', 'trial', 'run', 'inspection',
+         'safety', 'audit', 'compliant', 'deviation', 'invoice', 'capex', 'opex', 'tariff', 'subsidy',
+         'milestone', 'delay', 'monsoon', 'port', 'export', 'kandla', 'paradip', 'tuticorin', 'vizag',
+         'gujarat', 'odisha', 'rajasthan', 'tamil', 'nadu', 'andhra', 'maharashtra', 'karnataka')
+QUERIES = ('hydrogen', 'kandla', 'electrolyser', 'electroly', 'solar ammonia', 'safety deviation monsoon', 'compliant',
+           'zarvokite')
+# Word frequencies fall off as in real text: common words first, then the
+# project vocabulary, then thousands of rarer names and terms
+VOCABULARY = COMMON + WORDS + tuple(
+    ''.join(random.Random(n).choice('aeioubcdfgklmnprstvz') for _ in range(4 + n % 6)) for n in range(5000)
+) + ('zarvokite',)
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def sentence(words):
+    return ' '.join(random.choices(VOCABULARY, WEIGHTS, k=words)).capitalize() + '.'
+
+
+def seed(app, documents):
+    from sqlalchemy import insert
+    from app import db
+    from app.models import Application, Audit, Milestone, User
+    from app.schema import upgrade_schema
+
+    upgrade_schema(app)
+    random.seed(20)
+    with app.app_context():
+        government = User(name='Government', email='government@bench.local', role='government')
+        government.set_password('bench')
+        db.session.add(government)
+        db.session.flush()
+        now = datetime.utcnow()
+        applications = documents * 6 // 10
+        rows = [{'producer_id': government.id, 'project_name': f'Plant {n} {random.choice(WORDS).title()}',
+                 'project_title': sentence(4), 'project_description': ' '.join(sentence(12) for _ in range(4)),
+                 'project_details': sentence(20), 'review_notes': sentence(10) if n % 2 else None,
+                 'govt_comments': sentence(8) if n % 3 == 0 else None, 'status': 'pending', 'capacity': 10,
+                 'created_at': now, 'updated_at': now} for n in range(applications)]
+        for start in range(0, len(rows), 50000):
+            db.session.execute(insert(Application), rows[start:start + 50000])
+        db.session.execute(Audit.__table__.insert(), [
+            {'application_id': 1 + n % applications, 'auditor_id': government.id, 'audit_comments': sentence(25),
+             'compliance_status': 'pass', 'created_at': now, 'updated_at': now}
+            for n in range(documents // 4)])
+        db.session.execute(Milestone.__table__.insert(), [
+            {'application_id': 1 + n % applications, 'milestone_name': sentence(3), 'milestone_date': now,
+             'auditor_verification_comments': sentence(15), 'created_at': now}
+            for n in range(documents - applications - documents // 4)])
+        db.session.commit()
+        return government.id
+
+
+def like_scan(words):
+    """Matching applications the way it was done before the index: LIKE over every text column"""
+    from sqlalchemy import and_, or_
+    from app.models import Application, Audit, Milestone
+    columns = (Application.project_name, Application.project_description, Application.project_details,
+               Application.review_notes, Application.govt_comments)
+    matches = Application.query.filter(and_(*(or_(*(column.ilike(f'%{word}%') for column in columns))
+                                              for word in words))).limit(21).all()
+    matches += Audit.query.filter(and_(*(Audit.audit_comments.ilike(f'%{word}%') for word in words))).limit(21).all()
+    matches += Milestone.query.filter(and_(*(Milestone.auditor_verification_comments.ilike(f'%{word}%')
+                                             for word in words))).limit(21).all()
+    return matches
+
+
+def timed(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        took = time.perf_counter() - started
+        best = took if best is None else min(best, took)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='shp-search-')
+    try:
+        app = make_app(os.path.join(workdir, 'search.db'))
+        seed(app, args.documents)
+
+        from app import db
+        from app.models import Application
+        from app.queries import count_queries
+        from app.search import rebuild, search, terms
+        backend = app.config['SEARCH_BACKEND']
+        with app.test_request_context():
+            started = time.perf_counter()
+            indexed = rebuild(db.session.connection(), backend)
+            db.session.commit()
+            rebuild_time = time.perf_counter() - started
+
+            results = []
+            for query in QUERIES:
+                (page, has_next), took = timed(lambda: search(query, backend=backend))
+                (page2, _), deep = timed(lambda: search(query, page=10, backend=backend))
+                _, scan = timed(lambda: like_scan(terms(query)), repeat=1)
+                results.append((query, len(page), has_next, took, deep, scan))
+
+            application = db.session.get(Application, 1)
+            application.project_description = 'Relocated to the Kandla port cluster.'
+            with count_queries() as statements:
+                started = time.perf_counter()
+                db.session.commit()
+                edit = time.perf_counter() - started
+            found = any(result['id'] == 1 for result in search('relocated kandla', backend=backend)[0])
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{indexed} documents indexed ({backend}) in {rebuild_time:.1f} s')
+    print(f'  {"query":<26} {"page 1":>8} {"page 10":>8} {"LIKE, unranked":>15}')
+    for query, hits, has_next, took, deep, scan in results:
+        print(f'  {query:<26} {took * 1000:6.1f}ms {deep * 1000:6.1f}ms {scan * 1000:13.0f}ms'
+              f'  ({hits}{"+" if has_next else ""} hits)')
+    print(f'  edit + commit incl. re-index: {edit * 1000:.1f} ms, {len(statements)} SQL statements; '
+          f'found by the new text: {found}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator: populate_data.py at benchmark scale.
+
+Adds producers, officials and subsidy policies, then applications spread
+over the workflow (pending to fund released, and rejected) with their
+audits, milestones, payment transactions and the ledger postings that
+back them. Rows are written with bulk inserts in chunks of applications,
+so memory stays flat at any size; the reporting summaries and the search
+index are rebuilt at the end, as `flask rebuild-summaries` and
+`flask reindex-search` would (pass --no-search-index to leave the index,
+the slowest step, for later). Every user's password is PASSWORD.
+
+Writes to DATABASE_URL (migrated first), or to --database:
+
+    python -m benchmarks.synthetic_data --applications 1000000 --milestones 5000000 --transactions 5000000
+    python -m benchmarks.synthetic_data --database sqlite:////tmp/load.db --applications 20000
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+PASSWORD = 'password123'
+CHUNK = 5000
+# Share of applications at each stage, roughly as the scheme's funnel looks
+STATUS_WEIGHTS = {'pending': 30, 'auditor_verified': 15, 'govt_approved': 15, 'fund_released': 30, 'rejected': 10}
+# Technologies with the per-MW rate of their generated policy
+TECHNOLOGIES = {'electrolysis': 3000000, 'steam_reforming': 1500000, 'biomass_gasification': 2000000,
+                'solar_thermal': 2500000}
+STATES = (('Gujarat', 22.3, 71.2), ('Rajasthan', 26.9, 72.6), ('Tamil Nadu', 11.1, 78.7), ('Odisha', 20.3, 84.8),
+          ('Maharashtra', 19.2, 74.9), ('Andhra Pradesh', 15.9, 79.7), ('Karnataka', 14.5, 76.1))
+WORDS = ('alkaline', 'PEM', 'electrolyser', 'solar', 'wind', 'hybrid', 'storage', 'ammonia', 'methanol', 'refinery',
+         'steel', 'pipeline', 'compressor', 'desalination', 'port', 'export', 'cluster', 'grid', 'captive',
+         'offtake', 'tender', 'land', 'clearance', 'commissioning', 'capacity', 'hydrogen', 'green', 'plant')
+MILESTONES = ('Land acquisition', 'Environmental clearance', 'Financial closure', 'Equipment procurement',
+              'Civil works', 'Electrolyser installation', 'Grid connection', 'Commissioning', 'Trial run',
+              'Commercial operation')
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def spread(total, parts, index):
+    """How many of `total` items the index-th of `parts` owners gets, evenly"""
+    return total * (index + 1) // parts - total * index // parts
+
+
+def next_id(model):
+    from app import db
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def create_users(rng, producers, password_hash):
+    """Bulk-insert producers and a few officials of each role; returns {role: [ids]}"""
+    from app import db
+    from app.models import User
+    first = next_id(User)
+    officials = {'government': max(2, producers // 10000), 'auditor': max(5, producers // 2000),
+                 'bank': max(2, producers // 20000)}
+    rows, ids = [], {'producer': []}
+
+    def add(role, **values):
+        user_id = first + len(rows)
+        ids.setdefault(role, []).append(user_id)
+        # Bulk inserts need the same keys in every row
+        row = dict.fromkeys(('organization', 'company_name', 'registration_number', 'contact_person',
+                             'bank_account_number', 'bank_name', 'ifsc_code'))
+        row.update(id=user_id, name=f'{role.title()} {user_id}', role=role, password_hash=password_hash,
+                   email=f'{role}{user_id}@synthetic.example.in', is_verified=True, **values)
+        rows.append(row)
+        return user_id
+
+    for role, count in officials.items():
+        for _ in range(count):
+            add(role, organization='Ministry of New & Renewable Energy' if role == 'government' else None)
+    for _ in range(producers):
+        user_id = first + len(rows)
+        add('producer', company_name=f'{rng.choice(STATES)[0]} Hydrogen {user_id} Ltd',
+            registration_number=f'U40100GJ{user_id:08d}', contact_person=f'Contact {user_id}',
+            bank_account_number=f'{30000000000 + user_id}', bank_name='State Bank of India', ifsc_code='SBIN0001234')
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(User.__table__.insert(), rows[start:start + CHUNK])
+    return ids
+
+
+def ensure_policies(government_id):
+    """One active per-MW policy for every technology that has none (through the ORM, so engines reload)"""
+    from app import db
+    from app.models import SubsidyPolicy
+    from app.policy_engine import bump_policy_version
+    existing = {policy.technology_type for policy in SubsidyPolicy.query}
+    missing = [tech for tech in TECHNOLOGIES if tech not in existing]
+    for tech in missing:
+        name = f'National Green Hydrogen Mission - {tech.replace("_", " ").title()}'
+        db.session.add(SubsidyPolicy(policy_name=name, technology_type=tech, rate_per_mw=TECHNOLOGIES[tech],
+                                     min_capacity_threshold=1, is_active=True, created_by_id=government_id))
+    if missing:
+        bump_policy_version()
+
+
+def generate_chunk(rng, first, count, statuses, ids, totals, now):
+    """Rows of every table for applications first .. first + count - 1"""
+    from app.geo import location_hash
+    rows = {name: [] for name in ('application', 'audit', 'milestone', 'transaction', 'ledger_entry',
+                                  'ledger_balance')}
+    for application_id, status in zip(range(first, first + count), statuses):
+        created = now - timedelta(days=rng.uniform(1, 1000))
+        state, latitude, longitude = rng.choice(STATES)
+        latitude, longitude = latitude + rng.gauss(0, 1.5), longitude + rng.gauss(0, 1.5)
+        tech = rng.choice(list(TECHNOLOGIES))
+        capacity = round(rng.uniform(1, 500), 1)
+        paid = []
+        application = {
+            'id': application_id, 'producer_id': rng.choice(ids['producer']),
+            'project_name': f'{state} {rng.choice(WORDS).title()} Hydrogen Plant {application_id}',
+            'project_title': sentence(rng, 5), 'project_description': ' '.join(sentence(rng, 12) for _ in range(3)),
+            'technology_type': tech, 'capacity_mw': capacity, 'capacity_tons': round(capacity * 140, 1),
+            'capacity': capacity, 'project_location': state, 'project_latitude': latitude,
+            'project_longitude': longitude, 'project_geohash': location_hash(latitude, longitude),
+            'capex_estimate': round(capacity * rng.uniform(8, 12), 1),
+            'opex_estimate': round(capacity * rng.uniform(0.3, 0.6), 1),
+            'status': status, 'verification_status': 'pending' if status == 'pending' else 'approved',
+            'documents': '[]', 'total_sanctioned_amount': None, 'govt_comments': None, 'approved_at': None,
+            'created_at': created, 'updated_at': created,
+        }
+        rows['application'].append(application)
+        if status != 'pending':
+            rows['audit'].append({
+                'application_id': application_id, 'auditor_id': rng.choice(ids['auditor']),
+                'audit_comments': sentence(rng, 20), 'comments': sentence(rng, 6),
+                'compliance_status': 'fail' if status == 'rejected' else 'pass', 'verified': status != 'rejected',
+                'created_at': created + timedelta(days=10), 'updated_at': created + timedelta(days=10)})
+        if status in ('govt_approved', 'fund_released'):
+            application['govt_comments'] = sentence(rng, 10)
+            application['approved_at'] = created + timedelta(days=30)
+
+        milestone_ids = []
+        for m in range(spread(totals['milestones'], totals['applications'], application_id - totals['first'])):
+            milestone_id = totals['next_milestone'] + len(rows['milestone'])
+            milestone_ids.append(milestone_id)
+            verified = status == 'fund_released' and rng.random() < 0.7
+            rows['milestone'].append({
+                'id': milestone_id, 'application_id': application_id, 'milestone_name': MILESTONES[m % len(MILESTONES)],
+                'milestone_date': created + timedelta(days=60 * (m + 1)),
+                'milestone_amount': round(capacity * rng.uniform(100000, 400000), 2),
+                'status': 'verified' if verified else 'pending',
+                'auditor_verification_status': 'verified' if verified else 'pending',
+                'auditor_verification_comments': sentence(rng, 12) if verified else None,
+                'payment_status': 'pending', 'payment_date': None, 'created_at': created})
+
+        if status == 'fund_released':
+            payments = spread(totals['transactions'], totals['released'], totals['released_seen'])
+            totals['released_seen'] += 1
+            for p in range(payments):
+                transaction_id = totals['next_transaction'] + len(rows['transaction'])
+                milestone_id = milestone_ids[p - 1] if 0 < p <= len(milestone_ids) else None
+                # The release first, then smaller milestone payments
+                amount = round(capacity * (rng.uniform(200000, 600000) if p == 0 else rng.uniform(20000, 90000)), 2)
+                paid_at = created + timedelta(days=40 + 15 * p)
+                paid.append((transaction_id, amount))
+                rows['transaction'].append({
+                    'id': transaction_id, 'bank_id': rng.choice(ids['bank']), 'application_id': application_id,
+                    'milestone_id': milestone_id, 'subsidy_request_id': f'SRGEN{transaction_id:012d}',
+                    'transaction_id': f'UTR{transaction_id:012d}', 'amount_disbursed': amount, 'amount': amount,
+                    'disbursement_date': paid_at, 'date': paid_at, 'disbursement_status': 'completed',
+                    'transaction_type': 'subsidy_payment' if p == 0 else 'milestone_payment',
+                    'beneficiary_account_number': f'{30000000000 + application["producer_id"]}',
+                    'beneficiary_bank_name': 'State Bank of India', 'beneficiary_ifsc_code': 'SBIN0001234',
+                    'created_at': paid_at, 'updated_at': paid_at})
+                if milestone_id is not None:
+                    milestone = rows['milestone'][milestone_id - totals['next_milestone']]
+                    milestone.update(status='verified', auditor_verification_status='verified',
+                                     payment_status='paid', payment_date=paid_at)
+            # A sanction with headroom, then each payment drawn from it, as app.ledger posts them
+            disbursed = round(sum(amount for _, amount in paid), 2)
+            sanctioned = round(disbursed * 1.25, 2) or round(capacity * TECHNOLOGIES[tech], 2)
+            application['total_sanctioned_amount'] = sanctioned
+            journal = uuid.UUID(int=rng.getrandbits(128)).hex
+            rows['ledger_entry'] += [
+                {'journal': journal, 'application_id': application_id, 'account': 'available',
+                 'debit': sanctioned, 'credit': 0, 'transaction_id': None, 'created_at': created},
+                {'journal': journal, 'application_id': application_id, 'account': 'sanctioned',
+                 'debit': 0, 'credit': sanctioned, 'transaction_id': None, 'created_at': created}]
+            for transaction_id, amount in paid:
+                journal = uuid.UUID(int=rng.getrandbits(128)).hex
+                rows['ledger_entry'] += [
+                    {'journal': journal, 'application_id': application_id, 'account': 'available', 'debit': 0,
+                     'credit': amount, 'transaction_id': transaction_id, 'created_at': created},
+                    {'journal': journal, 'application_id': application_id, 'account': 'disbursed', 'debit': amount,
+                     'credit': 0, 'transaction_id': transaction_id, 'created_at': created}]
+            rows['ledger_balance'] += [
+                {'application_id': application_id, 'account': 'sanctioned', 'balance': -sanctioned, 'updated_at': now},
+                {'application_id': application_id, 'account': 'available', 'balance': sanctioned - disbursed,
+                 'updated_at': now},
+                {'application_id': application_id, 'account': 'disbursed', 'balance': disbursed, 'updated_at': now}]
+    totals['next_milestone'] += len(rows['milestone'])
+    totals['next_transaction'] += len(rows['transaction'])
+    return rows
+
+
+def generate(app, applications, milestones=None, transactions=None, producers=None, search_index=True, seed=22,
+             progress=None):
+    """Add a synthetic portfolio to the app's database and return the row counts written"""
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import Application, Audit, LedgerBalance, LedgerEntry, Milestone, Transaction
+    from app.search import rebuild as rebuild_search_index
+    from app.summaries import rebuild as rebuild_summaries
+
+    milestones = applications * 5 if milestones is None else milestones
+    transactions = applications * 5 if transactions is None else transactions
+    producers = producers or max(1, applications // 5)
+    rng = random.Random(seed)
+    counts = {}
+    with app.app_context():
+        tables = {model.__tablename__: model.__table__
+                  for model in (Application, Audit, Milestone, Transaction, LedgerEntry, LedgerBalance)}
+        ids = create_users(rng, producers, generate_password_hash(PASSWORD))
+        counts['user'] = sum(len(users) for users in ids.values())
+        ensure_policies(ids['government'][0])
+        db.session.commit()
+
+        statuses = rng.choices(list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values()), k=applications)
+        first = next_id(Application)
+        totals = {'first': first, 'applications': applications, 'milestones': milestones,
+                  'transactions': transactions, 'released': statuses.count('fund_released') or 1, 'released_seen': 0,
+                  'next_milestone': next_id(Milestone), 'next_transaction': next_id(Transaction)}
+        now = datetime.utcnow()
+        started = time.perf_counter()
+        for start in range(0, applications, CHUNK):
+            rows = generate_chunk(rng, first + start, min(CHUNK, applications - start),
+                                  statuses[start:start + CHUNK], ids, totals, now)
+            for name, chunk in rows.items():
+                if chunk:
+                    db.session.execute(tables[name].insert(), chunk)
+                    counts[name] = counts.get(name, 0) + len(chunk)
+            db.session.commit()
+            if progress:
+                progress(start + CHUNK, applications, time.perf_counter() - started)
+
+        rebuild_summaries()
+        db.session.commit()
+        if search_index:
+            counts['search_index'] = rebuild_search_index(db.session.connection(), app.config['SEARCH_BACKEND'])
+            db.session.commit()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='Database URL (default: DATABASE_URL, else the local SQLite file).')
+    parser.add_argument('--applications', type=int, default=10000)
+    parser.add_argument('--milestones', type=int, help='Total milestones (default: 5 per application).')
+    parser.add_argument('--transactions', type=int, help='Total payments (default: 5 per application).')
+    parser.add_argument('--producers', type=int, help='Producer accounts (default: one per 5 applications).')
+    parser.add_argument('--no-search-index', action='store_true', help='Leave `flask reindex-search` for later.')
+    parser.add_argument('--seed', type=int, default=22)
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+    from app import create_app
+    from app.schema import upgrade_schema
+    app = create_app()
+    upgrade_schema(app)
+
+    def progress(done, total, elapsed):
+        done = min(done, total)
+        print(f'\r  {done}/{total} applications, {done / elapsed:,.0f}/s', end='', flush=True)
+
+    started = time.perf_counter()
+    counts = generate(app, args.applications, args.milestones, args.transactions, args.producers,
+                      search_index=not args.no_search_index, seed=args.seed, progress=progress)
+    print(f'\nGenerated in {time.perf_counter() - started:.0f} s '
+          f'({app.config["SQLALCHEMY_DATABASE_URI"]}), password {PASSWORD!r}:')
+    for name, count in counts.items():
+        print(f'  {name:<15} {count:>12,}')
+
+
+if __name__ == '__main__':
+    main()
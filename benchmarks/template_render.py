@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Template compile and fragment cache benchmark.
+
+Fills a throwaway database with benchmarks.synthetic_data, then:
+
+- cold start: builds the app as a freshly started worker would and times
+  create_app() plus the first request of the large pages (index, login,
+  signup, edit profile, government review and auditor verify), once with
+  templates compiled on first use and once precompiled at startup from a
+  bytecode directory filled by `flask precompile-templates`
+- warm: renders the government review page --requests times with the
+  fragment cache off and on (every request after the first is a hit)
+
+    python -m benchmarks.template_render --requests 500
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+from benchmarks.batch_disbursement import make_app
+
+
+def build(db_path, **settings):
+    for name, value in settings.items():
+        os.environ[name] = value
+    started = time.perf_counter()
+    app = make_app(db_path)
+    return app, time.perf_counter() - started
+
+
+def client_for(app, user_id=None):
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return client
+
+
+def pages(app):
+    """(label, user id or None, url) of the pages to time"""
+    from app.models import Application, User
+    with app.app_context():
+        first = {role: User.query.filter_by(role=role).first().id for role in ('producer', 'government', 'auditor')}
+        verified = Application.query.filter_by(status='auditor_verified').first().id
+        pending = Application.query.filter_by(status='pending').first().id
+    return [
+        ('index', None, '/'),
+        ('login', None, '/auth/login'),
+        ('signup', None, '/auth/signup'),
+        ('edit profile', first['producer'], '/edit_profile'),
+        ('government review', first['government'], f'/government/review/{verified}'),
+        ('auditor verify', first['auditor'], f'/auditor/verify/{pending}'),
+    ]
+
+
+def first_requests(app, targets):
+    timings = []
+    for label, user_id, url in targets:
+        client = client_for(app, user_id)
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append((label, time.perf_counter() - started, response.status_code))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=500, help='Review page renders per fragment cache setting.')
+    args = parser.parse_args()
+
+    from benchmarks.synthetic_data import generate
+    from app.schema import upgrade_schema
+    from app.templating import precompile_templates
+    workdir = tempfile.mkdtemp(prefix='shp-templates-')
+    bytecode_dir = os.path.join(workdir, 'bytecode')
+    try:
+        db_path = os.path.join(workdir, 'templates.db')
+        app, _ = build(db_path, TEMPLATE_PRECOMPILE='0', TEMPLATE_BYTECODE_DIR='')
+        upgrade_schema(app)
+        generate(app, args.applications, search_index=False)
+        targets = pages(app)
+
+        cold = {}
+        app, took = build(db_path, TEMPLATE_PRECOMPILE='0', TEMPLATE_BYTECODE_DIR='')
+        cold['compiled on first use'] = (took, first_requests(app, targets))
+        # The deploy step: fill the bytecode directory once
+        app, _ = build(db_path, TEMPLATE_PRECOMPILE='0', TEMPLATE_BYTECODE_DIR=bytecode_dir)
+        count, _ = precompile_templates(app)
+        app, took = build(db_path, TEMPLATE_PRECOMPILE='1', TEMPLATE_BYTECODE_DIR=bytecode_dir)
+        cold['precompiled'] = (took, first_requests(app, targets))
+
+        warm = {}
+        _, user_id, url = targets[4]
+        for backend in ('none', 'memory'):
+            app, _ = build(db_path, TEMPLATE_PRECOMPILE='1', TEMPLATE_BYTECODE_DIR=bytecode_dir, FRAGMENT_CACHE=backend)
+            client = client_for(app, user_id)
+            client.get(url)
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                client.get(url)
+            warm[backend] = (time.perf_counter() - started) / args.requests
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'Cold start ({count} templates):')
+    print(f'  {"":<24}' + ''.join(f'{label:>22}' for label in cold))
+    print(f'  {"create_app()":<24}' + ''.join(f'{took * 1000:>20.0f}ms' for took, _ in cold.values()))
+    for index, (label, _, _) in enumerate(targets):
+        row = [timings[index] for _, timings in cold.values()]
+        print(f'  {"first " + label:<24}' + ''.join(f'{took * 1000:>16.1f}ms {status}' for _, took, status in row))
+    print(f'Government review page, {args.requests} requests:')
+    for backend, took in warm.items():
+        print(f'  fragment cache {backend:<8} {took * 1000:>7.2f}ms per request')
+
+
+if __name__ == '__main__':
+    main()
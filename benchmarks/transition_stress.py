@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Fund-release stress check for the application state machine.
+
+Several threads (like concurrent bank officers) race to release funds for
+the same set of government-approved applications against a throwaway
+database. Each attempt loads the application, claims the release through
+app.workflow.transition() and records a Transaction in the same commit, as
+bank.release does. Afterwards every application must have exactly one
+Transaction; the script exits with status 1 if any has more.
+
+--legacy replays the old check-in-Python-then-write flow for comparison;
+it typically reports double releases as soon as threads contend.
+
+    python -m benchmarks.transition_stress --threads 8 --applications 200
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+
+def make_app(db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from app import create_app
+    return create_app()
+
+
+def seed(app, applications):
+    from app import db
+    from app.models import User, Application
+    from app.schema import upgrade_schema
+
+    upgrade_schema(app)
+    with app.app_context():
+        producer = User(name='Producer', email='producer@bench.local', role='producer')
+        bank = User(name='Bank', email='bank@bench.local', role='bank')
+        for user in (producer, bank):
+            user.set_password('bench')
+        db.session.add_all([producer, bank])
+        db.session.flush()
+        db.session.add_all([
+            Application(producer_id=producer.id, project_name=f'Plant {n}', project_title='Stress',
+                        status='govt_approved')
+            for n in range(applications)
+        ])
+        db.session.commit()
+        return bank.id, [a.id for a in Application.query.all()]
+
+
+def release(application_id, bank_id, legacy):
+    """One release attempt; returns True if this attempt recorded a Transaction"""
+    from app import db
+    from app.models import Application, Transaction
+    from app.workflow import transition, InvalidTransition
+
+    application = db.session.get(Application, application_id)
+    if legacy:
+        if application.status != 'govt_approved':
+            return False
+        application.status = 'fund_released'
+    else:
+        try:
+            transition(application, 'release_funds')
+        except InvalidTransition:
+            db.session.rollback()
+            return False
+    db.session.add(Transaction(bank_id=bank_id, application_id=application_id,
+                               subsidy_request_id=uuid.uuid4().hex, amount_disbursed=1000, amount=1000))
+    db.session.commit()
+    return True
+
+
+def officer(app, bank_id, application_ids, legacy, seed_value, counts):
+    from sqlalchemy.exc import OperationalError
+    from app import db
+
+    ids = list(application_ids)
+    random.Random(seed_value).shuffle(ids)
+    released = locked = 0
+    with app.app_context():
+        for application_id in ids:
+            try:
+                released += release(application_id, bank_id, legacy)
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e):
+                    raise
+                locked += 1
+            finally:
+                db.session.remove()
+    counts.append((released, locked))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--applications', type=int, default=200)
+    parser.add_argument('--legacy', action='store_true', help='use the old unconditional status write')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='shp-stress-')
+    try:
+        app = make_app(os.path.join(workdir, 'stress.db'))
+        bank_id, application_ids = seed(app, args.applications)
+
+        counts = []
+        threads = [
+            threading.Thread(target=officer, args=(app, bank_id, application_ids, args.legacy, n, counts))
+            for n in range(args.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        from sqlalchemy import func
+        from app import db
+        from app.models import Application, Transaction
+        with app.app_context():
+            per_application = dict(db.session.query(Transaction.application_id, func.count())
+                                   .group_by(Transaction.application_id).all())
+            released_status = Application.query.filter_by(status='fund_released').count()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    doubles = sum(1 for n in per_application.values() if n > 1)
+    missing = sum(1 for application_id in application_ids if application_id not in per_application)
+    print(f'{"legacy" if args.legacy else "state machine"}: {args.threads} threads x {args.applications} '
+          f'applications in {elapsed:.2f}s')
+    print(f'  releases recorded {sum(per_application.values())}, applications fund_released {released_status}')
+    print(f'  double releases {doubles}, never released {missing}, '
+          f'lock errors {sum(locked for _, locked in counts)}')
+    if doubles:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
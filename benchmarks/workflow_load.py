@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Full subsidy workflow load benchmark.
+
+Fills a throwaway database with benchmarks.synthetic_data (or uses one
+given with --database that was filled earlier), then drives complete
+workflow cycles through the Flask test client, each as the four roles
+would click through it:
+
+- producer: dashboard, apply form, apply with a clearance PDF, my applications
+- auditor: dashboard, queue, verify page, audit passed
+- government: dashboard, queue, review page, approval, reports, search
+- bank: dashboard, release page, release with an idempotency key, transactions
+
+Every cycle must end with its application in fund_released. Reports
+throughput and p50/p95/p99 latency per endpoint. --save-baseline writes
+them as JSON; --compare checks a run against such a file and exits 1 when
+an endpoint's p95 or the overall throughput is worse by more than
+--tolerance. Baselines only compare like with like: the same machine,
+data size and settings.
+
+    python -m benchmarks.workflow_load --applications 20000 --cycles 200
+    python -m benchmarks.workflow_load --save-baseline benchmarks/baselines/workflow_load.json
+    python -m benchmarks.workflow_load --compare benchmarks/baselines/workflow_load.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+
+from benchmarks.batch_disbursement import make_app
+
+# Differences below this are timer noise, whatever the percentage
+NOISE_MS = 2.0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Workload:
+    """Workflow cycles against one app, recording each request's latency by endpoint"""
+
+    def __init__(self, app, users):
+        self.app = app
+        self.users = users
+        self.latencies = {}
+        self.failures = []
+        self.lock = threading.Lock()
+
+    def client(self, user_id):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+    def call(self, client, label, method, url, expect, record, **kwargs):
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        took = time.perf_counter() - started
+        if record:
+            with self.lock:
+                self.latencies.setdefault(label, []).append(took)
+        if response.status_code != expect:
+            with self.lock:
+                self.failures.append(f'{method} {url}: HTTP {response.status_code}, expected {expect}')
+        return response
+
+    def cycle(self, n, rng, record=True):
+        from app import db
+        from app.models import Application
+        from app.policy_engine import get_policy_engine
+        producer_id = rng.choice(self.users['producer'])
+        producer, auditor, government, bank = (
+            self.client(producer_id), self.client(rng.choice(self.users['auditor'])),
+            self.client(rng.choice(self.users['government'])), self.client(rng.choice(self.users['bank'])))
+
+        def call(client, label, method, url, expect=200, **kwargs):
+            return self.call(client, label, method, url, expect, record, **kwargs)
+
+        call(producer, 'GET /dashboard (producer)', 'GET', '/dashboard')
+        call(producer, 'GET /producer/apply', 'GET', '/producer/apply')
+        application_form = {
+            'company_name': f'Hydrogen Co {producer_id}', 'registration_number': f'U40100GJ{producer_id:08d}',
+            'contact_person': 'Load Test', 'contact_email': 'load@synthetic.example.in', 'contact_phone': '9876543210',
+            'bank_account_number': f'{30000000000 + producer_id}', 'bank_name': 'State Bank of India',
+            'ifsc_code': 'SBIN0001234', 'project_name': f'Load cycle {n} plant', 'project_title': 'Green ammonia',
+            'project_description': 'Alkaline electrolyser cluster with captive solar and a desalination plant.',
+            'technology_type': 'electrolysis', 'capacity_mw': '50', 'capacity_tons': '7000',
+            'project_location': 'Kandla, Gujarat', 'project_latitude': '23.03', 'project_longitude': '70.22',
+            'capex_estimate': '450', 'opex_estimate': '20', 'expected_completion_date': '2028-03-31',
+            'land_acquisition_status': 'Acquired', 'power_supply_arrangement': 'Captive solar',
+            'water_source': 'Seawater desalination', 'environmental_clearance': 'y', 'capacity': '50',
+            # A new 32 KB document each time, so the upload is really stored
+            'environmental_clearance_file': (io.BytesIO(b'%PDF-1.4\n' + uuid.uuid4().bytes * 2048), 'clearance.pdf'),
+        }
+        call(producer, 'POST /producer/apply', 'POST', '/producer/apply', 302, data=application_form,
+             content_type='multipart/form-data')
+        call(producer, 'GET /producer/my_applications', 'GET', '/producer/my_applications')
+        with self.app.app_context():
+            application_id = (db.session.query(db.func.max(Application.id))
+                              .filter(Application.producer_id == producer_id).scalar())
+
+        call(auditor, 'GET /dashboard (auditor)', 'GET', '/dashboard')
+        call(auditor, 'GET /auditor/applications', 'GET', '/auditor/applications')
+        call(auditor, 'GET /auditor/verify/<id>', 'GET', f'/auditor/verify/{application_id}')
+        call(auditor, 'POST /auditor/verify/<id>', 'POST', f'/auditor/verify/{application_id}', 302, data={
+            'technical_compliance': 'compliant', 'financial_compliance': 'compliant',
+            'environmental_compliance': 'compliant', 'overall_compliance_score': '88', 'compliance_status': 'compliant',
+            'audit_comments': 'Site inspected; electrolyser stack and safety systems as specified.', 'verified': 'y',
+        })
+
+        call(government, 'GET /dashboard (government)', 'GET', '/dashboard')
+        call(government, 'GET /government/applications', 'GET', '/government/applications')
+        call(government, 'GET /government/review/<id>', 'GET', f'/government/review/{application_id}')
+        call(government, 'POST /government/review/<id>', 'POST', f'/government/review/{application_id}', 302, data={
+            'approved': 'y', 'approval_reference_number': f'MNRE/GH/{n}', 'subsidy_amount_approved': '150000000',
+            'govt_comments': 'Approved under the National Green Hydrogen Mission.',
+        })
+        call(government, 'GET /government/reports', 'GET', '/government/reports')
+        call(government, 'GET /search', 'GET', '/search?q=electrolyser+solar')
+
+        with self.app.app_context():
+            amount = get_policy_engine().quote(db.session.get(Application, application_id)).amount
+        call(bank, 'GET /dashboard (bank)', 'GET', '/dashboard')
+        call(bank, 'GET /bank/release/<id>', 'GET', f'/bank/release/{application_id}')
+        call(bank, 'POST /bank/release/<id>', 'POST', f'/bank/release/{application_id}', 302, data={
+            'transaction_amount': f'{amount:.2f}', 'transaction_type': 'subsidy_payment',
+            'transaction_reference': f'UTR{uuid.uuid4().hex[:16].upper()}',
+            'beneficiary_account_number': f'{30000000000 + producer_id}',
+            'beneficiary_bank_name': 'State Bank of India', 'beneficiary_ifsc_code': 'SBIN0001234',
+            'idempotency_key': uuid.uuid4().hex,
+        })
+        call(bank, 'GET /bank/transactions', 'GET', '/bank/transactions')
+
+        with self.app.app_context():
+            status = db.session.get(Application, application_id).status
+        if status != 'fund_released':
+            with self.lock:
+                self.failures.append(f'cycle {n}: application {application_id} ended as {status}')
+
+    def run(self, cycles, threads, warmup, seed):
+        for n in range(warmup):
+            self.cycle(-1 - n, random.Random(seed - 1 - n), record=False)
+
+        def worker(index):
+            rng = random.Random(seed + index)
+            for n in range(index, cycles, threads):
+                self.cycle(n, rng)
+
+        pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return time.perf_counter() - started
+
+
+def load_users(app):
+    from app.models import User
+    with app.app_context():
+        users = {}
+        for user_id, role in User.query.with_entities(User.id, User.role):
+            users.setdefault(role, []).append(user_id)
+    missing = {'producer', 'auditor', 'government', 'bank'} - set(users)
+    if missing:
+        raise SystemExit(f'No {", ".join(sorted(missing))} users; fill the database with benchmarks.synthetic_data')
+    return users
+
+
+def results(args, latencies, elapsed, failures):
+    requests = sum(len(values) for values in latencies.values())
+    return {
+        'benchmark': 'workflow_load',
+        'created': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'settings': {'applications': args.applications, 'cycles': args.cycles, 'threads': args.threads,
+                     'database': 'given' if args.database else 'sqlite (generated)'},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'throughput': {'cycles_per_s': round(args.cycles / elapsed, 2), 'requests_per_s': round(requests / elapsed, 1),
+                       'failures': len(failures)},
+        'endpoints': {label: {'count': len(values),
+                              'p50_ms': round(percentile(values, 0.5) * 1000, 2),
+                              'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                              'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+                              'max_ms': round(max(values) * 1000, 2)}
+                      for label, values in latencies.items()},
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print the run against a baseline; returns the regressions found"""
+    regressions = []
+    print(f'\nAgainst the baseline of {baseline["created"]} ({baseline["settings"]}), tolerance {tolerance:.0%}:')
+    print(f'  {"endpoint":<34} {"p95 then":>9} {"p95 now":>9} {"change":>8}')
+    for label, now in current['endpoints'].items():
+        then = baseline['endpoints'].get(label)
+        if then is None:
+            print(f'  {label:<34} {"-":>9} {now["p95_ms"]:>7.1f}ms      new')
+            continue
+        change = now['p95_ms'] / then['p95_ms'] - 1 if then['p95_ms'] else 0
+        worse = change > tolerance and now['p95_ms'] - then['p95_ms'] > NOISE_MS
+        print(f'  {label:<34} {then["p95_ms"]:>7.1f}ms {now["p95_ms"]:>7.1f}ms {change:>+7.0%}'
+              + ('  REGRESSION' if worse else ''))
+        if worse:
+            regressions.append(label)
+    then, now = baseline['throughput']['cycles_per_s'], current['throughput']['cycles_per_s']
+    change = now / then - 1
+    print(f'  {"cycles/s":<34} {then:>9.2f} {now:>9.2f} {change:>+7.0%}')
+    if change < -tolerance:
+        regressions.append('cycles/s')
+    if baseline['settings'] != current['settings']:
+        print('  (settings differ from the baseline; the comparison is only indicative)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='Use this already filled database instead of generating one.')
+    parser.add_argument('--applications', type=int, default=20000, help='Applications to generate.')
+    parser.add_argument('--cycles', type=int, default=200, help='Workflow cycles to measure.')
+    parser.add_argument('--threads', type=int, default=1, help='Cycles run concurrently.')
+    parser.add_argument('--warmup', type=int, default=3, help='Unmeasured cycles first.')
+    parser.add_argument('--seed', type=int, default=22)
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='shp-workflow-')
+    try:
+        if args.database:
+            os.environ['DATABASE_URL'] = args.database
+            from app import create_app
+            app = create_app()
+        else:
+            from benchmarks.synthetic_data import generate
+            from app.schema import upgrade_schema
+            app = make_app(os.path.join(workdir, 'workflow.db'))
+            upgrade_schema(app)
+            started = time.perf_counter()
+            generate(app, args.applications, seed=args.seed)
+            print(f'{args.applications} applications generated in {time.perf_counter() - started:.0f} s')
+
+        from app.storage import LocalStorage
+        # Forms are posted without their CSRF token, and uploads stay out of the static folder
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.extensions['storage'] = LocalStorage(workdir)
+        workload = Workload(app, load_users(app))
+        elapsed = workload.run(args.cycles, args.threads, args.warmup, args.seed)
+        with app.app_context():
+            from app import db
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    current = results(args, workload.latencies, elapsed, workload.failures)
+    print(f'{args.cycles} workflow cycles on {args.threads} thread(s) in {elapsed:.1f} s: '
+          f'{current["throughput"]["cycles_per_s"]} cycles/s, {current["throughput"]["requests_per_s"]} requests/s')
+    print(f'  {"endpoint":<34} {"count":>6} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9}')
+    for label, row in current['endpoints'].items():
+        print(f'  {label:<34} {row["count"]:>6} {row["p50_ms"]:>7.1f}ms {row["p95_ms"]:>7.1f}ms '
+              f'{row["p99_ms"]:>7.1f}ms {row["max_ms"]:>7.1f}ms')
+    for failure in workload.failures[:10]:
+        print(f'  FAILED {failure}')
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as baseline:
+            json.dump(current, baseline, indent=2)
+            baseline.write('\n')
+        print(f'Baseline written to {args.save_baseline}')
+    regressions = []
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(current, json.load(baseline), args.tolerance)
+    if workload.failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
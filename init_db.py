@@ -5,14 +5,15 @@ Creates sample users for testing each role
 """
 
 from app import create_app, db
+from app.schema import upgrade_schema
 from app.models import User, Application, Audit, Transaction
 
 def init_database():
     app = create_app()
     
     with app.app_context():
-        # Create all tables
-        db.create_all()
+        # Bring the schema up to the latest migration
+        upgrade_schema(app)
         
         # Check if users already exist
         if User.query.first():
@@ -0,0 +1,30 @@
+"""backfill capacity_mw from legacy capacity
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:31:17.846203
+
+"""
+from alembic import op
+
+from app.schema import backfill
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Applications created before the comprehensive form only have the legacy
+    # capacity (MW) column; copy it across in small committed batches.
+    with op.get_context().autocommit_block():
+        backfill(op.get_bind(), 'application', 'capacity_mw = capacity',
+                 where='capacity_mw IS NULL AND capacity > 0')
+
+
+def downgrade():
+    # The copied values are indistinguishable from user input; nothing to undo
+    pass
@@ -0,0 +1,33 @@
+"""full text search index
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 11:03:27.164950
+
+"""
+from alembic import op
+
+from app.search import TABLE, backend_for, create_index, rebuild
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # search_index is an FTS5 virtual table on SQLite, so it is created by
+    # hand and hidden from autogenerate (app.schema.include_name)
+    connection = op.get_bind()
+    backend = backend_for(connection.dialect.name)
+    create_index(connection, backend)
+    # Filled outside the migration's transaction, committing each batch of
+    # documents, so writers from the running app never wait for the whole table
+    with op.get_context().autocommit_block():
+        rebuild(op.get_bind(), backend)
+
+
+def downgrade():
+    op.drop_table(TABLE)
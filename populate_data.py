@@ -2,9 +2,10 @@
 """
 Sample data population script for SmartHydroPay
 Run this script to add realistic test data to your database
+(for benchmark-scale data see `python -m benchmarks.synthetic_data`)
 """
 
-from app import create_app, db
+from app import create_app, db, ledger
 from app.models import User, Application, Audit, Transaction
 from datetime import datetime, timedelta
 import random
@@ -361,6 +362,11 @@ def create_sample_transactions(applications, users):
     """Create sample transactions for fund releases"""
     banks = [u for u in users if u.role == 'bank']
     
+    # Approved applications have their subsidy (₹100,000 per MW) sanctioned in the ledger
+    for app in applications:
+        if app.status in ['govt_approved', 'fund_released']:
+            ledger.sanction(app, app.capacity * 100000)
+    
     # Create transactions for applications with 'fund_released' status
     released_apps = [app for app in applications if app.status == 'fund_released']
     
@@ -381,6 +387,8 @@ def create_sample_transactions(applications, users):
             date=transaction_date
         )
         db.session.add(transaction)
+        db.session.flush()
+        ledger.disburse(app.id, subsidy_amount, transaction)
         created_transactions.append(transaction)
     
     db.session.commit()
@@ -3,8 +3,10 @@ from flask_login import login_required, current_user
 from app import db
 from app.models import Application, Audit, Milestone
 from app.forms import AuditForm
-import os
-from werkzeug.utils import secure_filename
+from app.queries import load, paginate
+from app.storage import save_upload
+from app.audit_trail import record_event
+from app.workflow import transition, InvalidTransition
 from datetime import datetime
 
 auditor = Blueprint('auditor', __name__)
@@ -18,8 +20,10 @@ def require_auditor():
 @auditor.route('/applications')
 def applications():
     # Show applications pending audit and completed audits
-    pending_audits = Application.query.filter_by(status='pending').all()
-    completed_audits = Audit.query.filter_by(auditor_id=current_user.id).all()
+    pending_audits = paginate(load(Application, 'producer').filter_by(status='pending'),
+                              Application, name='pending')
+    completed_audits = paginate(load(Audit, 'application.producer').filter_by(auditor_id=current_user.id),
+                                Audit, name='completed')
     
     return render_template('auditor_applications.html', 
                          pending_audits=pending_audits,
@@ -42,12 +46,7 @@ def verify(application_id):
         # Handle audit report file upload
         audit_report_path = None
         if form.audit_report_file.data:
-            file = form.audit_report_file.data
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join('static', 'uploads', 'audit_reports', filename)
-            os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-            file.save(upload_path)
-            audit_report_path = f'uploads/audit_reports/{filename}'
+            audit_report_path = save_upload(form.audit_report_file.data, 'audit_reports')
         
         if existing_audit:
             # Update existing audit
@@ -62,6 +61,7 @@ def verify(application_id):
             if audit_report_path:
                 existing_audit.audit_report_path = audit_report_path
             existing_audit.audit_date = datetime.utcnow()
+            audit = existing_audit
         else:
             # Create new comprehensive audit
             audit = Audit(
@@ -84,12 +84,22 @@ def verify(application_id):
         
         # Update application status based on audit outcome
         if form.verified.data and form.compliance_status.data == 'compliant':
-            application.status = 'auditor_verified'
+            outcome = 'audit_pass'
         elif form.compliance_status.data == 'non_compliant':
-            application.status = 'rejected'
+            outcome = 'audit_fail'
         else:
-            application.status = 'requires_revision'
+            outcome = 'request_revision'
+        try:
+            transition(application, outcome)
+        except InvalidTransition as e:
+            db.session.rollback()
+            flash(str(e), 'warning')
+            return redirect(url_for('auditor.applications'))
         
+        audit.add_audit_log('audit_completed', current_user.id, {
+            'compliance_status': form.compliance_status.data,
+            'application_status': application.status,
+        })
         db.session.commit()
         flash('Comprehensive audit completed successfully!', 'success')
         return redirect(url_for('auditor.applications'))
@@ -128,6 +138,10 @@ def verify_milestone(milestone_id):
         milestone.auditor_verification_comments = verification_comments
         flash('Milestone verification rejected.', 'warning')
     
+    if verification_status in ('verified', 'rejected'):
+        record_event(f'milestone_{verification_status}', current_user.id,
+                     application_id=milestone.application_id,
+                     details={'milestone_id': milestone.id, 'comments': verification_comments})
     db.session.commit()
     return redirect(url_for('auditor.verify', application_id=milestone.application_id))
 
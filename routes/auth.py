@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_mail import Message
-from app import db, mail
+from app import db
+from app.outbox import queue_email
 from app.models import User
 from app.forms import LoginForm, SignupForm, OTPVerificationForm
 import secrets
@@ -9,22 +9,19 @@ from datetime import datetime, timedelta
 
 auth = Blueprint('auth', __name__)
 
-def send_otp_email(email, otp):
-    """Send OTP via email"""
-    try:
-        msg = Message(
-            'SmartHydroPay - Your OTP Code',
-            sender='aivisionaries.teams@gmail.com',
-            recipients=[email]
-        )
-        msg.body = f'''
+def queue_otp_email(email, otp):
+    """Queue the OTP email in the outbox; it is delivered after the commit"""
+    queue_email(
+        email,
+        'SmartHydroPay - Your OTP Code',
+        body=f'''
         Your OTP code for SmartHydroPay is: {otp}
         
         This code will expire in 5 minutes.
         
         If you didn't request this code, please ignore this email.
-        '''
-        msg.html = f'''
+        ''',
+        html=f'''
         <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
             <h2 style="color: #10b981;">SmartHydroPay - OTP Verification</h2>
             <p>Your verification code is:</p>
@@ -35,11 +32,7 @@ def send_otp_email(email, otp):
             <p style="color: #6b7280; font-size: 14px;">If you didn't request this code, please ignore this email.</p>
         </div>
         '''
-        mail.send(msg)
-        return True
-    except Exception as e:
-        print(f"Email send error: {e}")
-        return False
+    )
 
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
@@ -54,15 +47,12 @@ def login():
             otp = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
             user.otp_code = otp
             user.otp_expires = datetime.utcnow() + timedelta(minutes=5)
+            queue_otp_email(user.email, otp)
             db.session.commit()
             
-            # Send OTP email
-            if send_otp_email(user.email, otp):
-                session['temp_user_id'] = user.id
-                flash('OTP sent to your email. Please verify to continue.', 'info')
-                return redirect(url_for('auth.verify_otp'))
-            else:
-                flash('Failed to send OTP. Please try again.', 'danger')
+            session['temp_user_id'] = user.id
+            flash('OTP sent to your email. Please verify to continue.', 'info')
+            return redirect(url_for('auth.verify_otp'))
         else:
             flash('Invalid email or password.', 'danger')
     
@@ -123,18 +113,12 @@ def signup():
         )
         user.set_password(form.password.data)
         db.session.add(user)
+        queue_otp_email(user.email, otp)
         db.session.commit()
         
-        # Send OTP email
-        if send_otp_email(user.email, otp):
-            session['temp_user_id'] = user.id
-            flash('Account created! OTP sent to your email for verification.', 'success')
-            return redirect(url_for('auth.verify_otp'))
-        else:
-            # Delete user if email failed
-            db.session.delete(user)
-            db.session.commit()
-            flash('Failed to send verification email. Please try again.', 'danger')
+        session['temp_user_id'] = user.id
+        flash('Account created! OTP sent to your email for verification.', 'success')
+        return redirect(url_for('auth.verify_otp'))
     
     return render_template('signup.html', form=form)
 
@@ -1,11 +1,23 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, abort, request
+from flask import Blueprint, render_template, redirect, url_for, flash, abort, request, Response, stream_with_context
 from flask_login import login_required, current_user
 from app import db
-from app.models import Application, Transaction, Milestone, SubsidyPolicy
-from app.forms import TransactionForm
-import os
-from werkzeug.utils import secure_filename
+from app.models import Application, Transaction, Milestone, DisbursementBatch, BankStatement, StatementLine
+from app.forms import TransactionForm, DisbursementBatchForm, StatementUploadForm, RematchForm
+from app.queries import load, paginate, count, status_counts
+from app.storage import save_upload
+from app.audit_trail import record_event
+from app.policy_engine import get_policy_engine
+from app.workflow import transition, InvalidTransition, can_transition
+from app.idempotency import idempotent, new_key, FIELD as IDEMPOTENCY_FIELD
+from app import ledger
+from app.disbursement import run_batch, payable_ids, payment_file, BatchConflict, FORMATS
+from app.reconciliation import import_statement, rematch, report_rows, StatementFormatError, REPORT_HEADER
+from app.csv_export import stream_csv
+from app.summaries import bank_totals
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
+import json
 
 bank = Blueprint('bank', __name__)
 
@@ -18,133 +30,175 @@ def require_bank():
 @bank.route('/transactions')
 def transactions():
     # Show different categories of transactions and applications
-    all_transactions = Transaction.query.filter_by(bank_id=current_user.id).order_by(Transaction.transaction_date.desc()).all()
-    pending_releases = Application.query.filter_by(status='govt_approved').all()
-    milestone_requests = Milestone.query.join(Application).filter(
+    all_transactions = paginate(load(Transaction, 'application.producer').filter_by(bank_id=current_user.id),
+                                Transaction, name='transactions')
+    pending_releases = paginate(load(Application, 'producer').filter_by(status='govt_approved'),
+                                Application, name='releases')
+    milestone_requests = paginate(load(Milestone, 'application.producer').join(Application).filter(
         Milestone.status == 'completed',
         Milestone.auditor_verification_status == 'verified',
         Milestone.payment_status == 'pending'
-    ).all()
+    ), Milestone, name='milestones')
     
     return render_template('transactions.html', 
                          transactions=all_transactions, 
                          pending_releases=pending_releases,
-                         milestone_requests=milestone_requests)
+                         milestone_requests=milestone_requests,
+                         idempotency_key=new_key())
 
 @bank.route('/release/<int:application_id>', methods=['GET', 'POST'])
+@idempotent
 def release(application_id):
     application = Application.query.get_or_404(application_id)
     milestones = Milestone.query.filter_by(application_id=application_id).all()
     
-    if application.status != 'govt_approved':
+    if not can_transition(application, 'release_funds'):
         flash('Funds can only be released for government approved applications.', 'warning')
         return redirect(url_for('bank.transactions'))
     
     form = TransactionForm()
     
-    # Calculate subsidy amounts based on policy
-    policy = SubsidyPolicy.query.filter_by(technology_type=application.technology_type).first()
-    recommended_amount = 0
-    
-    if policy:
-        if policy.rate_per_ton and application.capacity_tons:
-            recommended_amount += policy.rate_per_ton * application.capacity_tons
-        if policy.rate_per_mw and application.capacity_mw:
-            recommended_amount += policy.rate_per_mw * application.capacity_mw
-        if policy.rate_percentage_capex and application.capex_estimate:
-            recommended_amount += (policy.rate_percentage_capex / 100) * application.capex_estimate * 1000000  # Convert crores to rupees
+    # Price from the compiled policy table (no policy queries per request)
+    quote = get_policy_engine().quote(application)
+    policy = quote.policy if quote else None
+    recommended_amount = quote.amount if quote else 0
     
     if form.validate_on_submit():
         # Handle transaction document upload
         transaction_doc = None
         if form.transaction_document.data:
-            file = form.transaction_document.data
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join('static', 'uploads', 'transactions', filename)
-            os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-            file.save(upload_path)
-            transaction_doc = f'uploads/transactions/{filename}'
+            transaction_doc = save_upload(form.transaction_document.data, 'transactions')
         
+        amount = form.transaction_amount.data
         transaction = Transaction(
             bank_id=current_user.id,
             application_id=application_id,
-            transaction_amount=form.transaction_amount.data,
+            transaction_id=form.transaction_reference.data,
+            amount_disbursed=amount,
+            disbursement_date=datetime.utcnow(),
+            payment_confirmation_path=transaction_doc,
             transaction_type=form.transaction_type.data,
-            transaction_reference=form.transaction_reference.data,
             beneficiary_account_number=form.beneficiary_account_number.data,
             beneficiary_bank_name=form.beneficiary_bank_name.data,
             beneficiary_ifsc_code=form.beneficiary_ifsc_code.data,
-            transaction_comments=form.transaction_comments.data,
-            transaction_document_path=transaction_doc,
-            transaction_date=datetime.utcnow(),
             disbursement_status='completed',
             # Legacy fields for backward compatibility
-            amount=form.transaction_amount.data,
+            amount=amount,
             comments=form.transaction_comments.data
         )
+        transaction.generate_request_id()
         
-        # Update application status
-        application.status = 'fund_released'
-        application.disbursement_amount = form.transaction_amount.data
+        # Claim the release; a concurrent release of the same application fails here.
+        # The payment is then drawn from the sanction posted when it was approved.
+        try:
+            transition(application, 'release_funds')
+            db.session.add(transaction)
+            db.session.flush()
+            ledger.disburse(application_id, amount, transaction)
+        except InvalidTransition:
+            db.session.rollback()
+            flash('Funds for this application have already been released.', 'warning')
+            return redirect(url_for('bank.transactions'))
+        except ledger.OverDisbursement as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('bank.release', application_id=application_id))
+        application.disbursement_amount = amount
         application.disbursement_date = datetime.utcnow()
         
-        db.session.add(transaction)
+        record_event('funds_released', current_user.id, application_id=application_id,
+                     details={'amount': amount, 'subsidy_request_id': transaction.subsidy_request_id})
         db.session.commit()
         
-        flash(f'Funds of ₹{form.transaction_amount.data:,.2f} released for "{application.project_name}"!', 'success')
+        flash(f'Funds of ₹{amount:,.2f} released for "{application.project_name}"!', 'success')
         return redirect(url_for('bank.transactions'))
-    
-    return render_template('release_funds.html', 
+
+    if request.method == 'GET':
+        # Start from the quoted amount and the payee details the producer registered
+        producer = application.producer
+        form.transaction_amount.data = recommended_amount or None
+        form.beneficiary_account_number.data = producer.bank_account_number
+        form.beneficiary_bank_name.data = producer.bank_name
+        form.beneficiary_ifsc_code.data = producer.ifsc_code
+
+    return render_template('release_funds.html',
                          form=form, 
                          application=application, 
                          milestones=milestones,
                          recommended_amount=recommended_amount,
-                         policy=policy)
+                         available_amount=ledger.available(application_id),
+                         quote=quote,
+                         policy=policy,
+                         idempotency_key=request.form.get(IDEMPOTENCY_FIELD) or new_key())
 
 @bank.route('/milestone/<int:milestone_id>/pay', methods=['POST'])
+@idempotent
 def pay_milestone(milestone_id):
     milestone = Milestone.query.get_or_404(milestone_id)
     
+    if milestone.status != 'completed':
+        flash('Milestone must be completed before payment.', 'warning')
+        return redirect(url_for('bank.transactions'))
     if milestone.auditor_verification_status != 'verified':
         flash('Milestone must be auditor verified before payment.', 'warning')
         return redirect(url_for('bank.transactions'))
+    if not milestone.milestone_amount:
+        flash('Milestone has no amount to pay.', 'warning')
+        return redirect(url_for('bank.transactions'))
     
     # Handle milestone payment document upload
     payment_doc = None
     if 'payment_document' in request.files:
         file = request.files['payment_document']
         if file and file.filename:
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join('static', 'uploads', 'milestone_payments', filename)
-            os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-            file.save(upload_path)
-            payment_doc = f'uploads/milestone_payments/{filename}'
+            payment_doc = save_upload(file, 'milestone_payments')
     
-    # Create milestone payment transaction
+    producer = milestone.application.producer
+    comments = f'Milestone payment for: {milestone.milestone_name}'
     transaction = Transaction(
         bank_id=current_user.id,
         application_id=milestone.application_id,
         milestone_id=milestone_id,
-        transaction_amount=milestone.milestone_amount,
+        transaction_id=request.form.get('transaction_reference'),
+        amount_disbursed=milestone.milestone_amount,
+        disbursement_date=datetime.utcnow(),
+        payment_confirmation_path=payment_doc,
         transaction_type='milestone_payment',
-        transaction_reference=request.form.get('transaction_reference'),
-        beneficiary_account_number=milestone.application.producer.bank_account_number,
-        beneficiary_bank_name=milestone.application.producer.bank_name,
-        beneficiary_ifsc_code=milestone.application.producer.ifsc_code,
-        transaction_comments=f'Milestone payment for: {milestone.milestone_name}',
-        transaction_document_path=payment_doc,
-        transaction_date=datetime.utcnow(),
+        beneficiary_account_number=producer.bank_account_number,
+        beneficiary_bank_name=producer.bank_name,
+        beneficiary_ifsc_code=producer.ifsc_code,
         disbursement_status='completed',
         # Legacy fields
         amount=milestone.milestone_amount,
-        comments=f'Milestone payment for: {milestone.milestone_name}'
+        comments=comments
     )
+    transaction.generate_request_id()
     
-    # Update milestone payment status
-    milestone.payment_status = 'paid'
-    milestone.payment_date = datetime.utcnow()
+    # Mark the milestone paid only if it still is unpaid, so it is never paid twice
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(Milestone)
+        .where(Milestone.id == milestone_id, Milestone.payment_status == 'pending')
+        .values(payment_status='paid', payment_date=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if claimed != 1:
+        db.session.rollback()
+        flash('This milestone has already been paid.', 'warning')
+        return redirect(url_for('bank.transactions'))
     
     db.session.add(transaction)
+    db.session.flush()
+    try:
+        ledger.disburse(milestone.application_id, milestone.milestone_amount, transaction)
+    except ledger.OverDisbursement as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+        return redirect(url_for('bank.transactions'))
+    
+    record_event('milestone_paid', current_user.id, application_id=milestone.application_id,
+                 details={'milestone_id': milestone.id, 'amount': milestone.milestone_amount,
+                          'subsidy_request_id': transaction.subsidy_request_id})
     db.session.commit()
     
     flash(f'Milestone payment of ₹{milestone.milestone_amount:,.2f} processed successfully!', 'success')
@@ -152,8 +206,68 @@ def pay_milestone(milestone_id):
 
 @bank.route('/pending')
 def pending_releases():
-    applications = Application.query.filter_by(status='govt_approved').all()
-    return render_template('pending_releases.html', applications=applications)
+    applications = paginate(load(Application, 'producer').filter_by(status='govt_approved'), Application)
+    return render_template('pending_releases.html', applications=applications,
+                           pending_count=count(Application.query.filter_by(status='govt_approved')),
+                           form=DisbursementBatchForm(), idempotency_key=new_key())
+
+@bank.route('/batch', methods=['POST'])
+@idempotent
+def create_batch():
+    form = DisbursementBatchForm()
+    if not form.validate_on_submit():
+        flash('The batch form has expired; please try again.', 'warning')
+        return redirect(url_for('bank.pending_releases'))
+    if form.include_all.data:
+        application_ids, milestone_ids = payable_ids()
+    else:
+        application_ids = request.form.getlist('application_ids', type=int)
+        milestone_ids = request.form.getlist('milestone_ids', type=int)
+    if not application_ids and not milestone_ids:
+        flash('Select at least one release or milestone to pay.', 'warning')
+        return redirect(url_for('bank.pending_releases'))
+    
+    try:
+        batch, skipped = run_batch(current_user.id, application_ids, milestone_ids)
+    except (InvalidTransition, ledger.OverDisbursement, BatchConflict) as e:
+        db.session.rollback()
+        flash(f'{e} The batch was not created; please try again.', 'warning')
+        return redirect(url_for('bank.pending_releases'))
+    if batch is None:
+        db.session.rollback()
+        flash(f'Nothing in the selection could be paid ({len(skipped)} items skipped).', 'warning')
+        return redirect(url_for('bank.pending_releases'))
+    db.session.commit()
+    
+    flash(f'Batch {batch.reference}: {batch.item_count} payments totalling ₹{batch.total_amount:,.2f}'
+          + (f', {len(skipped)} skipped' if skipped else '') + '.', 'success')
+    return redirect(url_for('bank.batch_detail', batch_id=batch.id))
+
+@bank.route('/batches')
+def batches():
+    runs = paginate(DisbursementBatch.query.filter_by(bank_id=current_user.id), DisbursementBatch)
+    return render_template('disbursement_batches.html', batches=runs)
+
+@bank.route('/batch/<int:batch_id>')
+def batch_detail(batch_id):
+    batch = DisbursementBatch.query.get_or_404(batch_id)
+    if batch.bank_id != current_user.id:
+        abort(403)
+    transactions = paginate(load(Transaction, 'application.producer').filter_by(batch_id=batch.id), Transaction)
+    return render_template('disbursement_batch.html', batch=batch, transactions=transactions,
+                           skipped=json.loads(batch.skipped) if batch.skipped else [])
+
+@bank.route('/batch/<int:batch_id>/payment-file')
+def batch_payment_file(batch_id):
+    batch = DisbursementBatch.query.get_or_404(batch_id)
+    if batch.bank_id != current_user.id:
+        abort(403)
+    fmt = request.args.get('format', 'neft')
+    if fmt not in FORMATS:
+        abort(404)
+    # Streamed in chunks straight from the database; never held in memory
+    return Response(stream_with_context(payment_file(batch, fmt)), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={batch.reference}-{fmt}.csv'})
 
 @bank.route('/transaction/<int:transaction_id>/view')
 def view_transaction(transaction_id):
@@ -168,12 +282,68 @@ def view_transaction(transaction_id):
 @bank.route('/reconciliation')
 def reconciliation():
     # Show transaction reconciliation and reports
-    total_disbursed = db.session.query(db.func.sum(Transaction.transaction_amount)).filter_by(bank_id=current_user.id).scalar() or 0
-    transaction_count = Transaction.query.filter_by(bank_id=current_user.id).count()
+    total_disbursed, transaction_count = bank_totals(current_user.id)
+    
+    recent_transactions = paginate(load(Transaction, 'application.producer').filter_by(bank_id=current_user.id),
+                                   Transaction, per_page=10)
     
-    recent_transactions = Transaction.query.filter_by(bank_id=current_user.id).order_by(Transaction.transaction_date.desc()).limit(10).all()
+    # Statement lines that need a look, and the state of every line imported so far
+    problem_lines = paginate(load(StatementLine, 'transaction').filter(
+        StatementLine.bank_id == current_user.id, StatementLine.status.in_(('mismatched', 'unmatched'))
+    ), StatementLine, name='lines')
+    line_counts = status_counts(StatementLine.query.filter_by(bank_id=current_user.id), StatementLine)
+    statements = BankStatement.query.filter_by(bank_id=current_user.id).order_by(BankStatement.created_at.desc()).limit(5).all()
     
     return render_template('bank_reconciliation.html',
                          total_disbursed=total_disbursed,
                          transaction_count=transaction_count,
-                         recent_transactions=recent_transactions)
+                         recent_transactions=recent_transactions,
+                         problem_lines=problem_lines,
+                         line_counts=line_counts,
+                         statements=statements,
+                         form=StatementUploadForm(),
+                         rematch_form=RematchForm())
+
+@bank.route('/reconciliation/statements', methods=['POST'])
+def upload_statement():
+    form = StatementUploadForm()
+    if not form.validate_on_submit():
+        for errors in form.errors.values():
+            flash(errors[0], 'warning')
+        return redirect(url_for('bank.reconciliation'))
+    
+    upload = form.statement.data
+    try:
+        statement, imported = import_statement(current_user.id, upload.stream, upload.filename)
+        if imported:
+            db.session.commit()
+    except StatementFormatError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+        return redirect(url_for('bank.reconciliation'))
+    except IntegrityError:
+        # A concurrent upload of the same file got in first
+        db.session.rollback()
+        flash('This statement is already being imported.', 'info')
+        return redirect(url_for('bank.reconciliation'))
+    if not imported:
+        flash(f'This statement was already imported on {statement.created_at:%Y-%m-%d %H:%M}.', 'info')
+        return redirect(url_for('bank.reconciliation'))
+    
+    flash(f'Statement imported: {statement.line_count} new lines'
+          + (f', {statement.duplicate_count} already seen' if statement.duplicate_count else '') + '.', 'success')
+    return redirect(url_for('bank.reconciliation'))
+
+@bank.route('/reconciliation/rematch', methods=['POST'])
+def rematch_statements():
+    if RematchForm().validate_on_submit():
+        matched, mismatched = rematch(current_user.id)
+        db.session.commit()
+        flash(f'{matched} previously unmatched statement lines were reconciled'
+              + (f', {mismatched} now found but disagreeing' if mismatched else '') + '.', 'success')
+    return redirect(url_for('bank.reconciliation'))
+
+@bank.route('/reconciliation/report.csv')
+def reconciliation_report():
+    return Response(stream_with_context(stream_csv(REPORT_HEADER, report_rows(current_user.id))), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename=reconciliation-{datetime.utcnow():%Y%m%d}.csv'})
@@ -3,8 +3,13 @@ from flask_login import login_required, current_user
 from app import db
 from app.models import Application, Audit, SubsidyPolicy, Milestone
 from app.forms import GovernmentReviewForm, SubsidyPolicyForm
-import os
-from werkzeug.utils import secure_filename
+from app.queries import load, paginate
+from app.summaries import status_funnel, by_technology
+from app.storage import save_upload
+from app.audit_trail import record_event
+from app.policy_engine import bump_policy_version, get_policy_engine
+from app import ledger
+from app.workflow import transition, can_transition, InvalidTransition
 from datetime import datetime
 
 government = Blueprint('government', __name__)
@@ -18,14 +23,27 @@ def require_government():
 @government.route('/applications')
 def applications():
     # Show applications at different stages
-    pending_audit = Application.query.filter_by(status='pending').all()
-    auditor_verified = Application.query.filter_by(status='auditor_verified').all()
-    under_review = Application.query.filter_by(status='under_government_review').all()
+    pending_audit = paginate(load(Application, 'producer').filter_by(status='pending'),
+                             Application, name='pending')
+    auditor_verified = paginate(load(Application, 'producer').filter_by(status='auditor_verified'),
+                                Application, name='verified')
+    under_review = paginate(load(Application, 'producer').filter_by(status='under_government_review'),
+                            Application, name='review')
     
     return render_template('govt_applications.html', 
                          pending_audit=pending_audit,
                          auditor_verified=auditor_verified,
-                         under_review=under_review)
+                         under_review=under_review,
+                         counts=status_funnel())
+
+@government.route('/reports')
+def reports():
+    # Scheme-wide figures, read from the summary tables kept by app.summaries
+    technologies = by_technology()
+    totals = {key: sum(row[key] for row in technologies)
+              for key in ('applications', 'capacity_mw', 'capacity_tons', 'approved_mw', 'approved_tons',
+                          'sanctioned', 'disbursed', 'payments')}
+    return render_template('govt_reports.html', funnel=status_funnel(), technologies=technologies, totals=totals)
 
 @government.route('/review/<int:application_id>', methods=['GET', 'POST'])
 def review_application(application_id):
@@ -33,29 +51,49 @@ def review_application(application_id):
     audit = Audit.query.filter_by(application_id=application_id).first()
     milestones = Milestone.query.filter_by(application_id=application_id).all()
     
+    # Opening a verified application takes it off the auditors' hands and into review
+    if request.method == 'GET' and can_transition(application, 'start_review'):
+        try:
+            transition(application, 'start_review')
+            record_event('application_review_started', current_user.id, application_id=application.id)
+            db.session.commit()
+        except InvalidTransition:
+            db.session.rollback()
+    
     form = GovernmentReviewForm()
+    # The policy amount is what gets sanctioned unless the reviewer enters another
+    quote = get_policy_engine().quote(application)
     
     if form.validate_on_submit():
+        amount = form.subsidy_amount_approved.data
+        if amount is None and quote is not None:
+            amount = quote.amount
+        if form.approved.data and not amount:
+            flash('Enter the subsidy amount to sanction; no subsidy policy prices this application.', 'warning')
+            return render_template('govt_review.html', application=application, audit=audit,
+                                   milestones=milestones, form=form, quote=quote)
+        
         # Handle approval document upload
         approval_doc = None
         if form.approval_document.data:
-            file = form.approval_document.data
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join('static', 'uploads', 'approvals', filename)
-            os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-            file.save(upload_path)
-            approval_doc = f'uploads/approvals/{filename}'
+            approval_doc = save_upload(form.approval_document.data, 'approvals')
         
         # Update application status and details
+        try:
+            transition(application, 'approve' if form.approved.data else 'reject')
+        except InvalidTransition as e:
+            db.session.rollback()
+            flash(str(e), 'warning')
+            return redirect(url_for('government.applications'))
+        
         if form.approved.data:
-            application.status = 'govt_approved'
             application.govt_approval_date = datetime.utcnow()
             application.approval_reference_number = form.approval_reference_number.data
             application.approval_conditions = form.approval_conditions.data
-            application.subsidy_amount_approved = form.subsidy_amount_approved.data
+            # Sanction in the same transaction as the approval; payments draw on it
+            ledger.sanction(application, amount)
             flash(f'Application "{application.project_name}" approved successfully!', 'success')
         else:
-            application.status = 'rejected'
             application.rejection_reason = form.rejection_reason.data
             flash(f'Application "{application.project_name}" rejected.', 'info')
         
@@ -63,6 +101,9 @@ def review_application(application_id):
         application.govt_reviewer_id = current_user.id
         application.approval_document_path = approval_doc
         
+        record_event('application_approved' if form.approved.data else 'application_rejected',
+                     current_user.id, application_id=application.id,
+                     details={'sanctioned': amount} if form.approved.data else None)
         db.session.commit()
         return redirect(url_for('government.applications'))
     
@@ -70,7 +111,8 @@ def review_application(application_id):
                          application=application, 
                          audit=audit, 
                          milestones=milestones,
-                         form=form)
+                         form=form,
+                         quote=quote)
 
 @government.route('/policies', methods=['GET', 'POST'])
 def manage_policies():
@@ -92,6 +134,7 @@ def manage_policies():
         )
         
         db.session.add(policy)
+        bump_policy_version()
         db.session.commit()
         flash('Subsidy policy created successfully!', 'success')
         return redirect(url_for('government.manage_policies'))
@@ -110,6 +153,7 @@ def update_policy(policy_id):
         policy.is_active = False
         flash('Policy deactivated successfully!', 'info')
     
+    bump_policy_version()
     db.session.commit()
     return redirect(url_for('government.manage_policies'))
 
@@ -117,12 +161,24 @@ def update_policy(policy_id):
 def approve(application_id):
     application = Application.query.get_or_404(application_id)
     
-    if application.status != 'auditor_verified':
+    # A quick approval sanctions the policy amount; anything else needs the review form
+    quote = get_policy_engine().quote(application)
+    if quote is None or not quote.amount:
+        flash('No subsidy policy prices this application; enter the amount to sanction on the review form.',
+              'warning')
+        return redirect(url_for('government.review_application', application_id=application.id))
+    
+    try:
+        transition(application, 'approve')
+    except InvalidTransition:
+        db.session.rollback()
         flash('Application cannot be approved. It must be auditor verified first.', 'warning')
         return redirect(url_for('government.applications'))
     
-    application.status = 'govt_approved'
     application.govt_approval_date = datetime.utcnow()
+    ledger.sanction(application, quote.amount)
+    record_event('application_approved', current_user.id, application_id=application.id,
+                 details={'sanctioned': quote.amount})
     db.session.commit()
     flash(f'Application "{application.project_name}" approved successfully!', 'success')
     return redirect(url_for('government.applications'))
@@ -131,7 +187,14 @@ def approve(application_id):
 def reject(application_id):
     application = Application.query.get_or_404(application_id)
     
-    application.status = 'rejected'
+    try:
+        transition(application, 'reject')
+    except InvalidTransition as e:
+        db.session.rollback()
+        flash(str(e), 'warning')
+        return redirect(url_for('government.applications'))
+    
+    record_event('application_rejected', current_user.id, application_id=application.id)
     db.session.commit()
     flash(f'Application "{application.project_name}" rejected.', 'info')
     return redirect(url_for('government.applications'))
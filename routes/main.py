@@ -1,9 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, abort, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from app.models import Application, Audit, Transaction
+from app.models import Application, Audit, AuditEvent
+from app.queries import KeysetPage, paginate, status_counts
+from app.storage import save_upload, download_response, can_download
+from app.audit_trail import ACTIONS, events_query, parse_timestamp
+from app.cache import cached, queue_page, queue_count
+from app import geo
+from app.search import search as search_documents
+from app.workflow import FUND_RELEASED, GOVT_APPROVED
+from app.summaries import bank_totals
 import os
-import uuid
 
 main = Blueprint('main', __name__)
 
@@ -12,45 +18,33 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
 
 def save_profile_photo(photo):
-    """Save uploaded photo and return filename"""
+    """Save uploaded photo and return its path under uploads/profile_photos"""
     try:
         if photo and photo.filename and allowed_file(photo.filename):
-            print(f"Processing photo: {photo.filename}")  # Debug
-            
-            # Generate unique filename
-            filename = secure_filename(photo.filename)
-            unique_filename = str(uuid.uuid4()) + '_' + filename
-            
-            # Create upload directory if it doesn't exist
-            upload_dir = os.path.join(os.path.dirname(current_app.root_path), 'static', 'uploads', 'profile_photos')
-            os.makedirs(upload_dir, exist_ok=True)
-            print(f"Upload directory: {upload_dir}")  # Debug
-            
-            # Save file
-            file_path = os.path.join(upload_dir, unique_filename)
-            photo.save(file_path)
-            print(f"Photo saved to: {file_path}")  # Debug
-            
-            # Verify file was saved
-            if os.path.exists(file_path):
-                print(f"File verification successful: {file_path}")  # Debug
-                return unique_filename
-            else:
-                print(f"File verification failed: {file_path}")  # Debug
-                return None
+            key = save_upload(photo, 'profile_photos')
+            # Templates prefix the stored value with uploads/profile_photos/
+            return key[len('uploads/profile_photos/'):]
         else:
-            print(f"Invalid photo or filename: {photo}, {photo.filename if photo else 'None'}")  # Debug
+            current_app.logger.info('Rejected profile photo %r', photo.filename if photo else None)
             return None
-    except Exception as e:
-        print(f"Error saving photo: {str(e)}")  # Debug
+    except Exception:
+        current_app.logger.exception('Saving a profile photo failed')
         return None
 
+@main.route('/files/<path:key>')
+@login_required
+def download(key):
+    """Hand a stored document to the proxy or object store instead of streaming it here"""
+    if not can_download(current_user, key):
+        abort(404)
+    return download_response(key)
+
 @main.route('/debug_profile')
 @login_required
 def debug_profile():
     """Debug route to check profile photo functionality"""
     import os
-    upload_dir = os.path.join(os.path.dirname(current_app.root_path), 'static', 'uploads', 'profile_photos')
+    upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'profile_photos')
     
     debug_info = {
         'user_id': current_user.id,
@@ -74,26 +68,15 @@ def edit_profile():
     from app.forms import EditProfileForm
     form = EditProfileForm(obj=current_user)
     
-    print(f"edit_profile route called with method: {request.method}")  # Debug
-    
     if form.validate_on_submit():
-        print("Form validation successful")  # Debug
         try:
             # Handle photo upload first
             if form.profile_photo.data:
-                print(f"Photo data received: {form.profile_photo.data.filename}")  # Debug
                 photo_filename = save_profile_photo(form.profile_photo.data)
                 if photo_filename:
-                    print(f"Photo saved as: {photo_filename}")  # Debug
-                    # Delete old photo if it's not the default
-                    if current_user.profile_photo and current_user.profile_photo != 'default_avatar.svg':
-                        old_photo_path = os.path.join(os.path.dirname(current_app.root_path), 'static', 'uploads', 'profile_photos', current_user.profile_photo)
-                        if os.path.exists(old_photo_path):
-                            os.remove(old_photo_path)
-                            print(f"Deleted old photo: {current_user.profile_photo}")  # Debug
-                    
+                    # The old photo is left in place: stored files are shared
+                    # by content, so another user may point at the same one
                     current_user.profile_photo = photo_filename
-                    print(f"Updated user profile_photo to: {current_user.profile_photo}")  # Debug
                 else:
                     flash('Failed to upload photo. Please try again.', 'error')
             
@@ -113,13 +96,10 @@ def edit_profile():
             return redirect(url_for('main.profile'))
             
         except Exception as e:
-            print(f"Error updating profile: {str(e)}")  # Debug
+            current_app.logger.exception('Updating the profile of user %s failed', current_user.id)
             flash(f'Error updating profile: {str(e)}', 'error')
             from app import db
             db.session.rollback()
-    else:
-        if request.method == 'POST':
-            print(f"Form validation failed. Errors: {form.errors}")  # Debug
     
     return render_template('edit_profile.html', form=form)
 
@@ -133,24 +113,94 @@ def index():
 @login_required
 def dashboard():
     if current_user.role == 'producer':
-        applications = Application.query.filter_by(producer_id=current_user.id).all()
-        return render_template('dashboard.html', applications=applications)
+        own_applications = Application.query.filter_by(producer_id=current_user.id)
+        applications = paginate(own_applications, Application)
+        return render_template('dashboard.html', applications=applications,
+                               counts=status_counts(own_applications, Application))
     
+    # Officials share one queue per role, served from the dashboard cache
     elif current_user.role == 'auditor':
-        applications = Application.query.filter_by(status='pending').all()
-        return render_template('dashboard.html', applications=applications)
+        return render_template('dashboard.html', applications=queue_page('pending'))
     
     elif current_user.role == 'government':
-        applications = Application.query.filter_by(status='auditor_verified').all()
-        return render_template('dashboard.html', applications=applications)
+        return render_template('dashboard.html', applications=queue_page('auditor_verified'))
     
     elif current_user.role == 'bank':
-        applications = Application.query.filter_by(status='govt_approved').all()
-        transactions = Transaction.query.filter_by(bank_id=current_user.id).all()
-        return render_template('dashboard.html', applications=applications, transactions=transactions)
+        return render_template('dashboard.html', applications=queue_page('govt_approved'),
+                               pending_count=queue_count('govt_approved'),
+                               transaction_count=bank_totals(current_user.id)[1])
     
     return render_template('dashboard.html')
 
+@main.route('/audit-events')
+@login_required
+def audit_events():
+    """Audit trail for auditors and government, filtered by action and time range"""
+    if current_user.role not in ('auditor', 'government'):
+        abort(403)
+    
+    filters = {
+        'action': request.args.get('action') or None,
+        'since': parse_timestamp(request.args.get('since')),
+        'until': parse_timestamp(request.args.get('until')),
+        'application_id': request.args.get('application_id', type=int),
+    }
+    events = paginate(events_query(**filters), AuditEvent)
+    return render_template('audit_events.html', events=events, actions=ACTIONS)
+
+@main.route('/search')
+@login_required
+def search():
+    """Ranked full-text search over applications, audits and milestones the user may see"""
+    query = request.args.get('q', '').strip()
+    page_number = max(request.args.get('page', 1, type=int), 1)
+    
+    # Officials search everything; producers their own projects, banks the approved ones
+    filters = []
+    if current_user.role == 'producer':
+        filters.append(Application.producer_id == current_user.id)
+    elif current_user.role == 'bank':
+        filters.append(Application.status.in_((GOVT_APPROVED, FUND_RELEASED)))
+    elif current_user.role not in ('auditor', 'government'):
+        abort(403)
+    
+    results, has_next = search_documents(query, filters, page=page_number,
+                                         backend=current_app.config['SEARCH_BACKEND'])
+    page = KeysetPage(results, 'page',
+                      next_cursor=str(page_number + 1) if has_next else None,
+                      prev_cursor=str(page_number - 1) if page_number > 1 else None)
+    return render_template('search.html', query=query, results=page)
+
+@main.route('/map/clusters')
+@login_required
+def map_clusters():
+    """Clustered project markers for a map view (?south=&west=&north=&east=&zoom=[&status=]), as JSON"""
+    south, west, north, east = (request.args.get(name, type=float) for name in ('south', 'west', 'north', 'east'))
+    zoom = request.args.get('zoom', type=int)
+    if None in (south, west, north, east, zoom) or not (-90 <= south <= north <= 90) \
+            or not (-180 <= west <= 180 and -180 <= east <= 180):
+        abort(400, description='south, west, north, east and zoom are required.')
+    status = request.args.get('status') or None
+    
+    # Producers see their own plants; officials see the whole scheme
+    filters, scope = [Application.project_geohash.isnot(None)], 'all'
+    if current_user.role == 'producer':
+        filters.append(Application.producer_id == current_user.id)
+        scope = f'producer:{current_user.id}'
+    if status:
+        filters.append(Application.status == status)
+    
+    precision, boxes = geo.view(south, west, north, east, zoom)
+    boxes_key = ';'.join(','.join(f'{value:.6f}' for value in box) for box in boxes)
+    data = cached(f'map:{scope}:{status}:{precision}:{boxes_key}', lambda: geo.clusters(filters, precision, boxes))
+    
+    # The body's hash is the ETag, so a map that re-requests an unchanged view gets a 304
+    response = jsonify(data)
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @main.app_errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
\ No newline at end of file
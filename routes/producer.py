@@ -3,8 +3,10 @@ from flask_login import login_required, current_user
 from app import db
 from app.models import Application, Milestone, SubsidyPolicy
 from app.forms import ApplicationForm, MilestoneForm
-import os, json
-from werkzeug.utils import secure_filename
+from app.queries import load, paginate, status_counts
+from app.storage import save_upload
+from app.cache import invalidate_dashboards
+import json
 from datetime import datetime
 
 producer = Blueprint('producer', __name__)
@@ -30,31 +32,17 @@ def apply():
         
         # Handle environmental clearance file
         if form.environmental_clearance_file.data:
-            file = form.environmental_clearance_file.data
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join('static', 'uploads', 'environmental', filename)
-            os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-            file.save(upload_path)
-            doc_files.append(f'uploads/environmental/{filename}')
+            doc_files.append(save_upload(form.environmental_clearance_file.data, 'environmental'))
         
         # Handle feasibility report file
         if form.feasibility_report_file.data:
-            file = form.feasibility_report_file.data
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join('static', 'uploads', 'feasibility', filename)
-            os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-            file.save(upload_path)
-            doc_files.append(f'uploads/feasibility/{filename}')
+            doc_files.append(save_upload(form.feasibility_report_file.data, 'feasibility'))
         
         # Handle additional document files
         files = request.files.getlist('document_files')
         for file in files:
             if file and hasattr(file, 'filename') and file.filename:
-                filename = secure_filename(file.filename)
-                upload_path = os.path.join('static', 'uploads', 'documents', filename)
-                os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-                file.save(upload_path)
-                doc_files.append(f'uploads/documents/{filename}')
+                doc_files.append(save_upload(file, 'documents'))
         
         # Create comprehensive application
         application = Application(
@@ -83,6 +71,7 @@ def apply():
         )
         
         db.session.add(application)
+        invalidate_dashboards()
         db.session.commit()
         
         flash('Comprehensive application submitted successfully! Your application is now under review.', 'success')
@@ -92,8 +81,10 @@ def apply():
 
 @producer.route('/my_applications')
 def my_applications():
-    applications = Application.query.filter_by(producer_id=current_user.id).order_by(Application.created_at.desc()).all()
-    return render_template('my_applications_enhanced.html', applications=applications)
+    own_applications = load(Application).filter_by(producer_id=current_user.id)
+    applications = paginate(own_applications, Application)
+    return render_template('my_applications_enhanced.html', applications=applications,
+                           counts=status_counts(own_applications, Application))
 
 @producer.route('/application/<int:app_id>/milestones', methods=['GET', 'POST'])
 def manage_milestones(app_id):
@@ -109,16 +100,12 @@ def manage_milestones(app_id):
         # Handle milestone document upload
         milestone_doc = None
         if form.milestone_document.data:
-            file = form.milestone_document.data
-            filename = secure_filename(file.filename)
-            upload_path = os.path.join('static', 'uploads', 'milestones', filename)
-            os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-            file.save(upload_path)
-            milestone_doc = f'uploads/milestones/{filename}'
+            milestone_doc = save_upload(form.milestone_document.data, 'milestones')
         
         milestone = Milestone(
             application_id=application.id,
             milestone_name=form.milestone_name.data,
+            milestone_date=datetime.combine(form.planned_completion_date.data, datetime.min.time()),
             milestone_description=form.milestone_description.data,
             planned_completion_date=form.planned_completion_date.data,
             milestone_percentage=form.milestone_percentage.data,
@@ -152,11 +139,7 @@ def update_milestone(milestone_id):
         if 'completion_document' in request.files:
             file = request.files['completion_document']
             if file and file.filename:
-                filename = secure_filename(file.filename)
-                upload_path = os.path.join('static', 'uploads', 'milestone_completions', filename)
-                os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-                file.save(upload_path)
-                milestone.completion_document_path = f'uploads/milestone_completions/{filename}'
+                milestone.completion_document_path = save_upload(file, 'milestone_completions')
         
         db.session.commit()
         flash('Milestone marked as completed!', 'success')
@@ -4,14 +4,15 @@ Test script to create a user and test photo upload functionality
 """
 
 from app import create_app, db
+from app.schema import upgrade_schema
 from app.models import User
 
 def create_test_user():
     app = create_app()
     
     with app.app_context():
-        # Create all tables
-        db.create_all()
+        # Bring the schema up to the latest migration
+        upgrade_schema(app)
         
         # Check if test user already exists
         test_user = User.query.filter_by(email='test@example.com').first()
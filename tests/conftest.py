@@ -0,0 +1,97 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database at the migration head.
+
+The migration chain is applied once per session into a template database;
+every test gets its own copy of it, so tests never see each other's rows.
+"""
+import os
+import shutil
+import pytest
+
+os.environ.setdefault('OUTBOX_WORKER_THREADS', '0')
+os.environ.setdefault('STATUS_EMAILS', '0')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+os.environ.setdefault('TEMPLATE_PRECOMPILE', '0')
+os.environ.setdefault('TEMPLATE_BYTECODE_DIR', '')
+
+ROLES = ('producer', 'auditor', 'government', 'bank')
+
+
+def build(database):
+    from app import create_app
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    return create_app()
+
+
+@pytest.fixture(scope='session')
+def schema(tmp_path_factory):
+    from app import db
+    from app.schema import upgrade_schema
+    database = tmp_path_factory.mktemp('schema') / 'head.db'
+    app = build(database)
+    upgrade_schema(app)
+    with app.app_context():
+        db.engine.dispose()
+    return database
+
+
+@pytest.fixture
+def app(schema, tmp_path):
+    from app import db
+    database = tmp_path / 'test.db'
+    shutil.copy(schema, database)
+    os.environ['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app = build(database)
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def users(app):
+    """{role: user id}, one user per role"""
+    from app import db
+    from app.models import User
+    with app.app_context():
+        created = {}
+        for role in ROLES:
+            user = User(name=f'{role.title()} User', email=f'{role}@example.com', role=role,
+                        bank_account_number='30000000001' if role == 'producer' else None,
+                        ifsc_code='SBIN0001234' if role == 'producer' else None)
+            user.set_password('password')
+            db.session.add(user)
+            db.session.flush()
+            created[role] = user.id
+        db.session.commit()
+        return created
+
+
+@pytest.fixture
+def login(app):
+    """login(user_id) -> a test client signed in as that user"""
+    def login(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return login
+
+
+@pytest.fixture
+def make_application(app, users):
+    """make_application(**columns) -> id of a new application of the producer"""
+    from app import db
+    from app.models import Application
+
+    def make_application(**columns):
+        columns.setdefault('project_name', 'Green Hydrogen Plant')
+        columns.setdefault('project_title', 'Green Hydrogen Plant')
+        columns.setdefault('capacity', 10)
+        with app.app_context():
+            application = Application(producer_id=users['producer'], **columns)
+            db.session.add(application)
+            db.session.commit()
+            return application.id
+    return make_application
@@ -0,0 +1,31 @@
+from datetime import datetime
+from app import db, ledger
+from app.disbursement import payable_ids, plan
+from app.models import Application, Milestone
+
+
+def add_milestone(app, application_id, status):
+    with app.app_context():
+        milestone = Milestone(application_id=application_id, milestone_name='Electrolyser installed',
+                              milestone_date=datetime.utcnow(), milestone_amount=50000, status=status,
+                              auditor_verification_status='verified', payment_status='pending')
+        db.session.add(milestone)
+        db.session.commit()
+        return milestone.id
+
+
+def test_incomplete_milestone_is_not_paid(app, make_application):
+    application_id = make_application(status='govt_approved')
+    with app.app_context():
+        ledger.sanction(db.session.get(Application, application_id), 250000)
+        db.session.commit()
+    completed = add_milestone(app, application_id, 'completed')
+    incomplete = add_milestone(app, application_id, 'pending')
+
+    with app.app_context():
+        payments, skipped = plan([], [completed, incomplete])
+        _, milestone_ids = payable_ids()
+
+    assert [payment.milestone.id for payment in payments] == [completed]
+    assert skipped == [{'kind': 'milestone', 'id': incomplete, 'reason': 'not completed'}]
+    assert milestone_ids == [completed]
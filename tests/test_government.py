@@ -0,0 +1,57 @@
+from app import db, ledger
+from app.models import Application, SubsidyPolicy, Transaction
+from app.policy_engine import bump_policy_version
+
+
+def add_policy(app, **rates):
+    with app.app_context():
+        db.session.add(SubsidyPolicy(policy_name='Green Hydrogen Mission', technology_type='all', **rates))
+        bump_policy_version()
+        db.session.commit()
+
+
+def test_quick_approval_is_sanctioned_and_can_be_released(app, users, login, make_application):
+    add_policy(app, rate_per_mw=100000)
+    application_id = make_application(status='auditor_verified', capacity_mw=10)
+
+    response = login(users['government']).get(f'/government/approve/{application_id}')
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Application, application_id).status == 'govt_approved'
+        assert ledger.sanctioned(application_id) == 1000000
+
+    response = login(users['bank']).post(f'/bank/release/{application_id}', data={
+        'transaction_amount': '1000000', 'transaction_type': 'subsidy_payment', 'transaction_reference': 'UTR1',
+        'beneficiary_account_number': '30000000001', 'beneficiary_bank_name': 'State Bank of India',
+        'beneficiary_ifsc_code': 'SBIN0001234',
+    })
+    assert response.status_code == 302
+    with app.app_context():
+        assert Transaction.query.filter_by(application_id=application_id).count() == 1
+        assert db.session.get(Application, application_id).status == 'fund_released'
+        assert ledger.available(application_id) == 0
+
+
+def test_quick_approval_of_an_unpriced_application_goes_to_the_review_form(app, users, login, make_application):
+    application_id = make_application(status='auditor_verified')
+
+    response = login(users['government']).get(f'/government/approve/{application_id}')
+
+    assert response.headers['Location'].endswith(f'/government/review/{application_id}')
+    with app.app_context():
+        assert db.session.get(Application, application_id).status == 'auditor_verified'
+        assert ledger.sanctioned(application_id) == 0
+
+
+def test_release_page_is_prefilled_with_the_quote_and_the_producers_account(app, users, login, make_application):
+    add_policy(app, rate_per_mw=100000)
+    application_id = make_application(status='auditor_verified', capacity_mw=10)
+    login(users['government']).get(f'/government/approve/{application_id}')
+
+    response = login(users['bank']).get(f'/bank/release/{application_id}')
+
+    assert response.status_code == 200
+    assert '₹1,000,000.00'.encode() in response.data
+    assert b'name="transaction_amount"' in response.data and b'value="1000000.0"' in response.data
+    assert b'value="30000000001"' in response.data and b'value="SBIN0001234"' in response.data
+    assert b'name="amount"' not in response.data and b'name="comments"' not in response.data
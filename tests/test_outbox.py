@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import OutboxEmail
+from app.outbox import deliver_pending, prune, queue_email
+
+
+def test_sent_email_keeps_no_body(app, tmp_path):
+    app.config.update(MAIL_BACKEND='file', MAIL_FILE_SINK_DIR=str(tmp_path / 'mail'))
+    with app.app_context():
+        queue_email('producer@example.com', 'Your login code', body='Your OTP is 481516')
+        db.session.commit()
+
+        assert deliver_pending() == 1
+        email = OutboxEmail.query.one()
+        assert email.status == 'sent'
+        assert email.body is None and email.html is None
+    assert '481516' in next((tmp_path / 'mail').iterdir()).read_text()
+
+
+def test_prune_removes_only_old_finished_emails(app):
+    old = datetime.utcnow() - timedelta(days=31)
+    with app.app_context():
+        for status, created_at in (('sent', old), ('failed', old), ('pending', old), ('sent', datetime.utcnow())):
+            db.session.add(OutboxEmail(recipient='producer@example.com', subject=status, status=status,
+                                       created_at=created_at))
+        db.session.commit()
+
+        assert prune(30) == 2
+        assert sorted(email.status for email in OutboxEmail.query) == ['pending', 'sent']
@@ -0,0 +1,53 @@
+from datetime import date, datetime
+import pytest
+from app import db
+from app.models import Application, Audit, BankStatement, Milestone, StatementLine, Transaction
+from app.queries import assert_max_queries
+
+ROWS = 12
+
+
+@pytest.fixture
+def listed(app, users, make_application):
+    """ROWS applications in every status a list view shows, each with its audit, payment and milestone"""
+    for status in ('pending', 'auditor_verified', 'under_government_review', 'govt_approved'):
+        for _ in range(ROWS):
+            make_application(status=status)
+    with app.app_context():
+        statement = BankStatement(bank_id=users['bank'], filename='statement.csv', sha256='0' * 64)
+        db.session.add(statement)
+        for number, application in enumerate(Application.query.all()):
+            db.session.add(Audit(application_id=application.id, auditor_id=users['auditor'],
+                                 compliance_status='pass', audit_date=datetime.utcnow()))
+            db.session.add(Milestone(application_id=application.id, milestone_name='Commissioning',
+                                     milestone_date=datetime.utcnow(), milestone_amount=1000, status='completed',
+                                     auditor_verification_status='verified', payment_status='pending'))
+            payment = Transaction(bank_id=users['bank'], application_id=application.id, amount_disbursed=1000,
+                                  transaction_type='subsidy_payment', disbursement_status='completed')
+            payment.generate_request_id()
+            db.session.add(payment)
+            db.session.flush()
+            db.session.add(StatementLine(statement=statement, bank_id=users['bank'], line_number=number,
+                                         line_hash=f'{number:064d}', value_date=date.today(), amount=999,
+                                         status='mismatched', transaction_id=payment.id))
+        db.session.commit()
+
+
+# The limits hold for any number of rows; a page that lazy loads a relationship runs one more query per row
+@pytest.mark.parametrize('role, url, limit', [
+    ('producer', '/dashboard', 3),
+    ('producer', '/producer/my_applications', 3),
+    ('auditor', '/dashboard', 2),
+    ('auditor', '/auditor/applications', 3),
+    ('government', '/dashboard', 2),
+    ('government', '/government/applications', 5),
+    ('bank', '/dashboard', 4),
+    ('bank', '/bank/transactions', 4),
+    ('bank', '/bank/pending', 3),
+    ('bank', '/bank/reconciliation', 6),
+])
+def test_list_views_run_a_fixed_number_of_queries(app, users, login, listed, role, url, limit):
+    client = login(users[role])
+    with app.app_context(), assert_max_queries(limit):
+        response = client.get(url)
+    assert response.status_code == 200
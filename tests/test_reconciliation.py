@@ -0,0 +1,46 @@
+import io
+from datetime import datetime
+from app import db
+from app.models import StatementLine, Transaction
+from app.reconciliation import import_statement, rematch
+
+STATEMENT = b'''Value Date,Amount,Reference,Narration
+2026-01-05,1000.00,SR20260105AAAAAA01,Subsidy release
+2026-01-05,1500.00,SR20260105BBBBBB02,Subsidy release
+2026-01-05,700.00,,Unknown credit
+'''
+
+
+def test_rematch_counts_matched_and_mismatched_lines_apart(app, users, login, make_application):
+    application_id = make_application(status='fund_released')
+    with app.app_context():
+        statement, imported = import_statement(users['bank'], io.BytesIO(STATEMENT), 'statement.csv')
+        db.session.commit()
+        assert imported and statement.line_count == 3
+        # The payments are recorded after the statement arrived
+        for reference, amount in (('SR20260105AAAAAA01', 1000), ('SR20260105BBBBBB02', 2000)):
+            db.session.add(Transaction(bank_id=users['bank'], application_id=application_id,
+                                       subsidy_request_id=reference, amount_disbursed=amount,
+                                       disbursement_date=datetime(2026, 1, 5)))
+        db.session.commit()
+
+        assert rematch(users['bank']) == (1, 1)
+        db.session.commit()
+        statuses = sorted(line.status for line in StatementLine.query)
+        assert statuses == ['matched', 'mismatched', 'unmatched']
+
+        assert rematch(users['bank']) == (0, 0)
+
+
+def test_rematch_page_reports_only_matched_lines_as_reconciled(app, users, login, make_application):
+    application_id = make_application(status='fund_released')
+    with app.app_context():
+        import_statement(users['bank'], io.BytesIO(STATEMENT), 'statement.csv')
+        db.session.add(Transaction(bank_id=users['bank'], application_id=application_id,
+                                   subsidy_request_id='SR20260105BBBBBB02', amount_disbursed=2000,
+                                   disbursement_date=datetime(2026, 1, 5)))
+        db.session.commit()
+
+    response = login(users['bank']).post('/bank/reconciliation/rematch', follow_redirects=True)
+
+    assert b'0 previously unmatched statement lines were reconciled, 1 now found but disagreeing.' in response.data
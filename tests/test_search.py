@@ -0,0 +1,23 @@
+from sqlalchemy import insert
+from app import db
+from app.models import Application
+from app.search import rebuild, search
+
+
+def test_best_match_ranks_first_however_old(app, users):
+    with app.app_context():
+        rows = [{'producer_id': users['producer'], 'project_name': f'Plant {n}', 'project_title': 'Plant',
+                 'capacity': 10, 'project_description': 'Site survey notes mention an electrolyser once.'}
+                for n in range(1500)]
+        rows[0].update(project_name='Electrolyser Electrolyser Park',
+                       project_description='Electrolyser stack, electrolyser hall and electrolyser yard.')
+        db.session.execute(insert(Application), rows)
+        rebuild(db.session.connection(), app.config['SEARCH_BACKEND'])
+        db.session.commit()
+        oldest = db.session.query(db.func.min(Application.id)).scalar()
+
+        results, has_next = search('electrolyser', backend=app.config['SEARCH_BACKEND'])
+
+        assert results[0]['kind'] == 'application'
+        assert results[0]['id'] == oldest
+        assert has_next
@@ -0,0 +1,86 @@
+import io
+import json
+import os
+import pytest
+from werkzeug.datastructures import FileStorage
+from app import db
+from app.models import User
+from app.storage import get_storage, save_upload, upload_key
+
+
+def stored(app, category):
+    with app.app_context():
+        key = upload_key(category, 'ab' * 32, '.pdf')
+        path = get_storage().path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            out.write(b'%PDF-1.4')
+        return key
+
+
+def test_only_the_owner_and_officials_download_a_document(app, users, login, make_application):
+    key = stored(app, 'feasibility')
+    make_application(documents=json.dumps([key]))
+    with app.app_context():
+        other = User(name='Other Producer', email='other@example.com', role='producer')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+
+    assert login(users['producer']).get(f'/files/{key}').status_code == 200
+    for role in ('auditor', 'government', 'bank'):
+        assert login(users[role]).get(f'/files/{key}').status_code == 200
+    assert login(other_id).get(f'/files/{key}').status_code == 404
+    assert app.test_client().get(f'/files/{key}').status_code == 302
+
+
+def test_producer_cannot_download_a_document_nobody_filed(app, users, login):
+    key = stored(app, 'documents')
+
+    assert login(users['producer']).get(f'/files/{key}').status_code == 404
+
+
+def test_documents_are_not_served_as_static_files(app, users, login):
+    with app.test_request_context():
+        key = save_upload(FileStorage(io.BytesIO(b'%PDF-1.4'), filename='report.pdf'), 'feasibility')
+        stored_at = os.path.realpath(get_storage().path(key))
+    assert not stored_at.startswith(os.path.realpath(app.static_folder) + os.sep)
+
+    client = login(users['producer'])
+    assert client.get(f'/static/{key}').status_code == 404
+    assert client.get('/static/uploads/.incoming/').status_code == 404
+
+
+def test_s3_storage_stores_each_document_once_and_redirects_to_a_presigned_url(
+        app, users, login, make_application, monkeypatch):
+    pytest.importorskip('boto3')
+    moto = pytest.importorskip('moto')
+    from app.storage import S3Storage
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+        monkeypatch.setenv(name, 'testing')
+
+    with moto.mock_aws():
+        storage = S3Storage('smarthydropay-documents', region='us-east-1', prefix='test/')
+        storage.client.create_bucket(Bucket='smarthydropay-documents')
+        app.extensions['storage'] = storage
+        uploads = []
+        upload_file = storage.client.upload_file
+        monkeypatch.setattr(storage.client, 'upload_file', lambda *args: uploads.append(args) or upload_file(*args))
+
+        with app.test_request_context():
+            keys = {save_upload(FileStorage(io.BytesIO(b'%PDF-1.4 report'), filename=name), 'feasibility')
+                    for name in ('report.pdf', 'report-copy.pdf')}
+        key, = keys
+        assert len(uploads) == 1
+        assert storage.exists(key)
+        listed = storage.client.list_objects_v2(Bucket='smarthydropay-documents')['Contents']
+        assert [item['Key'] for item in listed] == [f'test/{key}']
+
+        make_application(documents=json.dumps([key]))
+        response = login(users['producer']).get(f'/files/{key}')
+
+    assert response.status_code == 302
+    location = response.headers['Location']
+    assert 'smarthydropay-documents' in location and f'test/{key}' in location
+    assert 'Signature' in location and 'Expires' in location
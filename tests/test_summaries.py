@@ -0,0 +1,23 @@
+from app import db, ledger
+from app.summaries import by_technology, drift
+
+
+def technology_row(technology):
+    return next(row for row in by_technology() if row['technology'] == technology)
+
+
+def test_approval_is_sanctioned_before_any_payment(app, users, login, make_application):
+    application_id = make_application(technology_type='PEM Electrolysis', status='auditor_verified')
+
+    response = login(users['government']).post(f'/government/review/{application_id}', data={
+        'approved': 'y', 'subsidy_amount_approved': '250000', 'govt_comments': 'Approved under the mission.',
+    })
+
+    assert response.status_code == 302
+    with app.app_context():
+        assert ledger.sanctioned(application_id) == 250000
+        row = technology_row('PEM Electrolysis')
+        assert row['sanctioned'] == 250000
+        assert row['disbursed'] == 0
+        assert drift() == []
+
@@ -0,0 +1,129 @@
+import random
+import threading
+import uuid
+import pytest
+from sqlalchemy import func
+from app import db, ledger
+from app.models import Application, AuditEvent, LedgerEntry, Transaction
+from app.workflow import InvalidTransition, transition
+
+OFFICERS = 8
+
+
+def status(app, application_id):
+    with app.app_context():
+        return db.session.get(Application, application_id).status
+
+
+def test_verified_application_cannot_be_audited_again(app, make_application):
+    application_id = make_application(status='auditor_verified')
+
+    with app.app_context():
+        application = db.session.get(Application, application_id)
+        for name in ('audit_pass', 'audit_fail', 'request_revision'):
+            with pytest.raises(InvalidTransition):
+                transition(application, name)
+        db.session.rollback()
+
+    assert status(app, application_id) == 'auditor_verified'
+
+
+def test_auditor_cannot_reopen_a_verified_application(app, users, login, make_application):
+    application_id = make_application(status='auditor_verified')
+
+    response = login(users['auditor']).post(f'/auditor/verify/{application_id}', data={
+        'technical_compliance': 'non_compliant', 'financial_compliance': 'compliant',
+        'environmental_compliance': 'compliant', 'overall_compliance_score': '10',
+        'compliance_status': 'non_compliant', 'audit_comments': 'Second look',
+    })
+
+    assert response.status_code == 302
+    assert status(app, application_id) == 'auditor_verified'
+
+
+def test_opening_the_review_page_starts_the_review(app, users, login, make_application):
+    application_id = make_application(status='auditor_verified')
+    client = login(users['government'])
+
+    assert client.get(f'/government/review/{application_id}').status_code == 200
+    assert status(app, application_id) == 'under_government_review'
+
+    response = client.post(f'/government/review/{application_id}', data={
+        'approved': 'y', 'subsidy_amount_approved': '250000', 'govt_comments': 'Approved under the mission.',
+    })
+    assert response.status_code == 302
+    assert status(app, application_id) == 'govt_approved'
+
+
+def test_racing_bank_officers_release_each_application_once(app, users, login, make_application):
+    application_ids = [make_application(status='govt_approved') for _ in range(10)]
+    with app.app_context():
+        for application_id in application_ids:
+            ledger.sanction(db.session.get(Application, application_id), 1000)
+        db.session.commit()
+
+    start = threading.Barrier(OFFICERS)
+    statuses = []
+
+    def officer(seed):
+        client = login(users['bank'])
+        order = random.Random(seed).sample(application_ids, len(application_ids))
+        start.wait()
+        for application_id in order:
+            statuses.append(client.post(f'/bank/release/{application_id}', data={
+                'transaction_amount': '1000', 'transaction_type': 'subsidy_payment',
+                'transaction_reference': f'UTR{seed}-{application_id}',
+                'beneficiary_account_number': '30000000001', 'beneficiary_bank_name': 'State Bank of India',
+                'beneficiary_ifsc_code': 'SBIN0001234',
+            }).status_code)
+
+    threads = [threading.Thread(target=officer, args=(seed,)) for seed in range(OFFICERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [302] * OFFICERS * len(application_ids)
+    expected = dict.fromkeys(application_ids, 1)
+    with app.app_context():
+        def per_application(model, *criteria):
+            return dict(db.session.query(model.application_id, func.count())
+                        .filter(*criteria).group_by(model.application_id).all())
+        assert per_application(Transaction) == expected
+        assert per_application(LedgerEntry, LedgerEntry.account == ledger.DISBURSED) == expected
+        assert per_application(AuditEvent, AuditEvent.action == 'funds_released') == expected
+        for application_id in application_ids:
+            assert db.session.get(Application, application_id).status == 'fund_released'
+            assert ledger.disbursed(application_id) == 1000
+
+
+def test_racing_transitions_claim_each_release_once(app, users, make_application):
+    application_ids = [make_application(status='govt_approved') for _ in range(50)]
+    start = threading.Barrier(OFFICERS)
+    claimed = []
+
+    def officer(seed):
+        start.wait()
+        with app.app_context():
+            for application_id in random.Random(seed).sample(application_ids, len(application_ids)):
+                application = db.session.get(Application, application_id)
+                try:
+                    transition(application, 'release_funds')
+                except InvalidTransition:
+                    db.session.rollback()
+                    continue
+                db.session.add(Transaction(bank_id=users['bank'], application_id=application_id,
+                                           subsidy_request_id=uuid.uuid4().hex, amount_disbursed=1000))
+                db.session.commit()
+                claimed.append(application_id)
+            db.session.remove()
+
+    threads = [threading.Thread(target=officer, args=(seed,)) for seed in range(OFFICERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(application_ids)
+    with app.app_context():
+        assert Transaction.query.count() == len(application_ids)
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 """
 Comprehensive Database Update Script for SmartHydroPay
-Adds all new fields for enhanced producer, government, auditor, and bank functionality
+Applies pending schema migrations and seeds sample policies and users
 """
 
 from app import create_app, db
+from app.schema import upgrade_schema
 from app.models import User, Application, Audit, Transaction, Milestone, SubsidyPolicy
+from app.policy_engine import bump_policy_version
+from app.summaries import status_funnel
 from datetime import datetime
 import json
 
@@ -17,23 +20,28 @@ def update_database():
         print("🔄 Starting comprehensive database update...")
         
         try:
-            # Drop all tables and recreate (for development)
-            print("📋 Recreating database tables...")
-            db.drop_all()
-            db.create_all()
+            # Apply pending migrations in place; existing data is kept
+            print("📋 Applying schema migrations...")
+            upgrade_schema(app)
             
             # Create sample subsidy policies
-            print("💰 Creating sample subsidy policies...")
-            create_sample_policies()
+            if SubsidyPolicy.query.first():
+                print("💰 Subsidy policies already exist, skipping...")
+            else:
+                print("💰 Creating sample subsidy policies...")
+                create_sample_policies()
             
             # Create sample users with comprehensive data
-            print("👥 Creating sample users...")
-            create_sample_users()
+            if User.query.filter_by(email='producer@greenh2.com').first():
+                print("👥 Sample users already exist, skipping...")
+            else:
+                print("👥 Creating sample users...")
+                create_sample_users()
             
             print("✅ Database update completed successfully!")
             print("\n📊 Database Summary:")
             print(f"   Users: {User.query.count()}")
-            print(f"   Applications: {Application.query.count()}")
+            print(f"   Applications: {sum(status_funnel().values())}")
             print(f"   Subsidy Policies: {SubsidyPolicy.query.count()}")
             
         except Exception as e:
@@ -82,6 +90,7 @@ def create_sample_policies():
         policy = SubsidyPolicy(**policy_data)
         db.session.add(policy)
     
+    bump_policy_version()
     db.session.commit()
 
 def create_sample_users():